@@ -1,11 +1,32 @@
 # app.py
 
+import contextlib
+import hashlib
+import io
+import json
+import math
 import os
-from flask import Flask, render_template, request, jsonify, send_from_directory
+import struct
+import tempfile
+import threading
+import time
+import wave
+import zipfile
+from concurrent.futures import as_completed
+from functools import partial
+from flask import Flask, Response, g, render_template, request, jsonify, send_from_directory
+from PIL import Image
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 
 # Importar los módulos de lógica de compresión
-from compression_logic import huffman, rle_image, audio_comp
+import batch_compress
+from compression_logic import container, huffman, parallel, rle_image, audio_comp
+from compression_logic.container import ContainerError
+from compression_logic.metrics import REGISTRY, count_bytes, format_metric, stage
+from jobs import JobManager, JobQueueFull
+from result_cache import ResultCache, make_key
+from upload_handling import UploadCleaner, UploadRequest, discard_uploads, stored_upload
 
 # Inicialización de la aplicación Flask
 app = Flask(__name__)
@@ -16,6 +37,204 @@ if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Configuración que se puede cambiar con variables de entorno COMPRESSION_<NOMBRE>
+# (por ejemplo COMPRESSION_MAX_CONTENT_LENGTH) o con el argumento de `create_app`
+DEFAULT_CONFIG = {
+    # Tamaño máximo de un pedido (las subidas más grandes se rechazan con 413)
+    'MAX_CONTENT_LENGTH': 2 << 30,
+    'CACHE_MAX_BYTES': 1 << 30,
+    # Hilos que ejecutan trabajos en cada proceso del servidor (None: uno por núcleo)
+    'JOB_WORKERS': None,
+    # Trabajos en cola o en ejecución (incluidas las subidas que se comprimen al
+    # llegar y las descargas en streaming) a partir de los cuales se responde 503
+    'MAX_PENDING_JOBS': 64,
+    # Procesos que usa cada códec por bloques (None: uno por núcleo)
+    'CODEC_WORKERS': None,
+    # Perfilado a pedido: un pedido con la cabecera `X-Profile: 1` ejecuta su trabajo
+    # bajo cProfile y el informe se consulta en /jobs/<id>/profile
+    'ALLOW_PROFILING': True,
+}
+ENV_PREFIX = 'COMPRESSION_'
+PROFILE_HEADER = 'X-Profile'
+# Segundos que se sugiere esperar (Retry-After) cuando la cola está llena
+RETRY_AFTER_SECONDS = 5
+
+CACHE_FOLDER = os.path.join(UPLOAD_FOLDER, 'cache')
+app.config['CACHE_FOLDER'] = CACHE_FOLDER
+JOBS_FOLDER = os.path.join(UPLOAD_FOLDER, 'jobs')
+
+# Los archivos subidos se escriben una sola vez, directo en 'uploads', y su hash se
+# calcula mientras llegan. Los .txt grandes se comprimen por bloques a medida que se
+# reciben, sin guardar la entrada.
+app.request_class = UploadRequest
+UploadRequest.upload_folder = UPLOAD_FOLDER
+class CountedBlockEncoder(huffman.BlockEncoder):
+    """BlockEncoder que ocupa un lugar en el límite de trabajos mientras comprime."""
+    def __init__(self, output_path):
+        job_manager.reserve()
+        self.reserved = True
+        try:
+            super().__init__(output_path)
+        except Exception:
+            self.release()
+            raise
+
+    def release(self):
+        if self.reserved:
+            self.reserved = False
+            job_manager.release()
+
+    def close(self):
+        try:
+            return super().close()
+        finally:
+            self.release()
+
+UploadRequest.stream_encoders['compress_text_route'] = ('.txt', huffman.PARALLEL_MIN_SIZE,
+                                                        CountedBlockEncoder)
+# Las subidas de los pedidos rechazados se borran al responder; las que quedan en
+# 'uploads' (pedidos interrumpidos) se borran pasada una hora
+upload_cleaner = UploadCleaner(UPLOAD_FOLDER)
+
+def env_value(value, default):
+    """Convierte el texto de una variable de entorno al tipo del valor por defecto."""
+    if isinstance(default, bool):
+        return value.lower() in ('1', 'true', 'yes', 'on')
+    if value.lower() in ('', 'none'):
+        return None
+    return int(value)
+
+def load_config(config=None):
+    """Aplica los valores por defecto, las variables de entorno y luego `config`."""
+    for name, default in DEFAULT_CONFIG.items():
+        value = os.environ.get(ENV_PREFIX + name)
+        app.config[name] = default if value is None else env_value(value, default)
+    app.config.update(config or {})
+
+# Configuración de la que dependen la caché de resultados y la cola de trabajos
+SERVICE_CONFIG = ('CACHE_MAX_BYTES', 'JOB_WORKERS', 'MAX_PENDING_JOBS')
+services_config = None
+
+def configure_services():
+    """
+    Crea la caché de resultados y la cola de trabajos con la configuración actual.
+    Se llama antes de atender pedidos (y antes de crear los workers del servidor).
+    Si esa configuración no cambió desde la llamada anterior (al importar el módulo
+    y luego en create_app) se conservan las que ya existen.
+    """
+    global result_cache, job_manager, services_config
+    parallel.set_default_workers(app.config['CODEC_WORKERS'])
+    current = tuple(app.config[name] for name in SERVICE_CONFIG)
+    if current == services_config:
+        return
+    services_config = current
+    # Caché de resultados: los archivos generados se guardan por el hash de la
+    # entrada, el algoritmo y sus parámetros, y se reutilizan sin volver a comprimir
+    result_cache = ResultCache(CACHE_FOLDER, app.config['CACHE_MAX_BYTES'])
+    # Cola de trabajos: la compresión se ejecuta en segundo plano y el cliente
+    # consulta el avance en /jobs/<id>. El estado se guarda en disco para que
+    # cualquier worker del servidor pueda responder la consulta.
+    job_manager = JobManager(app.config['JOB_WORKERS'],
+                             max_pending=app.config['MAX_PENDING_JOBS'],
+                             state_dir=JOBS_FOLDER)
+
+def warm_up():
+    """
+    Ejecuta una vez cada códec sobre datos mínimos, así quedan cargados NumPy, los
+    plugins de PIL y las tablas de Huffman estáticas. Con un servidor que crea los
+    workers con fork después de cargar la aplicación, los workers empiezan listos y
+    comparten esa memoria con el proceso principal.
+    """
+    with tempfile.TemporaryDirectory(dir=UPLOAD_FOLDER) as directory:
+        def path(name):
+            return os.path.join(directory, name)
+
+        with open(path('a.txt'), 'w', encoding='utf-8') as file:
+            file.write('calentamiento ' * 64)
+        Image.new('RGB', (8, 8), (10, 20, 30)).save(path('a.png'))
+        with wave.open(path('a.wav'), 'wb') as file:
+            file.setnchannels(1)
+            file.setsampwidth(2)
+            file.setframerate(8000)
+            file.writeframes(bytes(512))
+        # Los códecs informan por consola cada archivo que guardan
+        with contextlib.redirect_stdout(io.StringIO()):
+            huffman.compress(path('a.txt'), path('a.huff'))
+            huffman.decompress(path('a.huff'), path('b.txt'), workers=1)
+            rle_image.compress_image(path('a.png'), path('a.rle'))
+            rle_image.decompress_image(path('a.rle'), path('b.png'))
+            audio_comp.compress_audio_predictive(path('a.wav'), path('a.huffaudio'), workers=1)
+            audio_comp.decompress_audio(path('a.huffaudio'), path('b.wav'), workers=1)
+
+def create_app(config=None, warm=True):
+    """
+    Punto de entrada para servidores WSGI con varios procesos e hilos, por ejemplo:
+
+        gunicorn -c gunicorn.conf.py 'app:create_app()'
+
+    `config` reemplaza valores de DEFAULT_CONFIG. Con `warm` se ejecutan los códecs
+    una vez antes de devolver la aplicación.
+    """
+    load_config(config)
+    configure_services()
+    if warm:
+        warm_up()
+    return app
+
+# Al importar el módulo la aplicación queda configurada con los valores por defecto
+# y las variables de entorno, sin calentamiento
+load_config()
+configure_services()
+
+REGISTRY.describe('http_request_duration_seconds', 'Duración de los pedidos HTTP por ruta')
+REGISTRY.describe('stream_download_errors_total',
+                  'Descargas en streaming cortadas por un error después de empezar')
+
+# --- MÉTRICAS ---
+
+@app.before_request
+def start_request_timer():
+    """Toma la hora de inicio del pedido y mide la recepción de los archivos subidos."""
+    g.request_start = time.perf_counter()
+    if request.method == 'POST' and request.mimetype == 'multipart/form-data':
+        # Leer el formulario acá separa el tiempo de recepción del de la ruta
+        with stage('app.receive_upload'):
+            request.files
+        count_bytes('app.receive_upload', request.content_length or 0)
+
+@app.after_request
+def observe_request_duration(response):
+    """Registra la duración del pedido por ruta, método y código de respuesta."""
+    start = g.get('request_start')
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'no_encontrada'
+        REGISTRY.observe('http_request_duration_seconds', time.perf_counter() - start,
+                         route=route, method=request.method, status=response.status_code)
+    return response
+
+@app.after_request
+def discard_rejected_uploads(response):
+    """
+    Borra las subidas de los pedidos que terminan con error (formato no válido,
+    parámetros incorrectos, cola llena, subida demasiado grande...): ningún trabajo
+    las va a usar.
+    """
+    if response.status_code >= 400:
+        discard_uploads(getattr(request, 'uploads', ()))
+    return response
+
+@app.errorhandler(JobQueueFull)
+def queue_full(error):
+    """Responde 503 cuando se alcanzó el límite de trabajos pendientes."""
+    response = jsonify({'error': 'El servidor está ocupado, intente de nuevo en unos segundos'})
+    return response, 503, {'Retry-After': str(RETRY_AFTER_SECONDS)}
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(error):
+    """Responde en JSON cuando la subida supera MAX_CONTENT_LENGTH."""
+    limit = app.config['MAX_CONTENT_LENGTH']
+    return jsonify({'error': f'El archivo supera el tamaño máximo permitido ({limit} bytes)'}), 413
+
 # Ruta principal que renderiza la interfaz gráfica
 @app.route('/')
 def index():
@@ -24,13 +243,315 @@ def index():
     """
     return render_template('index.html')
 
+# --- TAREAS EN SEGUNDO PLANO ---
+
+def processing_result(message, input_path, output_path, allow_empty=False):
+    """
+    Arma el resultado con los tamaños de entrada y salida. Si el códec no generó la
+    salida (o la dejó vacía, salvo que `allow_empty` lo permita, como al descomprimir
+    un archivo vacío) lanza ValueError, sin mostrar la ruta temporal.
+    """
+    with stage('app.stat_files'):
+        if not os.path.exists(output_path) or not (allow_empty or os.path.getsize(output_path)):
+            raise ValueError('el códec no generó la salida')
+        return {
+            'message': message,
+            'original_size': os.path.getsize(input_path),
+            'compressed_size': os.path.getsize(output_path)
+        }
+
+TEXT_COMPRESSED_MESSAGE = 'Archivo de texto comprimido exitosamente.'
+
+def compress_text_task(original_path, compressed_path, progress=None):
+    """Comprime un .txt; los archivos grandes se comprimen por bloques en varios procesos."""
+    if os.path.getsize(original_path) >= huffman.PARALLEL_MIN_SIZE:
+        huffman.compress_blocks(original_path, compressed_path, progress=progress)
+    else:
+        huffman.compress(original_path, compressed_path, progress=progress)
+    return processing_result(TEXT_COMPRESSED_MESSAGE, original_path, compressed_path)
+
+def decompress_text_task(compressed_path, decompressed_path, progress=None):
+    """Descomprime un .huff."""
+    huffman.decompress(compressed_path, decompressed_path, progress=progress)
+    return processing_result('Archivo de texto descomprimido exitosamente.', compressed_path,
+                             decompressed_path, allow_empty=True)
+
+def decompress_text_lines_task(compressed_path, decompressed_path, lines, progress=None):
+    """Descomprime solo las primeras `lines` líneas de un .huff."""
+    huffman.decompress_lines(compressed_path, decompressed_path, lines, progress=progress)
+    return processing_result('Vista previa del texto generada exitosamente.', compressed_path,
+                             decompressed_path, allow_empty=True)
+
+def compress_image_task(original_path, compressed_path, progress=None):
+    """Comprime una imagen con RLE."""
+    rle_image.compress_image(original_path, compressed_path, progress=progress)
+    return processing_result('Imagen comprimida exitosamente.', original_path, compressed_path)
+
+def decompress_image_task(compressed_path, decompressed_path, progress=None):
+    """Reconstruye una imagen desde un .rle."""
+    rle_image.decompress_image(compressed_path, decompressed_path, progress=progress)
+    return processing_result('Imagen descomprimida exitosamente.', compressed_path, decompressed_path)
+
+def compress_audio_task(original_path, compressed_path, progress=None):
+    """Comprime un .wav; los archivos grandes se comprimen por bloques en varios procesos."""
+    if os.path.getsize(original_path) >= huffman.PARALLEL_MIN_SIZE:
+        audio_comp.compress_audio_blocks(original_path, compressed_path, progress=progress)
+    else:
+        audio_comp.compress_audio(original_path, compressed_path, progress=progress)
+    return processing_result('Audio comprimido exitosamente.', original_path, compressed_path)
+
+def compress_audio_predictive_task(original_path, compressed_path, progress=None):
+    """Comprime un .wav sin pérdida con predicción lineal y Huffman sobre los residuos."""
+    audio_comp.compress_audio_predictive(original_path, compressed_path, progress=progress)
+    return processing_result('Audio comprimido exitosamente.', original_path, compressed_path)
+
+# Modos de compresión de audio que se pueden elegir en /compress_audio
+AUDIO_MODES = {
+    'predictive': ('compress_audio_predictive', compress_audio_predictive_task),
+    'huffman': ('compress_audio', compress_audio_task),
+}
+
+def decompress_audio_task(compressed_path, decompressed_path, progress=None):
+    """Reconstruye un .wav desde un .huffaudio."""
+    audio_comp.decompress_audio(compressed_path, decompressed_path, progress=progress)
+    return processing_result('Audio descomprimido exitosamente.', compressed_path, decompressed_path)
+
+def decompress_audio_range_task(compressed_path, decompressed_path, start, end, progress=None):
+    """Reconstruye a .wav solo el fragmento entre los segundos `start` y `end`."""
+    audio_comp.decompress_audio_range(compressed_path, decompressed_path, start, end,
+                                      progress=progress)
+    return processing_result('Fragmento de audio descomprimido exitosamente.', compressed_path, decompressed_path)
+
+# Nombre del archivo con el detalle de cada miembro dentro del .zip de /compress_batch
+BATCH_MANIFEST_NAME = 'manifest.json'
+
+def compress_batch_task(members, archive_path, progress=None):
+    """
+    Comprime cada miembro (nombre, ruta de la subida) con el códec de su extensión,
+    repartidos en un pool de procesos, y guarda los resultados en un .zip sin volver
+    a comprimirlos. El .zip incluye manifest.json con el códec, los tamaños y el
+    SHA-256 de cada miembro, o su error si no se pudo comprimir.
+    """
+    outputs = [f'{path}{batch_compress.COMPRESSORS[os.path.splitext(path)[1].lower()][1]}'
+               for _, path in members]
+    workers = min(len(members), parallel.default_workers())
+    entries = [None] * len(members)
+    try:
+        with parallel.process_pool(workers) as pool:
+            futures = {pool.submit(batch_compress.process_file, 'compress', path, output): index
+                       for index, ((_, path), output) in enumerate(zip(members, outputs))}
+            for done, future in enumerate(as_completed(futures), 1):
+                index = futures[future]
+                name = members[index][0]
+                try:
+                    original_size, compressed_size, digest, _ = future.result()
+                except Exception as e:
+                    entries[index] = {'name': name, 'error': str(e)}
+                else:
+                    extension = os.path.splitext(name)[1].lower()
+                    entries[index] = {
+                        'name': name,
+                        'member': batch_compress.output_name(name, 'compress'),
+                        'codec': batch_compress.COMPRESSORS[extension][1].lstrip('.'),
+                        'original_size': original_size,
+                        'compressed_size': compressed_size,
+                        'sha256': digest,
+                    }
+                if progress is not None:
+                    progress(done / len(members))
+
+        compressed = [(entry, output) for entry, output in zip(entries, outputs) if 'error' not in entry]
+        if not compressed:
+            raise ValueError(entries[0]['error'])
+        with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_STORED) as archive:
+            for entry, output in compressed:
+                archive.write(output, entry['member'])
+            archive.writestr(BATCH_MANIFEST_NAME, json.dumps(
+                {'version': batch_compress.MANIFEST_VERSION, 'files': entries}, indent=1))
+    finally:
+        for output in outputs:
+            if os.path.exists(output):
+                os.remove(output)
+
+    return {
+        'message': f'{len(compressed)} de {len(members)} archivos comprimidos exitosamente.',
+        'original_size': sum(entry['original_size'] for entry, _ in compressed),
+        'compressed_size': os.path.getsize(archive_path),
+        'files': entries,
+    }
+
+def optional_number(name, convert):
+    """
+    Lee un número no negativo opcional de la URL o del formulario. Devuelve None si
+    no se indicó y lanza ValueError si no es válido.
+    """
+    value = request.values.get(name, '')
+    if value == '':
+        return None
+    number = convert(value)
+    if number < 0 or not math.isfinite(number):
+        raise ValueError(name)
+    return number
+
+def cached_task(name, task, upload, download_name, params=None, message=None, progress=None):
+    """
+    Ejecuta la tarea a través de la caché de resultados: si la misma entrada ya se
+    procesó con el mismo algoritmo y los mismos `params` se devuelve el archivo
+    guardado, y si otro trabajo la está procesando en este momento se espera su
+    resultado. La subida se borra al terminar. `message` es el mensaje del resultado
+    cuando la subida ya llegó comprimida (la tarea no se ejecuta).
+    """
+    key = make_key(upload.digest(), name, {'format_version': container.VERSION, **(params or {})})
+    extension = os.path.splitext(download_name)[1]
+    try:
+        if upload.encoded:
+            # La subida ya se comprimió mientras llegaba: solo se guarda el resultado
+            result = {
+                'message': message or 'Archivo comprimido exitosamente.',
+                'original_size': upload.size,
+                'compressed_size': os.path.getsize(upload.path)
+            }
+            result, filename, hit = result_cache.add(key, extension, upload.path, result)
+        else:
+            result, filename, hit = result_cache.get_or_compute(
+                key, extension, lambda output_path: task(upload.path, output_path, progress=progress))
+    finally:
+        if os.path.exists(upload.path):
+            os.remove(upload.path)
+    result = dict(result)
+    result['cached'] = hit
+    result['download_url'] = f'/download/cache/{filename}?name={download_name}'
+    return result
+
+def cached_batch(members, uploads, download_name, progress=None):
+    """
+    Como `cached_task`, para un lote: la clave de la caché depende de los nombres y
+    el contenido de todos los miembros. Las subidas se borran al terminar.
+    """
+    files = [[name, upload.digest()] for (name, _), upload in zip(members, uploads)]
+    digest = hashlib.sha256(json.dumps(files).encode('utf-8')).hexdigest()
+    key = make_key(digest, 'compress_batch', {'format_version': container.VERSION})
+    try:
+        result, filename, hit = result_cache.get_or_compute(
+            key, '.zip', lambda output_path: compress_batch_task(members, output_path, progress))
+    finally:
+        remove_uploads(uploads)
+    result = dict(result)
+    result['cached'] = hit
+    result['download_url'] = f'/download/cache/{filename}?name={download_name}'
+    return result
+
+def remove_uploads(uploads):
+    for upload in uploads:
+        if os.path.exists(upload.path):
+            os.remove(upload.path)
+
+def stream_response(upload, pieces, download_name, mimetype):
+    """
+    Responde con la salida del generador `pieces` a medida que se decodifica, con
+    transferencia por partes (chunked) y sin escribir nada en disco. La primera parte
+    se pide antes de responder, así un archivo no válido se informa con un error 400.
+    La subida se borra al terminar de enviar (o si el cliente corta). Mientras dura,
+    la decodificación ocupa un lugar en el límite de trabajos pendientes.
+    """
+    manager = job_manager
+    finished = threading.Lock()
+
+    def finish():
+        # Cierra el generador (y el archivo mapeado), borra la subida y libera el
+        # lugar en el límite. Se llama desde el `finally` de generate() y al cerrar
+        # la respuesta, que ocurre aunque generate() no llegue a empezar: solo la
+        # primera llamada hace algo
+        if not finished.acquire(blocking=False):
+            return
+        try:
+            pieces.close()
+            if os.path.exists(upload.path):
+                os.remove(upload.path)
+        finally:
+            manager.release()
+
+    manager.reserve()
+    try:
+        first = next(pieces, b'')
+    except (ContainerError, ValueError, IndexError, OverflowError, struct.error) as e:
+        # Los códecs informan los archivos mal formados con ContainerError; los demás
+        # errores de datos se tratan igual por si alguno se escapa. La subida se borra
+        # junto con las de los demás pedidos rechazados
+        manager.release()
+        return jsonify({'error': f'Archivo comprimido no válido: {e}'}), 400
+    except Exception:
+        manager.release()
+        raise
+
+    def generate():
+        sent = len(first)
+        try:
+            yield bytes(first)
+            for piece in pieces:
+                sent += len(piece)
+                yield bytes(piece)
+        except Exception:
+            # La respuesta ya empezó con 200: se registra el error y se corta la
+            # conexión sin la parte final, así el cliente no la toma por completa
+            app.logger.exception('Falló la descarga en streaming de %s después de %d bytes',
+                                 download_name, sent)
+            REGISTRY.inc('stream_download_errors_total')
+            raise
+        finally:
+            count_bytes('app.stream_download', sent, 'out')
+            finish()
+
+    response = Response(generate(), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{download_name}"'
+    })
+    # El servidor cierra la respuesta al terminar de enviarla o si el cliente corta
+    response.call_on_close(finish)
+    return response
+
+def iter_lines(compressed_path, lines):
+    """Generador con las primeras `lines` líneas de un .huff, para `stream_response`."""
+    yield huffman.read_lines(compressed_path, lines)
+
+def wants_stream():
+    """Indica si el pedido eligió la descarga en streaming (`stream=1`)."""
+    return request.values.get('stream') == '1'
+
+def start_job(name, task, upload, download_name, params=None, message=None):
+    """
+    Encola la tarea y responde de inmediato (202) con el id del trabajo.
+    `download_name` es el nombre con que se descarga el archivo generado, `params`
+    los parámetros de la tarea que distinguen su resultado en la caché y `message`
+    el mensaje del resultado si la subida llegó comprimida (ver `cached_task`).
+    """
+    return queue_job(name, cached_task, name, task, upload, download_name, params, message)
+
+def queue_job(name, function, *args):
+    """
+    Encola `function(*args)` y responde 202 con las URLs del trabajo. Si la cola está
+    llena, JobQueueFull se responde con 503 (y `discard_rejected_uploads` borra las
+    subidas).
+    """
+    upload_cleaner.maybe_run()
+    profile = app.config['ALLOW_PROFILING'] and request.headers.get(PROFILE_HEADER) == '1'
+    job = job_manager.submit(name, function, *args, profile=profile)
+    response = {
+        'job_id': job.id,
+        'status_url': f'/jobs/{job.id}',
+        'progress_url': f'/jobs/{job.id}/progress'
+    }
+    if profile:
+        response['profile_url'] = f'/jobs/{job.id}/profile'
+    return jsonify(response), 202
+
 # --- RUTAS PARA COMPRESIÓN DE TEXTO ---
 
 @app.route('/compress_text', methods=['POST'])
 def compress_text_route():
     """
     Ruta para comprimir un archivo de texto usando el algoritmo de Huffman.
-    Recibe un archivo .txt y devuelve la ruta al archivo comprimido y los tamaños.
+    Recibe un archivo .txt, encola la compresión y devuelve el id del trabajo; la ruta
+    al archivo comprimido y los tamaños se consultan en /jobs/<id>.
     """
     if 'file' not in request.files:
         return jsonify({'error': 'No se encontró el archivo'}), 400
@@ -42,25 +563,15 @@ def compress_text_route():
     if file and file.filename.endswith('.txt'):
         # Guardar el archivo original
         filename = secure_filename(file.filename)
-        original_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(original_path)
-
-        # Definir la ruta del archivo de salida
-        compressed_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{os.path.splitext(filename)[0]}.huff")
+        upload = stored_upload(file)
 
-        # [cite_start]Llamar a la función de compresión de Huffman [cite: 9]
-        huffman.compress(original_path, compressed_path)
+        # Definir el nombre del archivo de salida
+        compressed_name = f"{os.path.splitext(filename)[0]}.huff"
 
-        # [cite_start]Obtener tamaños para la comparación [cite: 25]
-        original_size = os.path.getsize(original_path)
-        compressed_size = os.path.getsize(compressed_path)
-
-        return jsonify({
-            'message': 'Archivo de texto comprimido exitosamente.',
-            'original_size': original_size,
-            'compressed_size': compressed_size,
-            'download_url': f'/download/{os.path.basename(compressed_path)}'
-        })
+        # [cite_start]Encolar la compresión de Huffman [cite: 9]; los tamaños para la
+        # [cite_start]comparación [cite: 25] se informan en /jobs/<id> al terminar
+        return start_job('compress_text', compress_text_task, upload, compressed_name,
+                         message=TEXT_COMPRESSED_MESSAGE)
     else:
         return jsonify({'error': 'Formato de archivo no válido. Se esperaba un .txt'}), 400
 
@@ -69,7 +580,10 @@ def compress_text_route():
 def decompress_text_route():
     """
     Ruta para descomprimir un archivo de texto (.huff).
-    Devuelve la ruta al archivo descomprimido y los tamaños.
+    Devuelve el id del trabajo; la ruta al archivo descomprimido y los tamaños se
+    consultan en /jobs/<id>. Con `lines` (en la URL o el formulario) solo se
+    descomprimen las primeras líneas, sin decodificar el resto del archivo. Con
+    `stream=1` el texto se envía en la respuesta a medida que se decodifica.
     """
     if 'file' not in request.files:
         return jsonify({'error': 'No se encontró el archivo'}), 400
@@ -77,29 +591,32 @@ def decompress_text_route():
     file = request.files['file']
     if file.filename == '':
         return jsonify({'error': 'No se seleccionó ningún archivo'}), 400
+
+    try:
+        lines = optional_number('lines', int)
+    except ValueError:
+        return jsonify({'error': 'La cantidad de líneas no es válida'}), 400
     
     if file and file.filename.endswith('.huff'):
         # Guardar el archivo comprimido
         filename = secure_filename(file.filename)
-        compressed_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(compressed_path)
+        upload = stored_upload(file)
         
-        # Definir la ruta del archivo descomprimido
-        decompressed_path = os.path.join(app.config['UPLOAD_FOLDER'], f"decompressed_{os.path.splitext(filename)[0]}.txt")
+        # Definir el nombre del archivo descomprimido
+        decompressed_name = f"decompressed_{os.path.splitext(filename)[0]}.txt"
         
-        # Llamar a la función de descompresión de Huffman
-        huffman.decompress(compressed_path, decompressed_path)
-
-        # Obtener tamaños para la comparación
-        compressed_size = os.path.getsize(compressed_path)
-        decompressed_size = os.path.getsize(decompressed_path)
-
-        return jsonify({
-            'message': 'Archivo de texto descomprimido exitosamente.',
-            'original_size': compressed_size,
-            'compressed_size': decompressed_size,
-            'download_url': f'/download/{os.path.basename(decompressed_path)}'
-        })
+        if wants_stream():
+            if lines is not None:
+                pieces = iter_lines(upload.path, lines)
+            else:
+                pieces = huffman.iter_decompress(upload.path)
+            return stream_response(upload, pieces, decompressed_name, 'text/plain')
+
+        # Encolar la descompresión de Huffman
+        if lines is not None:
+            return start_job('decompress_text', partial(decompress_text_lines_task, lines=lines),
+                             upload, decompressed_name, {'lines': lines})
+        return start_job('decompress_text', decompress_text_task, upload, decompressed_name)
     else:
         return jsonify({'error': 'Formato de archivo no válido. Se esperaba un .huff'}), 400
 
@@ -110,7 +627,7 @@ def decompress_text_route():
 def compress_image_route():
     """
     [cite_start]Ruta para comprimir una imagen usando Run-Length Encoding (RLE). [cite: 13]
-    [cite_start]Recibe un archivo .png o .bmp y devuelve la ruta al archivo comprimido. [cite: 14]
+    [cite_start]Recibe un archivo .png o .bmp y devuelve el id del trabajo que lo comprime. [cite: 14]
     """
     if 'file' not in request.files:
         return jsonify({'error': 'No se encontró el archivo'}), 400
@@ -121,23 +638,12 @@ def compress_image_route():
 
     if file and (file.filename.endswith('.png') or file.filename.endswith('.bmp')):
         filename = secure_filename(file.filename)
-        original_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(original_path)
-
-        compressed_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{os.path.splitext(filename)[0]}.rle")
+        upload = stored_upload(file)
 
-        # Llamar a la función de compresión RLE para imágenes
-        rle_image.compress_image(original_path, compressed_path)
+        compressed_name = f"{os.path.splitext(filename)[0]}.rle"
 
-        original_size = os.path.getsize(original_path)
-        compressed_size = os.path.getsize(compressed_path)
-
-        return jsonify({
-            'message': 'Imagen comprimida exitosamente.',
-            'original_size': original_size,
-            'compressed_size': compressed_size,
-            'download_url': f'/download/{os.path.basename(compressed_path)}'
-        })
+        # Encolar la compresión RLE para imágenes
+        return start_job('compress_image', compress_image_task, upload, compressed_name)
     else:
         return jsonify({'error': 'Formato no válido. Se esperaba .png o .bmp'}), 400
 
@@ -146,6 +652,7 @@ def compress_image_route():
 def decompress_image_route():
     """
     [cite_start]Ruta para descomprimir una imagen (.rle) y reconstruirla. [cite: 15]
+    Con `stream=1` el PNG se envía en la respuesta a medida que se decodifica.
     """
     if 'file' not in request.files:
         return jsonify({'error': 'No se encontró el archivo'}), 400
@@ -156,23 +663,15 @@ def decompress_image_route():
         
     if file and file.filename.endswith('.rle'):
         filename = secure_filename(file.filename)
-        compressed_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(compressed_path)
+        upload = stored_upload(file)
 
-        decompressed_path = os.path.join(app.config['UPLOAD_FOLDER'], f"decompressed_{os.path.splitext(filename)[0]}.png")
+        decompressed_name = f"decompressed_{os.path.splitext(filename)[0]}.png"
+        if wants_stream():
+            return stream_response(upload, rle_image.iter_decompress_image(upload.path),
+                                   decompressed_name, 'image/png')
         
-        # Llamar a la función de descompresión RLE para imágenes
-        rle_image.decompress_image(compressed_path, decompressed_path)
-
-        compressed_size = os.path.getsize(compressed_path)
-        decompressed_size = os.path.getsize(decompressed_path)
-
-        return jsonify({
-            'message': 'Imagen descomprimida exitosamente.',
-            'original_size': compressed_size,
-            'compressed_size': decompressed_size,
-            'download_url': f'/download/{os.path.basename(decompressed_path)}'
-        })
+        # Encolar la descompresión RLE para imágenes
+        return start_job('decompress_image', decompress_image_task, upload, decompressed_name)
     else:
         return jsonify({'error': 'Formato no válido. Se esperaba .rle'}), 400
 
@@ -182,6 +681,8 @@ def decompress_image_route():
 def compress_audio_route():
     """
     [cite_start]Ruta para comprimir un archivo de audio WAV usando Huffman sobre los bytes. [cite: 18, 19]
+    El campo `mode` del formulario elige el modo: 'predictive' (por defecto, sin
+    pérdida con predicción sobre las muestras) o 'huffman' (Huffman sobre los bytes).
     """
     if 'file' not in request.files:
         return jsonify({'error': 'No se encontró el archivo'}), 400
@@ -190,24 +691,18 @@ def compress_audio_route():
     if file.filename == '':
         return jsonify({'error': 'No se seleccionó ningún archivo'}), 400
 
+    mode = request.form.get('mode', 'predictive')
+    if mode not in AUDIO_MODES:
+        return jsonify({'error': f"Modo no válido. Se esperaba uno de: {', '.join(AUDIO_MODES)}"}), 400
+
     if file and file.filename.endswith('.wav'):
         filename = secure_filename(file.filename)
-        original_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(original_path)
+        upload = stored_upload(file)
         
-        compressed_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{os.path.splitext(filename)[0]}.huffaudio")
+        compressed_name = f"{os.path.splitext(filename)[0]}.huffaudio"
 
-        audio_comp.compress_audio(original_path, compressed_path)
-        
-        original_size = os.path.getsize(original_path)
-        compressed_size = os.path.getsize(compressed_path)
-        
-        return jsonify({
-            'message': 'Audio comprimido exitosamente.',
-            'original_size': original_size,
-            'compressed_size': compressed_size,
-            'download_url': f'/download/{os.path.basename(compressed_path)}'
-        })
+        name, task = AUDIO_MODES[mode]
+        return start_job(name, task, upload, compressed_name)
     else:
         return jsonify({'error': 'Formato no válido. Se esperaba .wav'}), 400
 
@@ -216,6 +711,9 @@ def compress_audio_route():
 def decompress_audio_route():
     """
     [cite_start]Ruta para descomprimir un archivo de audio (.huffaudio) y reconstruirlo a .wav. [cite: 20]
+    Con `start` y/o `end` (segundos, en la URL o el formulario) solo se reconstruye
+    ese fragmento, decodificando únicamente los bloques que lo contienen. Con
+    `stream=1` el .wav se envía en la respuesta a medida que se decodifica.
     """
     if 'file' not in request.files:
         return jsonify({'error': 'No se encontró el archivo'}), 400
@@ -223,28 +721,112 @@ def decompress_audio_route():
     file = request.files['file']
     if file.filename == '':
         return jsonify({'error': 'No se seleccionó ningún archivo'}), 400
+
+    try:
+        start = optional_number('start', float)
+        end = optional_number('end', float)
+    except ValueError:
+        return jsonify({'error': 'El fragmento pedido no es válido'}), 400
+    if start is not None and end is not None and end <= start:
+        return jsonify({'error': 'El final del fragmento debe ser posterior al inicio'}), 400
         
     if file and file.filename.endswith('.huffaudio'):
         filename = secure_filename(file.filename)
-        compressed_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(compressed_path)
+        upload = stored_upload(file)
 
-        decompressed_path = os.path.join(app.config['UPLOAD_FOLDER'], f"decompressed_{os.path.splitext(filename)[0]}.wav")
+        decompressed_name = f"decompressed_{os.path.splitext(filename)[0]}.wav"
 
-        audio_comp.decompress_audio(compressed_path, decompressed_path)
-        
-        compressed_size = os.path.getsize(compressed_path)
-        decompressed_size = os.path.getsize(decompressed_path)
-
-        return jsonify({
-            'message': 'Audio descomprimido exitosamente.',
-            'original_size': compressed_size,
-            'compressed_size': decompressed_size,
-            'download_url': f'/download/{os.path.basename(decompressed_path)}'
-        })
+        if wants_stream():
+            pieces = audio_comp.iter_decompress_audio(upload.path, start or 0.0, end)
+            return stream_response(upload, pieces, decompressed_name, 'audio/wav')
+
+        if start is not None or end is not None:
+            task = partial(decompress_audio_range_task, start=start or 0.0, end=end)
+            return start_job('decompress_audio', task, upload, decompressed_name,
+                             {'start': start or 0.0, 'end': end})
+        return start_job('decompress_audio', decompress_audio_task, upload, decompressed_name)
     else:
         return jsonify({'error': 'Formato no válido. Se esperaba .huffaudio'}), 400
 
+# --- RUTA PARA COMPRIMIR VARIOS ARCHIVOS ---
+
+@app.route('/compress_batch', methods=['POST'])
+def compress_batch_route():
+    """
+    Comprime varios archivos (.txt, .png, .bmp, .wav, mezclados) enviados en el campo
+    `files` y devuelve el id del trabajo. El resultado es un .zip con cada archivo
+    comprimido con su códec (informe.txt -> informe.txt.huff, como batch_compress.py)
+    y un manifest.json con el códec y los tamaños de cada uno.
+    """
+    files = [file for file in request.files.getlist('files') if file.filename != '']
+    if not files:
+        return jsonify({'error': 'No se seleccionó ningún archivo'}), 400
+
+    uploads = [stored_upload(file) for file in files]
+    invalid = [file.filename for file in files
+               if os.path.splitext(file.filename)[1].lower() not in batch_compress.COMPRESSORS]
+    if invalid:
+        return jsonify({'error': f"Formato no válido: {', '.join(invalid)}. "
+                                 'Se esperaba .txt, .png, .bmp o .wav'}), 400
+
+    # Dos archivos con el mismo nombre se distinguen con un sufijo
+    members = []
+    used = set()
+    for file, upload in zip(files, uploads):
+        base, extension = os.path.splitext(file.filename)
+        base = secure_filename(base) or 'archivo'
+        extension = extension.lower()
+        name = base + extension
+        copy = 1
+        while name in used:
+            copy += 1
+            name = f'{base}-{copy}{extension}'
+        used.add(name)
+        if not upload.path.lower().endswith(extension):
+            # El códec se elige por la extensión de la subida, que secure_filename puede quitar
+            os.replace(upload.path, upload.path + extension)
+            upload.path += extension
+        members.append((name, upload.path))
+
+    return queue_job('compress_batch', cached_batch, members, uploads, 'comprimidos.zip')
+
+# --- RUTAS PARA CONSULTAR TRABAJOS ---
+
+@app.route('/jobs/<job_id>')
+def job_status_route(job_id):
+    """
+    Devuelve el estado de un trabajo ('queued', 'running', 'done' o 'error'), su
+    avance y, al terminar, los tamaños y la URL de descarga (o el error).
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'No se encontró el trabajo'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/progress')
+def job_progress_route(job_id):
+    """
+    Devuelve solo el estado y el avance (0 a 1) de un trabajo.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'No se encontró el trabajo'}), 404
+    return jsonify({'job_id': job.id, 'status': job.status, 'progress': round(job.progress, 4)})
+
+@app.route('/jobs/<job_id>/profile')
+def job_profile_route(job_id):
+    """
+    Devuelve el informe de cProfile de un trabajo pedido con la cabecera `X-Profile: 1`.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'No se encontró el trabajo'}), 404
+    if not job.profile_requested:
+        return jsonify({'error': 'El trabajo no se pidió con perfilado'}), 404
+    if job.profile is None:
+        return jsonify({'error': 'El trabajo todavía no terminó', 'status': job.status}), 409
+    return Response(job.profile, mimetype='text/plain')
+
 # --- RUTA PARA DESCARGAR ARCHIVOS ---
 
 @app.route('/download/<filename>')
@@ -254,6 +836,44 @@ def download_file(filename):
     """
     return send_from_directory(app.config['UPLOAD_FOLDER'], filename, as_attachment=True)
 
+@app.route('/download/cache/<filename>')
+def download_cached_file(filename):
+    """
+    Descarga un resultado guardado en la caché con el nombre indicado en `name`.
+    """
+    download_name = secure_filename(request.args.get('name', '')) or filename
+    return send_from_directory(app.config['CACHE_FOLDER'], filename, as_attachment=True,
+                               download_name=download_name)
+
+@app.route('/cache/stats')
+def cache_stats_route():
+    """
+    Devuelve los contadores de la caché de resultados (aciertos, fallos, tamaño...).
+    """
+    return jsonify(result_cache.stats())
+
+@app.route('/metrics')
+def metrics_route():
+    """
+    Métricas en el formato de texto de Prometheus: duración de los pedidos por ruta,
+    de cada etapa de los códecs y de los trabajos, bytes procesados, y el estado de
+    la caché y de la cola de trabajos.
+    """
+    lines = REGISTRY.render()
+    cache = result_cache.stats()
+    for name in ('entries', 'size'):
+        lines += format_metric(f'result_cache_{name}', 'gauge', f'Caché de resultados: {name}',
+                               [({}, cache[name])])
+    for name in ('hits', 'misses', 'evictions'):
+        lines += format_metric(f'result_cache_{name}_total', 'counter',
+                               f'Caché de resultados: {name}', [({}, cache[name])])
+    lines += format_metric('jobs', 'gauge', 'Trabajos conservados por estado',
+                           [({'status': status}, count)
+                            for status, count in job_manager.counts().items()])
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # Servidor de desarrollo: en producción usar create_app con un servidor WSGI.
+    # El depurador solo se activa con FLASK_DEBUG=1.
+    create_app(warm=False).run(debug=os.environ.get('FLASK_DEBUG') == '1', threaded=True)
\ No newline at end of file
@@ -0,0 +1,254 @@
+# batch_compress.py
+
+"""
+Compresión y descompresión de carpetas completas desde la línea de comandos, sin
+pasar por el servidor. Cada archivo se procesa con el códec que corresponde a su
+extensión (.txt -> Huffman, .png/.bmp -> RLE, .wav -> audio predictivo) en un pool
+de procesos, y se conserva la estructura de subcarpetas.
+
+Los archivos comprimidos agregan la extensión del códec al nombre original
+(informe.txt -> informe.txt.huff), así al descomprimir se recupera el nombre y el
+formato. En la carpeta de destino se guarda un manifiesto con el tamaño, la fecha
+de modificación y el SHA-256 de cada entrada: los archivos que no cambiaron desde
+la última ejecución se saltean.
+
+Uso:
+    python batch_compress.py compress datos/ archivo/
+    python batch_compress.py decompress archivo/ restaurado/ --workers 4
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import as_completed
+
+from compression_logic import audio_comp, huffman, parallel, rle_image
+from result_cache import file_digest
+
+# Nombre del manifiesto que se guarda en la carpeta de destino
+MANIFEST_NAME = '.batch_manifest.json'
+MANIFEST_VERSION = 1
+
+def compress_text(input_path, output_path):
+    # Cada archivo ya ocupa un proceso del pool: los bloques se codifican en el mismo
+    if os.path.getsize(input_path) >= huffman.PARALLEL_MIN_SIZE:
+        huffman.compress_blocks(input_path, output_path, workers=1)
+    else:
+        huffman.compress(input_path, output_path)
+
+def compress_audio(input_path, output_path):
+    audio_comp.compress_audio_predictive(input_path, output_path, workers=1)
+
+def decompress_text(input_path, output_path):
+    huffman.decompress(input_path, output_path, workers=1)
+
+def decompress_audio(input_path, output_path):
+    audio_comp.decompress_audio(input_path, output_path, workers=1)
+
+# extensión de entrada -> (función que comprime, extensión que se agrega)
+COMPRESSORS = {
+    '.txt': (compress_text, '.huff'),
+    '.png': (rle_image.compress_image, '.rle'),
+    '.bmp': (rle_image.compress_image, '.rle'),
+    '.wav': (compress_audio, '.huffaudio'),
+}
+
+# extensión comprimida -> (función que descomprime, extensión si el nombre no la tiene)
+DECOMPRESSORS = {
+    '.huff': (decompress_text, '.txt'),
+    '.rle': (rle_image.decompress_image, '.png'),
+    '.huffaudio': (decompress_audio, '.wav'),
+}
+
+def output_name(relative_path, operation):
+    """
+    Nombre del archivo de salida, o None si la extensión no tiene códec. Al comprimir
+    se agrega la extensión del códec; al descomprimir se quita, y si lo que queda no
+    tiene la extensión esperada (un archivo generado por la aplicación web) se agrega.
+    """
+    base, extension = os.path.splitext(relative_path)
+    extension = extension.lower()
+    if operation == 'compress':
+        if extension not in COMPRESSORS:
+            return None
+        return relative_path + COMPRESSORS[extension][1]
+    if extension not in DECOMPRESSORS:
+        return None
+    default_extension = DECOMPRESSORS[extension][1]
+    inner = os.path.splitext(base)[1].lower()
+    if inner in COMPRESSORS and COMPRESSORS[inner][1] == extension:
+        return base
+    return base + default_extension
+
+def codec_for(path, operation):
+    """Función que procesa `path` según su extensión."""
+    extension = os.path.splitext(path)[1].lower()
+    table = COMPRESSORS if operation == 'compress' else DECOMPRESSORS
+    return table[extension][0]
+
+def find_files(source, operation, exclude=None):
+    """
+    Rutas relativas (ordenadas) de los archivos de `source` que tienen códec. Si se
+    indica, la carpeta `exclude` (la de destino, cuando está dentro) no se recorre.
+    """
+    exclude = os.path.abspath(exclude) if exclude else None
+    found = []
+    for directory, subdirectories, files in os.walk(source):
+        subdirectories[:] = sorted(name for name in subdirectories
+                                   if os.path.abspath(os.path.join(directory, name)) != exclude)
+        for name in sorted(files):
+            relative = os.path.relpath(os.path.join(directory, name), source)
+            if name != MANIFEST_NAME and output_name(relative, operation) is not None:
+                found.append(relative)
+    return found
+
+def load_manifest(path):
+    """Entradas del manifiesto (ruta relativa -> datos), o {} si no existe o no es válido."""
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest.get('files', {})
+
+def save_manifest(path, operation, files):
+    """Guarda el manifiesto reemplazándolo de una vez, para no dejarlo a medio escribir."""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump({'version': MANIFEST_VERSION, 'operation': operation, 'files': files},
+                  file, indent=1, sort_keys=True)
+    os.replace(temp_path, path)
+
+def is_unchanged(entry, input_path, output_path):
+    """
+    Indica si la entrada no cambió desde que se generó `output_path`. Si coinciden el
+    tamaño y la fecha basta; si solo cambió la fecha se compara el SHA-256. Devuelve
+    (sin cambios, entrada del manifiesto actualizada o None).
+    """
+    if entry is None or not os.path.exists(output_path):
+        return False, None
+    stat = os.stat(input_path)
+    if stat.st_size != entry['size']:
+        return False, None
+    if stat.st_mtime_ns == entry['mtime_ns']:
+        return True, entry
+    if file_digest(input_path) == entry['sha256']:
+        return True, dict(entry, mtime_ns=stat.st_mtime_ns)
+    return False, None
+
+def process_file(operation, input_path, output_path):
+    """
+    Procesa un archivo en un proceso del pool. Devuelve (tamaño de entrada, tamaño de
+    salida, SHA-256 de la entrada, segundos); lanza una excepción si falla.
+    """
+    start = time.perf_counter()
+    digest = file_digest(input_path)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    # La salida se escribe aparte y se mueve al terminar, para no dejar archivos rotos
+    temp_path = f'{output_path}.tmp{os.path.splitext(output_path)[1]}'
+    try:
+        # Los códecs informan por consola cada archivo que guardan
+        with contextlib.redirect_stdout(io.StringIO()) as messages:
+            codec_for(input_path, operation)(input_path, temp_path)
+        if not os.path.exists(temp_path):
+            # Los códecs lanzan sus errores; esto cubre una salida que no se escribió
+            raise ValueError(messages.getvalue().strip() or 'el códec no generó la salida')
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return (os.path.getsize(input_path), os.path.getsize(output_path), digest,
+            time.perf_counter() - start)
+
+def run_batch(operation, source, destination, workers=None, force=False, verbose=True):
+    """
+    Procesa todos los archivos de `source` y escribe los resultados en `destination`.
+    Devuelve un diccionario con los totales (archivos procesados, salteados, fallidos,
+    bytes de entrada y de salida y segundos).
+    """
+    workers = workers or parallel.default_workers()
+    os.makedirs(destination, exist_ok=True)
+    manifest_path = os.path.join(destination, MANIFEST_NAME)
+    previous = {} if force else load_manifest(manifest_path)
+    manifest = {}
+    totals = {'processed': 0, 'skipped': 0, 'failed': 0, 'input_bytes': 0, 'output_bytes': 0}
+    start = time.perf_counter()
+
+    pending = []
+    for relative in find_files(source, operation, destination):
+        input_path = os.path.join(source, relative)
+        output_path = os.path.join(destination, output_name(relative, operation))
+        unchanged, entry = is_unchanged(previous.get(relative), input_path, output_path)
+        if unchanged:
+            manifest[relative] = entry
+            totals['skipped'] += 1
+        else:
+            # La fecha se toma antes de procesar: si el archivo cambia mientras tanto,
+            # la próxima ejecución lo vuelve a procesar
+            pending.append((relative, input_path, output_path, os.stat(input_path)))
+
+    with parallel.process_pool(workers) as pool:
+        futures = {pool.submit(process_file, operation, input_path, output_path): (relative, stat)
+                   for relative, input_path, output_path, stat in pending}
+        for future in as_completed(futures):
+            relative, stat = futures[future]
+            try:
+                input_size, output_size, digest, seconds = future.result()
+            except Exception as e:
+                totals['failed'] += 1
+                print(f'ERROR  {relative}: {e}', file=sys.stderr)
+                continue
+            manifest[relative] = {
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'sha256': digest,
+                'output': output_name(relative, operation),
+            }
+            totals['processed'] += 1
+            totals['input_bytes'] += input_size
+            totals['output_bytes'] += output_size
+            if verbose:
+                print(f'{relative}: {input_size} -> {output_size} bytes en {seconds:.2f} s')
+
+    save_manifest(manifest_path, operation, manifest)
+    totals['seconds'] = time.perf_counter() - start
+    return totals
+
+def print_summary(totals):
+    seconds = totals['seconds']
+    input_mb = totals['input_bytes'] / 1e6
+    print(f"\nProcesados: {totals['processed']}  salteados: {totals['skipped']}  "
+          f"fallidos: {totals['failed']}")
+    print(f"Entrada: {input_mb:.2f} MB  salida: {totals['output_bytes'] / 1e6:.2f} MB", end='')
+    if totals['input_bytes']:
+        print(f"  relación: {totals['output_bytes'] / totals['input_bytes']:.3f}", end='')
+    print(f"\nTiempo: {seconds:.2f} s  velocidad: {input_mb / seconds if seconds else 0:.2f} MB/s")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Comprime o descomprime carpetas completas.')
+    parser.add_argument('operation', choices=('compress', 'decompress'))
+    parser.add_argument('source', help='carpeta de entrada (se recorre con sus subcarpetas)')
+    parser.add_argument('destination', help='carpeta donde se escriben los resultados')
+    parser.add_argument('--workers', type=int,
+                        help='procesos a usar (por defecto, uno por núcleo)')
+    parser.add_argument('--force', action='store_true',
+                        help='procesa todos los archivos aunque no hayan cambiado')
+    parser.add_argument('--quiet', action='store_true',
+                        help='solo muestra los errores y el resumen')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.source):
+        parser.error(f'No existe la carpeta: {args.source}')
+    totals = run_batch(args.operation, args.source, args.destination, args.workers,
+                       args.force, not args.quiet)
+    print_summary(totals)
+    return 1 if totals['failed'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
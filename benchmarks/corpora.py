@@ -0,0 +1,111 @@
+# benchmarks/corpora.py
+
+"""
+Generadores de los datos de prueba de los benchmarks. Todo se genera con una
+semilla fija, así dos ejecuciones comprimen exactamente los mismos archivos.
+"""
+
+import wave
+import numpy as np
+from PIL import Image
+
+SEED = 1234
+SAMPLE_RATE = 44100
+
+# Sílabas con las que se arman las palabras del texto "natural"
+SYLLABLES = ['da', 'to', 'com', 'pre', 'sion', 'ar', 'bol', 'co', 'di', 'go', 'es',
+             'tru', 'ctu', 'ra', 'hu', 'ff', 'man', 'de', 'la', 'el', 'en', 'que',
+             'ni', 'ño', 'pa', 'la', 'bra', 'si', 'mo', 'ción', 'par', 'te']
+
+def text_low(size, rng):
+    """Texto muy repetitivo: pocas palabras, poca entropía."""
+    words = np.array(['datos', 'compresion', 'huffman', 'arbol', 'codigo', 'datos', 'datos'])
+    return make_text(words, rng.integers(0, len(words), size // 6), size)
+
+def text_mid(size, rng):
+    """Texto parecido al natural: vocabulario amplio con frecuencias tipo Zipf."""
+    vocabulary = np.array([''.join(rng.choice(SYLLABLES, rng.integers(1, 5)))
+                           for _ in range(4000)])
+    indexes = np.minimum(rng.zipf(1.3, size // 5), len(vocabulary)) - 1
+    return make_text(vocabulary, indexes, size)
+
+def text_high(size, rng):
+    """Bytes aleatorios: no se pueden comprimir."""
+    return rng.integers(0, 256, size, dtype=np.uint8).tobytes()
+
+def make_text(words, indexes, size):
+    """Une las palabras elegidas con espacios y saltos de línea y recorta a `size` bytes."""
+    lines = [' '.join(words[indexes[i:i + 12]]) for i in range(0, len(indexes), 12)]
+    data = '\n'.join(lines).encode('utf-8')
+    while len(data) < size:
+        data += data
+    return data[:size]
+
+def image_side(size):
+    """Lado de una imagen RGB cuadrada de aproximadamente `size` bytes."""
+    return max(1, int((size / 3) ** 0.5))
+
+def image_flat(size, rng):
+    """Imagen con grandes regiones de color plano (rectángulos superpuestos)."""
+    side = image_side(size)
+    pixels = np.zeros((side, side, 3), dtype=np.uint8)
+    for _ in range(60):
+        top, left = rng.integers(0, side, 2)
+        height, width = rng.integers(1, side // 2 + 2, 2)
+        pixels[top:top + height, left:left + width] = rng.integers(0, 256, 3)
+    return Image.fromarray(pixels, 'RGB')
+
+def image_noisy(size, rng):
+    """Imagen de ruido: cada píxel distinto del anterior, el peor caso para RLE."""
+    side = image_side(size)
+    return Image.fromarray(rng.integers(0, 256, (side, side, 3), dtype=np.uint8), 'RGB')
+
+def audio_signal(size, sampwidth, rng, tone):
+    """Señal estéreo en el rango [-1, 1]: dos tonos con un poco de ruido, o solo ruido."""
+    frames = size // (2 * sampwidth)
+    if not tone:
+        return rng.uniform(-1, 1, (frames, 2))
+    t = np.arange(frames) / SAMPLE_RATE
+    left = 0.5 * np.sin(2 * np.pi * 440 * t) + 0.2 * np.sin(2 * np.pi * 97 * t)
+    right = 0.5 * np.sin(2 * np.pi * 440 * t + 0.3) + 0.2 * np.sin(2 * np.pi * 131 * t)
+    return np.stack((left, right), axis=1) + rng.normal(0, 0.002, (frames, 2))
+
+def audio_frames(signal, sampwidth):
+    """Convierte la señal en frames PCM (8 bits sin signo o 16 bits con signo)."""
+    if sampwidth == 1:
+        return np.clip(signal * 127 + 128, 0, 255).astype(np.uint8).tobytes()
+    return np.clip(signal * 32767, -32768, 32767).astype('<i2').tobytes()
+
+def write_text(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def write_wav(path, frames, sampwidth):
+    with wave.open(path, 'wb') as audio_file:
+        audio_file.setnchannels(2)
+        audio_file.setsampwidth(sampwidth)
+        audio_file.setframerate(SAMPLE_RATE)
+        audio_file.writeframes(frames)
+
+def audio_corpus(sampwidth, tone):
+    def generate(size, rng):
+        return audio_frames(audio_signal(size, sampwidth, rng, tone), sampwidth)
+    return generate
+
+# nombre -> (familia, extensión, generador, función que lo guarda)
+CORPORA = {
+    'text-low': ('text', '.txt', text_low, write_text),
+    'text-mid': ('text', '.txt', text_mid, write_text),
+    'text-high': ('text', '.txt', text_high, write_text),
+    'image-flat': ('image', '.bmp', image_flat, lambda path, img: img.save(path)),
+    'image-noisy': ('image', '.bmp', image_noisy, lambda path, img: img.save(path)),
+    'tone-8bit': ('audio', '.wav', audio_corpus(1, True), lambda path, f: write_wav(path, f, 1)),
+    'tone-16bit': ('audio', '.wav', audio_corpus(2, True), lambda path, f: write_wav(path, f, 2)),
+    'noise-8bit': ('audio', '.wav', audio_corpus(1, False), lambda path, f: write_wav(path, f, 1)),
+    'noise-16bit': ('audio', '.wav', audio_corpus(2, False), lambda path, f: write_wav(path, f, 2)),
+}
+
+def generate_corpus(name, size, path):
+    """Genera el corpus `name` de aproximadamente `size` bytes y lo guarda en `path`."""
+    _, _, generate, save = CORPORA[name]
+    save(path, generate(size, np.random.default_rng(SEED)))
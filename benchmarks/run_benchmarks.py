@@ -0,0 +1,304 @@
+# benchmarks/run_benchmarks.py
+
+"""
+Benchmarks de los tres códecs sobre datos generados (ver corpora.py).
+
+Para cada códec, corpus y tamaño informa la velocidad de compresión y de
+descompresión (MB/s sobre el tamaño original, el mejor de `--repeat` intentos), el
+pico de memoria (RSS) y la relación de compresión (comprimido / original). Cada
+caso corre en un proceso nuevo, así el pico de memoria es el de ese caso, sumando
+los procesos que lanzan los códecs por bloques.
+
+Uso:
+    python benchmarks/run_benchmarks.py --sizes 1,4 --save-baseline benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json
+
+Con --baseline el programa termina con código 1 si algún caso es más lento que la
+línea base en más de `--tolerance` o comprime peor.
+"""
+
+import argparse
+import contextlib
+import functools
+import io
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image
+
+from compression_logic import audio_comp, huffman, rle_image
+from corpora import CORPORA, generate_corpus
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Cada cuántos segundos se mide la memoria de los procesos de un caso
+RSS_SAMPLE_INTERVAL = 0.05
+
+# Un caso comprime peor que la línea base si su relación empeora más que esto
+RATIO_TOLERANCE = 0.01
+
+def same_bytes(path_a, path_b):
+    with open(path_a, 'rb') as a, open(path_b, 'rb') as b:
+        return a.read() == b.read()
+
+def same_pixels(path_a, path_b):
+    with Image.open(path_a) as a, Image.open(path_b) as b:
+        return a.mode == b.mode and a.size == b.size and a.tobytes() == b.tobytes()
+
+def same_frames(path_a, path_b):
+    with wave.open(path_a, 'rb') as a, wave.open(path_b, 'rb') as b:
+        return (a.getparams()[:3] == b.getparams()[:3]
+                and a.readframes(a.getnframes()) == b.readframes(b.getnframes()))
+
+# códec -> (familia de corpus, compresor, descompresor, extensión comprimida,
+#           extensión de salida, comparación de la salida con la entrada)
+CODECS = {
+    'huffman': ('text', huffman.compress, huffman.decompress, '.huff', '.txt', same_bytes),
+    'huffman-blocks': ('text', huffman.compress_blocks, huffman.decompress, '.huff', '.txt',
+                       same_bytes),
+    'rle': ('image', rle_image.compress_image, rle_image.decompress_image, '.rle', '.bmp',
+            same_pixels),
+    'rle-runs': ('image', functools.partial(rle_image.compress_image, method=rle_image.METHOD_RUNS),
+                 rle_image.decompress_image, '.rle', '.bmp', same_pixels),
+    'audio-huffman': ('audio', audio_comp.compress_audio, audio_comp.decompress_audio,
+                      '.huffaudio', '.wav', same_frames),
+    'audio-predictive': ('audio', audio_comp.compress_audio_predictive,
+                         audio_comp.decompress_audio, '.huffaudio', '.wav', same_frames),
+}
+
+def rusage_peak_mb():
+    """
+    Pico de memoria residente en MB del proceso actual y del mayor de sus hijos ya
+    terminados, o None si no se puede medir.
+    """
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # Linux lo informa en KB y macOS en bytes
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+def process_tree_rss(root):
+    """
+    Memoria residente en bytes del proceso `root` más la de todos sus descendientes
+    (los procesos de los códecs cuelgan del servidor de forkserver, que es hijo del
+    caso), leyendo /proc. Las páginas compartidas se cuentan en cada proceso.
+    """
+    children = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat', 'rb') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # El nombre del programa va entre paréntesis y puede tener espacios
+        ppid = int(stat[stat.rindex(b')') + 2:].split()[1])
+        children.setdefault(ppid, []).append(int(name))
+    total = 0
+    pending = [root]
+    while pending:
+        pid = pending.pop()
+        try:
+            with open(f'/proc/{pid}/statm') as f:
+                total += int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except OSError:
+            pass
+        pending.extend(children.get(pid, ()))
+    return total
+
+class TreeRssSampler:
+    """
+    Mide en un hilo, mientras está activo, el pico de `process_tree_rss` del proceso
+    actual. Solo funciona donde existe /proc (Linux); si no, `peak` queda en 0.
+    """
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while True:
+            self.peak = max(self.peak, process_tree_rss(os.getpid()))
+            if self.stopped.wait(self.interval):
+                return
+
+    def __enter__(self):
+        if os.path.isdir('/proc'):
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+
+def peak_rss_mb(sampler):
+    """Pico de memoria de un caso en MB: lo medido por `sampler` o por getrusage."""
+    peaks = [peak for peak in (rusage_peak_mb(), sampler.peak / (1 << 20) or None)
+             if peak is not None]
+    return max(peaks) if peaks else None
+
+def best_time(function, repeat):
+    """Mejor tiempo de `repeat` ejecuciones de `function()`."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def run_case(codec, source, workdir, repeat):
+    """Ejecuta un caso (en un proceso propio) y devuelve sus métricas."""
+    _, compress, decompress, packed_ext, output_ext, same = CODECS[codec]
+    base = os.path.join(workdir, f'{codec}-{os.path.basename(source)}')
+    packed = base + packed_ext
+    output = base + '.out' + output_ext
+
+    # Los códecs informan por consola cada archivo que guardan
+    with contextlib.redirect_stdout(io.StringIO()), TreeRssSampler() as sampler:
+        compress_time = best_time(lambda: compress(source, packed), repeat)
+        decompress_time = best_time(lambda: decompress(packed, output), repeat)
+
+    original_size = os.path.getsize(source)
+    compressed_size = os.path.getsize(packed)
+    result = {
+        'original_size': original_size,
+        'compressed_size': compressed_size,
+        'ratio': round(compressed_size / original_size, 4) if original_size else None,
+        'compress_mbps': round(original_size / 1e6 / compress_time, 2),
+        'decompress_mbps': round(original_size / 1e6 / decompress_time, 2),
+        'peak_rss_mb': peak_rss_mb(sampler),
+        'roundtrip_ok': same(source, output),
+    }
+    for path in (packed, output):
+        os.remove(path)
+    return result
+
+def case_key(result):
+    return (result['codec'], result['corpus'], result['size_mb'])
+
+def compare(results, baseline, tolerance):
+    """Devuelve las regresiones respecto de la línea base, como mensajes."""
+    previous = {case_key(result): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get(case_key(result))
+        if old is None:
+            continue
+        name = '{} {} {}MB'.format(*case_key(result))
+        for metric in ('compress_mbps', 'decompress_mbps'):
+            if result[metric] < old[metric] * (1 - tolerance):
+                regressions.append(f'{name}: {metric} {old[metric]} -> {result[metric]}')
+        if old['ratio'] is not None and result['ratio'] > old['ratio'] * (1 + RATIO_TOLERANCE):
+            regressions.append(f"{name}: ratio {old['ratio']} -> {result['ratio']}")
+        if not result['roundtrip_ok']:
+            regressions.append(f'{name}: la descompresión no reproduce la entrada')
+    return regressions
+
+def print_table(results):
+    header = f"{'códec':<17} {'corpus':<12} {'MB':>4} {'ratio':>7} {'comp MB/s':>10} {'desc MB/s':>10} {'RSS MB':>8}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        rss = f"{r['peak_rss_mb']:.0f}" if r['peak_rss_mb'] is not None else '-'
+        ratio = f"{r['ratio']:.3f}" if r['ratio'] is not None else '-'
+        mark = '' if r['roundtrip_ok'] else '  ¡SALIDA DISTINTA!'
+        print(f"{r['codec']:<17} {r['corpus']:<12} {r['size_mb']:>4g} {ratio:>7} "
+              f"{r['compress_mbps']:>10.2f} {r['decompress_mbps']:>10.2f} {rss:>8}{mark}")
+
+def parse_list(value):
+    return [item for item in value.split(',') if item]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks de los códecs de compresión.')
+    parser.add_argument('--codecs', type=parse_list, default=list(CODECS),
+                        help='códecs separados por comas (por defecto, todos)')
+    parser.add_argument('--corpora', type=parse_list, default=list(CORPORA),
+                        help='corpus separados por comas (por defecto, todos)')
+    parser.add_argument('--sizes', type=parse_list, default=['1', '4'],
+                        help='tamaños en MB separados por comas (por defecto 1,4)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='repeticiones por caso; se informa la mejor')
+    parser.add_argument('--output', help='guarda los resultados en este JSON')
+    parser.add_argument('--save-baseline', help='guarda los resultados como línea base')
+    parser.add_argument('--baseline', help='compara con esta línea base')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='caída de velocidad aceptada respecto de la línea base (0.25 = 25%%)')
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.codecs if name not in CODECS]
+    unknown += [name for name in args.corpora if name not in CORPORA]
+    if unknown:
+        parser.error(f"Nombres desconocidos: {', '.join(unknown)}")
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory(prefix='bench-') as workdir:
+        for size_mb in (float(size) for size in args.sizes):
+            for corpus in args.corpora:
+                family, extension = CORPORA[corpus][:2]
+                codecs = [codec for codec in args.codecs if CODECS[codec][0] == family]
+                if not codecs:
+                    continue
+                source = os.path.join(workdir, f'{corpus}-{size_mb:g}MB{extension}')
+                generate_corpus(corpus, int(size_mb * 1e6), source)
+                for codec in codecs:
+                    # Un proceso nuevo por caso, para medir su pico de memoria
+                    with ProcessPoolExecutor(1, mp_context=context) as pool:
+                        result = pool.submit(run_case, codec, source, workdir, args.repeat).result()
+                    result = {'codec': codec, 'corpus': corpus, 'size_mb': size_mb, **result}
+                    results.append(result)
+                    print(f'{codec} {corpus} {size_mb:g} MB: listo', flush=True)
+                os.remove(source)
+
+    print()
+    print_table(results)
+    report = {
+        'meta': {
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            print(f'\nResultados guardados en: {path}')
+
+    failed = [r for r in results if not r['roundtrip_ok']]
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print('\nRegresiones respecto de la línea base:')
+            for message in regressions:
+                print(f'  {message}')
+            return 1
+        print('\nSin regresiones respecto de la línea base.')
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,81 +1,389 @@
 # compression_logic/audio_comp.py
 
+import struct
 import wave
-import pickle
+import zlib
+import numpy as np
+from . import container
 from . import huffman # Reutilizamos el módulo de Huffman
+from . import parallel
+from . import progress as progress_tracking
+from .metrics import count_bytes, stage
 
-def compress_audio(input_path, output_path):
+# Frames por bloque en el modo con predicción
+PREDICTIVE_BLOCK_FRAMES = 1 << 16
+# Orden máximo de los predictores polinómicos fijos
+MAX_ORDER = 3
+def read_frames(audio_file, frames_per_chunk):
+    """Lee los frames de un WAV abierto por bloques de tamaño fijo."""
+    while True:
+        frames = audio_file.readframes(frames_per_chunk)
+        if not frames:
+            return
+        yield frames
+
+def open_wav(input_path):
+    """Abre un .wav para leerlo; si no es un WAV válido lanza ValueError."""
+    try:
+        return wave.open(input_path, 'rb')
+    except (wave.Error, EOFError, struct.error) as e:
+        raise ValueError(f"Error al leer el archivo WAV: {e}") from e
+
+def compress_audio(input_path, output_path, chunk_size=huffman.CHUNK_SIZE, progress=None):
     """
     Comprime un archivo de audio .wav tratando sus frames como datos binarios
     [cite_start]y aplicando el algoritmo de Huffman. [cite: 16, 18, 19]
+    Los frames se leen por bloques dos veces (frecuencias y luego codificación),
+    sin cargar el audio completo en memoria.
+    `progress`, si se indica, recibe la fracción completada (0 a 1).
     """
-    try:
-        # Abrir el archivo WAV y leer sus frames y parámetros
-        with wave.open(input_path, 'rb') as audio_file:
-            params = audio_file.getparams()
-            frames = audio_file.readframes(params.nframes)
-    except Exception as e:
-        print(f"Error al leer el archivo WAV: {e}")
-        return
-
-    # Usamos la lógica de Huffman para comprimir los bytes de los frames
-    frequency = huffman.make_frequency_dict(frames)
-    heap = huffman.make_heap(frequency)
-    root = huffman.merge_nodes(heap)
-    
-    # Limpiamos los diccionarios globales de Huffman antes de usarlos
-    huffman.codes = {}
-    huffman.reverse_mapping = {}
-    
-    huffman.make_codes(root)
-
-    encoded_text = ""
-    for byte_val in frames:
-        encoded_text += huffman.codes[byte_val]
-    
-    padded_encoded_text = huffman.pad_encoded_text(encoded_text)
-    byte_array = huffman.get_byte_array(padded_encoded_text)
-    
-    # [cite_start]Guardamos los parámetros del WAV y los datos comprimidos en un archivo [cite: 20]
-    with open(output_path, 'wb') as f:
-        pickle.dump({'params': params, 'codes': huffman.reverse_mapping, 'data': byte_array}, f)
+    audio_file = open_wav(input_path)
+
+    with audio_file:
+        params = audio_file.getparams()
+        frame_size = params.sampwidth * params.nchannels
+        frames_per_chunk = max(1, chunk_size // frame_size)
+        total = params.nframes * frame_size
+
+        # Usamos la lógica de Huffman para comprimir los bytes de los frames
+        chunks = progress_tracking.track(read_frames(audio_file, frames_per_chunk),
+                                         progress, total, 0.0, 0.5)
+        with stage('audio.count_frequencies'):
+            frequency = huffman.count_frequencies(chunks)
+        with stage('audio.build_codec'):
+            codec = huffman.choose_codec(frequency)
+        original_size = sum(frequency.values())
+        count_bytes('audio.count_frequencies', original_size)
+
+        # [cite_start]Guardamos los parámetros del WAV y los datos comprimidos en un archivo [cite: 20]
+        section = container.AUDIO_PARAMS.pack(params.nchannels, params.sampwidth,
+                                              params.framerate, original_size // frame_size)
+        section += container.pack_huffman_section(codec.encoded_size(frequency), codec.lengths,
+                                                  codec.table_id)
+
+        audio_file.rewind()
+        with open(output_path, 'wb') as f:
+            writer = container.ContainerWriter(f, container.KIND_AUDIO, len(section))
+            chunks = progress_tracking.track(read_frames(audio_file, frames_per_chunk),
+                                             progress, total, 0.5, 0.5)
+            with stage('audio.encode'):
+                huffman.write_encoded_stream(chunks, codec, writer)
+            writer.close(section, original_size)
+        count_bytes('audio.encode', original_size)
+        count_bytes('audio.encode', writer.payload_size, 'out')
+
+    print(f"Audio comprimido guardado en: {output_path}")
+
+def compress_audio_blocks(input_path, output_path, block_size=huffman.BLOCK_SIZE, workers=None,
+                          progress=None):
+    """
+    Comprime un archivo .wav dividiendo sus frames en bloques independientes que se
+    comprimen en paralelo en varios procesos.
+    `progress`, si se indica, recibe la fracción completada (0 a 1).
+    """
+    audio_file = open_wav(input_path)
+
+    with audio_file, open(output_path, 'wb') as f:
+        params = audio_file.getparams()
+        frame_size = params.sampwidth * params.nchannels
+        frames_per_block = max(1, block_size // frame_size)
+
+        section_size = container.AUDIO_PARAMS.size + container.BLOCKS_SECTION.size
+        writer = container.ContainerWriter(f, container.KIND_AUDIO, section_size)
+        blocks = progress_tracking.track(read_frames(audio_file, frames_per_block),
+                                         progress, params.nframes * frame_size)
+        with stage('audio.encode_blocks'):
+            original_size = huffman.write_blocks(blocks, writer, workers)
+        count_bytes('audio.encode_blocks', original_size)
+        count_bytes('audio.encode_blocks', writer.payload_size, 'out')
+
+        section = container.AUDIO_PARAMS.pack(params.nchannels, params.sampwidth,
+                                              params.framerate, original_size // frame_size)
+        section += container.BLOCKS_SECTION.pack(frames_per_block * frame_size)
+        writer.close(section, original_size, container.FLAG_BLOCKS)
 
     print(f"Audio comprimido guardado en: {output_path}")
 
-def decompress_audio(input_path, output_path):
+# --- Modo con predicción ---
+
+def samples_from_frames(frames, nchannels, sampwidth, center=True):
+    """
+    Convierte los bytes PCM de un WAV en una matriz int64 (frames, canales). Las
+    muestras de 8 bits no tienen signo: con `center` se centran en cero.
+    """
+    if sampwidth == 1:
+        samples = np.frombuffer(frames, dtype=np.uint8).astype(np.int64)
+        if center:
+            samples -= 128
+    elif sampwidth == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3).astype(np.int64)
+        samples = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        samples -= (samples & 0x800000) << 1
+    else:
+        samples = np.frombuffer(frames, dtype=f'<i{sampwidth}').astype(np.int64)
+    return samples.reshape(-1, nchannels)
+
+def frames_from_samples(samples, sampwidth, center=True):
+    """Inversa de `samples_from_frames`: vuelve a los bytes PCM del WAV."""
+    flat = samples.reshape(-1)
+    if sampwidth == 1:
+        return (flat + 128 if center else flat).astype(np.uint8).tobytes()
+    if sampwidth == 3:
+        return flat.astype('<i4').view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    return flat.astype(f'<i{sampwidth}').tobytes()
+
+def decorrelate(samples):
+    """En estéreo reemplaza (izquierdo, derecho) por (medio, lado), sin pérdida."""
+    if samples.shape[1] != 2:
+        return samples
+    left, right = samples[:, 0], samples[:, 1]
+    side = left - right
+    return np.stack((right + (side >> 1), side), axis=1)
+
+def correlate(channels):
+    """Inversa de `decorrelate`."""
+    if channels.shape[1] != 2:
+        return channels
+    mid, side = channels[:, 0], channels[:, 1]
+    right = mid - (side >> 1)
+    return np.stack((side + right, right), axis=1)
+
+def best_residual(signal):
+    """
+    Prueba los predictores polinómicos fijos (diferencias sucesivas) hasta MAX_ORDER
+    y devuelve (orden, residuo) del que deja residuos más chicos.
+    """
+    best_order, best = 0, signal
+    best_cost = np.abs(signal).sum()
+    residual = signal
+    for order in range(1, MAX_ORDER + 1):
+        residual = np.diff(residual, prepend=0)
+        cost = np.abs(residual).sum()
+        if cost < best_cost:
+            best_order, best, best_cost = order, residual, cost
+    return best_order, best
+
+def encode_predictive_block(frames, nchannels, sampwidth):
+    """
+    Comprime un bloque de frames (se ejecuta en los procesos del pool): separa medio
+    y lado, aplica a cada canal el mejor predictor fijo y codifica los residuos en
+    zigzag por planos de bytes. Si así no se achica, guarda los frames sin comprimir.
+    Devuelve (bloque, tamaño original, frames).
+    """
+    channels = decorrelate(samples_from_frames(frames, nchannels, sampwidth))
+    parts = [bytes((container.BLOCK_PREDICTED,))]
+    for signal in channels.T:
+        order, residual = best_residual(signal)
+        # Zigzag: 0, -1, 1, -2... -> 0, 1, 2, 3...
+        zigzag = ((residual << 1) ^ (residual >> 63)).view(np.uint64)
+        nplanes = (int(zigzag.max()).bit_length() + 7) // 8 if len(zigzag) else 0
+        parts.append(container.CHANNEL_HEADER.pack(order, nplanes))
+        for plane in range(nplanes):
+            parts.append(huffman.encode_plane((zigzag >> np.uint64(8 * plane)).astype(np.uint8)))
+    block = b''.join(parts)
+    if len(block) > len(frames):
+        block = bytes((container.BLOCK_VERBATIM,)) + bytes(frames)
+    return block, len(frames), len(channels)
+
+def decode_predictive_block(block, frame_count, nchannels, sampwidth, crc, typed=True):
+    """
+    Verifica y decodifica un bloque generado por `encode_predictive_block`. Sin
+    `typed` el bloque es del formato anterior al tipo de bloque (sin flag 8).
+    """
+    if zlib.crc32(block) != crc:
+        raise container.ContainerError("Los datos del archivo están dañados (CRC incorrecto)")
+    offset = 0
+    if typed:
+        with container.malformed_data():
+            block_type = block[0]
+        offset = 1
+        if block_type == container.BLOCK_VERBATIM:
+            if len(block) - 1 != frame_count * nchannels * sampwidth:
+                raise container.ContainerError("El tamaño de un bloque no es válido")
+            return bytes(block[1:])
+        if block_type != container.BLOCK_PREDICTED:
+            raise container.ContainerError("El tipo de un bloque no es válido")
+    channels = np.empty((frame_count, nchannels), dtype=np.int64)
+    for channel in range(nchannels):
+        with container.malformed_data():
+            order, nplanes = container.CHANNEL_HEADER.unpack_from(block, offset)
+        if order > MAX_ORDER or nplanes > 8:
+            raise container.ContainerError("La cabecera de un canal no es válida")
+        offset += container.CHANNEL_HEADER.size
+        zigzag = np.zeros(frame_count, dtype=np.uint64)
+        for plane in range(nplanes):
+            values, offset = huffman.decode_plane(block, offset, frame_count)
+            zigzag |= values.astype(np.uint64) << np.uint64(8 * plane)
+        residual = (zigzag >> np.uint64(1)).view(np.int64) ^ -(zigzag & np.uint64(1)).view(np.int64)
+        for _ in range(order):
+            residual = np.cumsum(residual)
+        channels[:, channel] = residual
+    return frames_from_samples(correlate(channels), sampwidth, center=typed)
+
+def compress_audio_predictive(input_path, output_path, block_frames=PREDICTIVE_BLOCK_FRAMES,
+                              workers=None, progress=None):
+    """
+    Comprime un archivo .wav sin pérdida leyendo sus muestras según el ancho y los
+    canales del WAV: separa medio y lado en estéreo, predice cada muestra a partir
+    de las anteriores y codifica con Huffman solo los residuos, que son mucho más
+    chicos que las muestras. Los bloques se comprimen en paralelo.
+    `progress`, si se indica, recibe la fracción completada (0 a 1).
+    """
+    audio_file = open_wav(input_path)
+
+    with audio_file, open(output_path, 'wb') as f:
+        params = audio_file.getparams()
+        frame_size = params.sampwidth * params.nchannels
+        if params.nframes * frame_size < huffman.PARALLEL_MIN_SIZE:
+            # Con pocos bloques no conviene levantar el pool de procesos
+            workers = 1
+
+        section_size = container.AUDIO_PARAMS.size + container.BLOCKS_SECTION.size
+        writer = container.ContainerWriter(f, container.KIND_AUDIO, section_size)
+        blocks = progress_tracking.track(read_frames(audio_file, block_frames),
+                                         progress, params.nframes * frame_size)
+        items = ((frames, params.nchannels, params.sampwidth) for frames in blocks)
+        entries = []
+        with stage('audio.predictive_encode'):
+            for block, original_size, frame_count in parallel.imap_ordered(encode_predictive_block,
+                                                                             items, workers):
+                entries.append((writer.payload_size, len(block), original_size, frame_count,
+                                zlib.crc32(block)))
+                writer.write(block)
+        writer.write(container.pack_block_index(entries))
+        original_size = sum(entry[2] for entry in entries)
+        count_bytes('audio.predictive_encode', original_size)
+        count_bytes('audio.predictive_encode', writer.payload_size, 'out')
+
+        section = container.AUDIO_PARAMS.pack(params.nchannels, params.sampwidth,
+                                              params.framerate, original_size // frame_size)
+        section += container.BLOCKS_SECTION.pack(block_frames)
+        writer.close(section, original_size, container.FLAG_BLOCKS | container.FLAG_PREDICTIVE
+                     | container.FLAG_BLOCK_TYPES)
+
+    print(f"Audio comprimido guardado en: {output_path}")
+
+def iter_decode_predictive(file, info, section, workers=None, start=0, end=None):
+    """
+    Decodifica en paralelo los bloques de un archivo con predicción, en orden. Con
+    `start` y `end` (en bytes de frames) solo se decodifican los bloques del rango.
+    """
+    nchannels, sampwidth, _, _ = container.AUDIO_PARAMS.unpack_from(section)
+    (block_frames,) = container.BLOCKS_SECTION.unpack_from(section, container.AUDIO_PARAMS.size)
+    typed = bool(info.flags & container.FLAG_BLOCK_TYPES)
+
+    def make_item(block, entry):
+        _, _, original_size, frame_count, crc = entry
+        if original_size != frame_count * nchannels * sampwidth or frame_count > block_frames:
+            raise container.ContainerError("El índice de bloques no es válido")
+        return block, frame_count, nchannels, sampwidth, crc, typed
+
+    end = info.original_size if end is None else end
+    if end - start < huffman.PARALLEL_MIN_SIZE:
+        # Con pocos bloques no conviene levantar el pool de procesos
+        workers = 1
+    return huffman.iter_block_range(file, info, start, end, decode_predictive_block, make_item,
+                                    workers)
+
+def iter_decode_frames(file, info, section, start_frame, end_frame, workers=None):
+    """
+    Decodifica solo los frames [start_frame, end_frame) de un archivo abierto y
+    posicionado al inicio de los datos, con cualquiera de los tres modos. En los
+    modos por bloques solo se leen los bloques que los contienen.
+    """
+    nchannels, sampwidth, _, _ = container.AUDIO_PARAMS.unpack_from(section)
+    frame_size = nchannels * sampwidth
+    start, end = start_frame * frame_size, end_frame * frame_size
+    if info.flags & container.FLAG_PREDICTIVE:
+        return iter_decode_predictive(file, info, section, workers, start,
+                                      min(end, info.original_size))
+    return huffman.iter_decode_range(file, info, section, start, end, workers,
+                                     section_offset=container.AUDIO_PARAMS.size)
+
+def decompress_audio(input_path, output_path, chunk_size=huffman.CHUNK_SIZE, workers=None,
+                     progress=None):
     """
     [cite_start]Descomprime un archivo de audio y lo reconstruye a formato .wav. [cite: 20]
+    Si el archivo se comprimió por bloques (con o sin predicción), éstos se
+    decodifican en paralelo. Lanza container.ContainerError si el archivo no es válido.
+    `progress`, si se indica, recibe la fracción completada (0 a 1).
     """
-    try:
-        with open(input_path, 'rb') as f:
-            data_dict = pickle.load(f)
-    except Exception as e:
-        print(f"Error al leer el archivo de audio comprimido: {e}")
-        return
-    
-    params = data_dict['params']
-    reverse_mapping = data_dict['codes']
-    byte_array = data_dict['data']
-
-    # Convertir el array de bytes de nuevo a un bit string
-    bit_string = ""
-    for byte in byte_array:
-        bits = bin(byte)[2:].rjust(8, '0')
-        bit_string += bits
-        
-    # Usar la lógica de descompresión de Huffman
-    encoded_text = huffman.remove_padding(bit_string)
-
-    # Establecer el mapa de decodificación
-    huffman.reverse_mapping = reverse_mapping
-    decoded_bytes_list = huffman.decode_text(encoded_text)
-    
-    # Convertir la lista de enteros de bytes a un objeto 'bytes'
-    decoded_frames = bytes(decoded_bytes_list)
-    
-    # Escribir el nuevo archivo .wav reconstruido
-    with wave.open(output_path, 'wb') as audio_file:
-        audio_file.setparams(params)
-        audio_file.writeframes(decoded_frames)
-
-    print(f"Audio descomprimido y guardado en: {output_path}")
\ No newline at end of file
+    with container.open_input(input_path) as f:
+        info, section = container.read_container(f, container.KIND_AUDIO)
+        nchannels, sampwidth, framerate, nframes = container.AUDIO_PARAMS.unpack_from(section)
+        if info.flags & container.FLAG_PREDICTIVE:
+            pieces = iter_decode_predictive(f, info, section, workers)
+        elif info.flags & container.FLAG_BLOCKS:
+            pieces = huffman.iter_decode_blocks(f, info, workers)
+        else:
+            total_bits, lengths = container.unpack_huffman_section(section, container.AUDIO_PARAMS.size)
+            pieces = huffman.iter_decode_stream(container.iter_payload(f, info, chunk_size),
+                                                lengths, total_bits, info.original_size)
+        pieces = progress_tracking.track(pieces, progress, info.original_size)
+
+        # Escribir el nuevo archivo .wav reconstruido a medida que se decodifica
+        with stage('audio.decode'):
+            write_wav(output_path, nchannels, sampwidth, framerate, nframes, pieces)
+    count_bytes('audio.decode', info.payload_size)
+    count_bytes('audio.decode', info.original_size, 'out')
+
+    print(f"Audio descomprimido y guardado en: {output_path}")
+
+def wav_header(nchannels, sampwidth, framerate, nframes):
+    """Cabecera RIFF de 44 bytes de un WAV PCM, la misma que escribe el módulo wave."""
+    data_size = nframes * nchannels * sampwidth
+    return (b'RIFF' + struct.pack('<I', 36 + data_size) + b'WAVE'
+            + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, nchannels, framerate,
+                                    framerate * nchannels * sampwidth, nchannels * sampwidth,
+                                    sampwidth * 8)
+            + b'data' + struct.pack('<I', data_size))
+
+def write_wav(output_path, nchannels, sampwidth, framerate, nframes, pieces):
+    """
+    Escribe un .wav con los frames que se van decodificando. Como el tamaño se conoce
+    de antemano, la salida se reserva completa (ver `container.open_output`).
+    """
+    header = wav_header(nchannels, sampwidth, framerate, nframes)
+    data_size = nframes * nchannels * sampwidth
+    with container.open_output(output_path, len(header) + data_size) as output:
+        output.write(header)
+        for piece in pieces:
+            output.write(piece)
+
+def iter_decompress_audio(input_path, start=0.0, end=None, workers=None):
+    """
+    Generador con el .wav reconstruido (cabecera y frames) a medida que se
+    decodifica, sin escribir nada en disco. Con `start` y `end` (segundos) solo se
+    entrega ese fragmento. La cabecera del archivo comprimido se valida antes de
+    entregar la primera parte.
+    """
+    with container.open_input(input_path) as f:
+        info, section = container.read_container(f, container.KIND_AUDIO)
+        nchannels, sampwidth, framerate, nframes = container.AUDIO_PARAMS.unpack_from(section)
+        start_frame = min(max(int(start * framerate), 0), nframes)
+        end_frame = nframes if end is None else min(max(int(end * framerate), start_frame), nframes)
+        yield wav_header(nchannels, sampwidth, framerate, end_frame - start_frame)
+        yield from iter_decode_frames(f, info, section, start_frame, end_frame, workers)
+
+def decompress_audio_range(input_path, output_path, start=0.0, end=None, workers=None,
+                           progress=None):
+    """
+    Reconstruye a .wav solo el fragmento entre los segundos `start` y `end` (hasta el
+    final si es None), decodificando solo los bloques que lo contienen. Lanza
+    container.ContainerError si el archivo no es válido.
+    `progress`, si se indica, recibe la fracción completada (0 a 1).
+    """
+    with container.open_input(input_path) as f:
+        info, section = container.read_container(f, container.KIND_AUDIO)
+        nchannels, sampwidth, framerate, nframes = container.AUDIO_PARAMS.unpack_from(section)
+        start_frame = min(max(int(start * framerate), 0), nframes)
+        end_frame = nframes if end is None else min(max(int(end * framerate), start_frame), nframes)
+        pieces = iter_decode_frames(f, info, section, start_frame, end_frame, workers)
+        frame_count = end_frame - start_frame
+        pieces = progress_tracking.track(pieces, progress, frame_count * nchannels * sampwidth)
+
+        with stage('audio.decode_range'):
+            write_wav(output_path, nchannels, sampwidth, framerate, frame_count, pieces)
+    count_bytes('audio.decode_range', frame_count * nchannels * sampwidth, 'out')
+
+    print(f"Audio descomprimido y guardado en: {output_path}")
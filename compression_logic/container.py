@@ -0,0 +1,577 @@
+# compression_logic/container.py
+
+"""
+Formato binario de los archivos comprimidos (.huff, .huffaudio y .rle).
+
+Todos los enteros se guardan en little-endian. Un archivo tiene tres partes:
+
+1. Cabecera fija de 36 bytes:
+
+   ============== ==== ====================================================
+   Campo          Tipo Descripción
+   ============== ==== ====================================================
+   magic          4s   b'P3CF'
+   version        B    versión del formato (1)
+   kind           B    1 = texto, 2 = audio, 3 = imagen
+   flags          H    1 = datos divididos en bloques independientes,
+                       2 = audio con predicción (junto con el 1),
+                       4 = imagen con método de codificación por planos,
+                       8 = audio con predicción con tipo de bloque
+   section_size   I    tamaño en bytes de la sección de parámetros
+   original_size  Q    tamaño en bytes de los datos ya descomprimidos
+   payload_size   Q    tamaño en bytes de los datos comprimidos
+   payload_crc    I    CRC32 de los datos comprimidos
+   header_crc     I    CRC32 de los campos anteriores más la sección
+   ============== ==== ====================================================
+
+2. Sección de parámetros (`section_size` bytes), propia de cada tipo:
+
+   - Texto: sección de Huffman (ver abajo).
+   - Audio: parámetros del WAV `<HHIQ` (canales, ancho de muestra, frecuencia,
+     cantidad de frames) seguidos de la sección de Huffman.
+   - Imagen: `<II4sBQ` (ancho, alto, modo de PIL, bytes por píxel, cantidad de
+     corridas) seguido, con el flag 4, de `<BBB` (colores, filtro, disposición; ver
+     más abajo) y, en las imágenes con paleta, de la paleta RGB.
+
+   La sección de Huffman es `<Q` con la cantidad de bits válidos de los datos,
+   seguida de la tabla de longitudes de código canónico:
+
+   - densa: un byte 0 y luego 256 bytes, la longitud del código de cada byte
+     (0 si el byte no aparece);
+   - dispersa: un byte 1, `<H` con la cantidad de símbolos y luego un par
+     (símbolo, longitud) de un byte cada uno por símbolo;
+   - estática: un byte 2 y el id de una de las tablas ya entrenadas de
+     `static_tables` (no se guardan las longitudes).
+
+   Se escribe la que ocupe menos. Con las longitudes basta para reconstruir los
+   códigos canónicos, así que no hace falta guardar los códigos.
+
+3. Datos (`payload_size` bytes): el flujo de bits de Huffman, o para imágenes
+   las corridas como registros de tamaño fijo `<I` (repeticiones) más los bytes
+   del píxel, que se leen directamente como un arreglo estructurado de NumPy.
+
+Modo por bloques (flag 1, solo Huffman): la entrada se divide en bloques que se
+comprimen por separado, cada uno con su propia tabla. En la sección, la sección
+de Huffman se reemplaza por `<I` con el tamaño de bloque. Los datos son los
+bloques uno tras otro (tabla de longitudes + flujo de bits de cada uno), seguidos
+del índice: una entrada `<QIIQI` por bloque (posición dentro de los datos, tamaño
+comprimido, tamaño original, bits válidos y CRC32 del bloque) y al final `<I` con
+la cantidad de bloques. Con el índice cada bloque se puede leer y decodificar
+por separado, y por lo tanto en paralelo; y para leer solo una parte del archivo
+alcanza con decodificar los bloques que la contienen (ver `blocks_in_range`).
+
+Audio con predicción (flags 1 y 2): como el modo por bloques, pero el tamaño de
+bloque de la sección y el campo de bits válidos del índice cuentan frames. En un
+archivo estéreo los canales se guardan como medio, R + (L - R) // 2, y lado,
+L - R. Cada bloque tiene, por canal, `<BB` (orden del predictor polinómico fijo,
+cantidad de planos) y los planos de bytes de los residuos en zigzag, del menos al
+más significativo. Cada plano empieza con `<BBQ` (0 = todos los bytes
+iguales al valor indicado, 1 = Huffman, 2 = bytes sin comprimir, 3 = Huffman
+por segmentos; valor; bits válidos); los planos de Huffman siguen con la tabla
+de longitudes y el flujo de bits, y los planos sin comprimir con un byte por
+muestra. En los planos de Huffman por segmentos el valor es el log2 de la
+cantidad de bytes del plano por segmento; tras la tabla de longitudes va `<I`
+con los bits válidos de cada segmento y luego los segmentos, cada uno con su
+flujo de bits completado hasta el byte. Cada segmento se puede decodificar por
+separado, así se decodifican todos a la vez.
+
+Con el flag 8 cada bloque de audio con predicción empieza con un byte de tipo:
+0 = canales con predicción como se describe arriba, con las muestras de 8 bits
+(que en WAV no tienen signo) centradas en cero restándoles 128; 1 = los frames
+PCM sin comprimir, que se usa cuando la predicción no achica el bloque (por
+ejemplo con ruido).
+
+Imagen con método por planos (flag 4): los píxeles se transforman según `<BBB`
+antes de codificarse:
+
+- colores: 0 = los bytes de cada píxel; 1 = índices en una tabla de hasta 256
+  colores, que va al principio de los datos como `<H` (cantidad) y los bytes de
+  cada color;
+- filtro (como en PNG, restando byte a byte con módulo 256): 0 = ninguno,
+  1 = Sub (el píxel de la izquierda), 2 = Up (el píxel de arriba);
+- disposición: 0 = un solo plano con los bytes intercalados, 1 = un plano por
+  canal.
+
+Cada plano se guarda como `<QQ` (cantidad de códigos de control y de bytes de
+datos) seguido de dos planos de bytes con el formato de los del audio (constante,
+Huffman o sin comprimir): los códigos de control y los datos de un RLE al estilo
+PackBits. Un control c < 128 indica c + 1 bytes literales, que se toman de los
+datos; uno c >= 128 indica que el siguiente byte de los datos se repite c - 125
+veces (de 3 a 130).
+"""
+
+import mmap
+import os
+import struct
+import zlib
+from contextlib import contextmanager
+
+from .static_tables import static_code_lengths
+
+MAGIC = b'P3CF'
+VERSION = 1
+
+KIND_TEXT = 1
+KIND_AUDIO = 2
+KIND_IMAGE = 3
+
+HEADER = struct.Struct('<4sBBHIQQII')
+HUFFMAN_SECTION = struct.Struct('<Q')
+AUDIO_PARAMS = struct.Struct('<HHIQ')
+IMAGE_PARAMS = struct.Struct('<II4sBQ')
+
+BLOCKS_SECTION = struct.Struct('<I')
+BLOCK_ENTRY = struct.Struct('<QIIQI')
+BLOCK_COUNT = struct.Struct('<I')
+
+FLAG_BLOCKS = 1
+FLAG_PREDICTIVE = 2
+FLAG_IMAGE_METHOD = 4
+FLAG_BLOCK_TYPES = 8
+
+CHANNEL_HEADER = struct.Struct('<BB')
+PLANE_HEADER = struct.Struct('<BBQ')
+PLANE_CONSTANT = 0
+PLANE_HUFFMAN = 1
+PLANE_RAW = 2
+PLANE_SEGMENTED = 3
+SEGMENT_BITS = struct.Struct('<I')
+
+BLOCK_PREDICTED = 0
+BLOCK_VERBATIM = 1
+
+IMAGE_METHOD = struct.Struct('<BBB')
+PACKBITS_PLANE = struct.Struct('<QQ')
+IMAGE_COLORS_DIRECT = 0
+IMAGE_COLORS_PALETTE = 1
+FILTER_NONE = 0
+FILTER_SUB = 1
+FILTER_UP = 2
+LAYOUT_INTERLEAVED = 0
+LAYOUT_PLANAR = 1
+PALETTE_COUNT = struct.Struct('<H')
+
+TABLE_DENSE = 0
+TABLE_SPARSE = 1
+TABLE_STATIC = 2
+
+# Tamaño a partir del cual los archivos se leen y escriben mapeados en memoria
+MMAP_MIN_SIZE = 1 << 20
+
+# Cada código de Huffman ocupa al menos un bit y produce un byte: los datos
+# descomprimidos no pueden ocupar más que 8 veces los comprimidos
+MAX_HUFFMAN_EXPANSION = 8
+# Píxeles máximos de una imagen (el mismo límite con que PIL rechaza las imágenes)
+MAX_IMAGE_PIXELS = 2 * 89478485
+# Frames máximos de un bloque de audio con predicción
+MAX_BLOCK_FRAMES = 1 << 24
+
+class ContainerError(ValueError):
+    """El archivo no tiene el formato esperado o sus datos están dañados."""
+
+@contextmanager
+def malformed_data():
+    """
+    Convierte en ContainerError los errores que producen unos datos mal formados al
+    interpretarlos (campos que faltan, posiciones fuera de rango...).
+    """
+    try:
+        yield
+    except ContainerError:
+        raise
+    except (struct.error, IndexError, ValueError, OverflowError) as e:
+        raise ContainerError(f"Los datos del archivo no son válidos: {e}") from e
+
+# --- Tabla de longitudes de código ---
+
+def pack_code_lengths(lengths, table_id=None):
+    """
+    Serializa {byte: longitud} eligiendo la representación más corta. Si se indica
+    `table_id`, las longitudes son las de esa tabla estática y solo se guarda su id.
+    """
+    if table_id is not None:
+        return bytes((TABLE_STATIC, table_id))
+    if 3 + 2 * len(lengths) < 1 + 256:
+        packed = bytearray(struct.pack('<BH', TABLE_SPARSE, len(lengths)))
+        for symbol in sorted(lengths):
+            packed += bytes((symbol, lengths[symbol]))
+        return bytes(packed)
+    return bytes((TABLE_DENSE,)) + bytes(lengths.get(symbol, 0) for symbol in range(256))
+
+def unpack_code_lengths(buffer, offset=0):
+    """Lee la tabla de longitudes y devuelve ({byte: longitud}, posición siguiente)."""
+    with malformed_data():
+        lengths, offset = read_code_lengths(memoryview(buffer), offset)
+    # Desigualdad de Kraft: si no se cumple, las longitudes no forman un código prefijo
+    if 0 in lengths.values() or sum(1 << (255 - length) for length in lengths.values()) > 1 << 255:
+        raise ContainerError("La tabla de longitudes no es válida")
+    return lengths, offset
+
+def read_code_lengths(buffer, offset):
+    table_format = buffer[offset]
+    if table_format == TABLE_DENSE:
+        dense = buffer[offset + 1:offset + 257]
+        if len(dense) < 256:
+            raise ContainerError("Tabla de longitudes incompleta")
+        lengths = {symbol: length for symbol, length in enumerate(dense) if length}
+        return lengths, offset + 257
+    if table_format == TABLE_SPARSE:
+        (count,) = struct.unpack_from('<H', buffer, offset + 1)
+        pairs = buffer[offset + 3:offset + 3 + 2 * count]
+        if len(pairs) < 2 * count:
+            raise ContainerError("Tabla de longitudes incompleta")
+        lengths = {pairs[i]: pairs[i + 1] for i in range(0, len(pairs), 2)}
+        return lengths, offset + 3 + 2 * count
+    if table_format == TABLE_STATIC:
+        if len(buffer) < offset + 2:
+            raise ContainerError("Tabla de longitudes incompleta")
+        lengths = static_code_lengths(buffer[offset + 1])
+        if lengths is None:
+            raise ContainerError(f"Tabla estática desconocida: {buffer[offset + 1]}")
+        return lengths, offset + 2
+    raise ContainerError(f"Formato de tabla de longitudes desconocido: {table_format}")
+
+def pack_huffman_section(total_bits, lengths, table_id=None):
+    """Sección de Huffman: bits válidos de los datos + tabla de longitudes (o su id)."""
+    return HUFFMAN_SECTION.pack(total_bits) + pack_code_lengths(lengths, table_id)
+
+def unpack_huffman_section(buffer, offset=0):
+    """Devuelve (bits válidos, {byte: longitud}) de una sección de Huffman."""
+    with malformed_data():
+        (total_bits,) = HUFFMAN_SECTION.unpack_from(buffer, offset)
+    lengths, _ = unpack_code_lengths(buffer, offset + HUFFMAN_SECTION.size)
+    return total_bits, lengths
+
+# --- Índice de bloques ---
+
+def pack_block_index(entries):
+    """Serializa el índice: una entrada por bloque y al final la cantidad de bloques."""
+    index = bytearray()
+    for entry in entries:
+        index += BLOCK_ENTRY.pack(*entry)
+    return bytes(index + BLOCK_COUNT.pack(len(entries)))
+
+def parse_block_index(index, data_size, original_size=None):
+    """
+    Interpreta el índice (entradas + cantidad) y comprueba que los bloques quepan en
+    los `data_size` bytes de datos que lo preceden y, si se indica, que sus tamaños
+    originales sumen `original_size`. Devuelve una lista de tuplas (posición, tamaño,
+    tamaño original, bits válidos, CRC32).
+    """
+    entries = list(BLOCK_ENTRY.iter_unpack(memoryview(index)[:len(index) - BLOCK_COUNT.size]))
+    for offset, size, _, _, _ in entries:
+        if offset + size > data_size:
+            raise ContainerError("El índice de bloques no es válido")
+    if original_size is not None and sum(entry[2] for entry in entries) != original_size:
+        raise ContainerError("El índice de bloques no coincide con el tamaño original")
+    return entries
+
+def unpack_block_index(payload):
+    """Lee el índice desde el final de los datos ya cargados en memoria."""
+    payload = memoryview(payload)
+    if len(payload) < BLOCK_COUNT.size:
+        raise ContainerError("El índice de bloques está incompleto")
+    (count,) = BLOCK_COUNT.unpack_from(payload, len(payload) - BLOCK_COUNT.size)
+    start = len(payload) - BLOCK_COUNT.size - count * BLOCK_ENTRY.size
+    if start < 0:
+        raise ContainerError("El índice de bloques está incompleto")
+    return parse_block_index(payload[start:], start)
+
+def read_block_index(file, info):
+    """
+    Lee el índice de bloques de un archivo posicionado al inicio de los datos.
+    Devuelve (posición de los datos en el archivo, entradas del índice).
+    """
+    payload_start = file.tell()
+    if info.payload_size < BLOCK_COUNT.size:
+        raise ContainerError("El índice de bloques está incompleto")
+    file.seek(payload_start + info.payload_size - BLOCK_COUNT.size)
+    (count,) = BLOCK_COUNT.unpack(file.read(BLOCK_COUNT.size))
+    index_size = count * BLOCK_ENTRY.size + BLOCK_COUNT.size
+    if index_size > info.payload_size:
+        raise ContainerError("El índice de bloques está incompleto")
+    file.seek(payload_start + info.payload_size - index_size)
+    entries = parse_block_index(file.read(index_size), info.payload_size - index_size,
+                                info.original_size)
+    file.seek(payload_start)
+    return payload_start, entries
+
+def blocks_in_range(entries, start, end):
+    """
+    Entradas del índice de los bloques que contienen los bytes originales
+    [start, end), cada una con la parte del bloque decodificado que cae en el rango:
+    (entrada, desde, hasta).
+    """
+    position = 0
+    for entry in entries:
+        size = entry[2]
+        if position >= end:
+            break
+        if position + size > start:
+            yield entry, max(start - position, 0), min(end - position, size)
+        position += size
+
+# --- Escritura ---
+
+def pack_header(kind, section, original_size, payload_size, payload_crc, flags=0):
+    """Arma la cabecera fija; el CRC cubre también la sección."""
+    fields = HEADER.pack(MAGIC, VERSION, kind, flags, len(section),
+                         original_size, payload_size, payload_crc, 0)[:-4]
+    header_crc = zlib.crc32(section, zlib.crc32(fields))
+    return fields + struct.pack('<I', header_crc)
+
+class ContainerWriter:
+    """
+    Escribe un archivo comprimido en modo streaming. Se reserva el espacio de la
+    cabecera y la sección, los datos se escriben por partes (acumulando su tamaño
+    y su CRC) y al cerrar se vuelve al inicio para completar la cabecera.
+    """
+    def __init__(self, file, kind, section_size):
+        self.file = file
+        self.kind = kind
+        self.section_size = section_size
+        self.start = file.tell()
+        self.payload_size = 0
+        self.payload_crc = 0
+        file.write(bytes(HEADER.size + section_size))
+
+    def write(self, data):
+        """Agrega datos comprimidos al archivo."""
+        self.file.write(data)
+        self.payload_size += len(data)
+        self.payload_crc = zlib.crc32(data, self.payload_crc)
+
+    def close(self, section, original_size, flags=0):
+        """Completa la cabecera y la sección con los valores finales."""
+        if len(section) != self.section_size:
+            raise ContainerError("El tamaño de la sección no coincide con el reservado")
+        end = self.file.tell()
+        self.file.seek(self.start)
+        self.file.write(pack_header(self.kind, section, original_size,
+                                    self.payload_size, self.payload_crc, flags))
+        self.file.write(section)
+        self.file.seek(end)
+
+# --- Lectura ---
+
+class ContainerInfo:
+    """Campos de la cabecera fija de un archivo comprimido."""
+    def __init__(self, kind, flags, original_size, payload_size, payload_crc):
+        self.kind = kind
+        self.flags = flags
+        self.original_size = original_size
+        self.payload_size = payload_size
+        self.payload_crc = payload_crc
+
+def parse_header(header_bytes, section, expected_kind=None):
+    """Valida la cabecera fija y el CRC de la sección."""
+    magic, version, kind, flags, section_size, original_size, payload_size, \
+        payload_crc, header_crc = HEADER.unpack(header_bytes)
+    if magic != MAGIC:
+        raise ContainerError("El archivo no tiene el formato esperado")
+    if version != VERSION:
+        raise ContainerError(f"Versión de formato no soportada: {version}")
+    if expected_kind is not None and kind != expected_kind:
+        raise ContainerError("El archivo no corresponde a este tipo de compresión")
+    if zlib.crc32(section, zlib.crc32(header_bytes[:-4])) != header_crc:
+        raise ContainerError("La cabecera del archivo está dañada")
+    info = ContainerInfo(kind, flags, original_size, payload_size, payload_crc)
+    with malformed_data():
+        check_sizes(info, section)
+    return info
+
+def check_sizes(info, section):
+    """
+    Comprueba que los tamaños de la cabecera y de la sección sean coherentes entre sí
+    y con los datos, antes de reservar memoria o la salida a partir de ellos.
+    """
+    huffman_offset = None
+    if info.kind == KIND_TEXT:
+        huffman_offset = 0
+    elif info.kind == KIND_AUDIO:
+        nchannels, sampwidth, framerate, nframes = AUDIO_PARAMS.unpack_from(section)
+        # Los tamaños de un WAV se guardan en 32 bits
+        if (nchannels < 1 or not 1 <= sampwidth <= 4
+                or framerate * nchannels * sampwidth > 0xFFFFFFFF
+                or info.original_size + 36 > 0xFFFFFFFF):
+            raise ContainerError("Los parámetros del audio no son válidos")
+        if nframes * nchannels * sampwidth != info.original_size:
+            raise ContainerError("La cantidad de frames no coincide con el tamaño original")
+        if info.flags & FLAG_PREDICTIVE:
+            (block_frames,) = BLOCKS_SECTION.unpack_from(section, AUDIO_PARAMS.size)
+            if not 1 <= block_frames <= MAX_BLOCK_FRAMES:
+                raise ContainerError("El tamaño de bloque no es válido")
+        else:
+            huffman_offset = AUDIO_PARAMS.size
+    elif info.kind == KIND_IMAGE:
+        width, height, _, pixel_size, runs = IMAGE_PARAMS.unpack_from(section)
+        if width * height > MAX_IMAGE_PIXELS or not 1 <= pixel_size <= 8:
+            raise ContainerError("Las dimensiones de la imagen no son válidas")
+        if width * height * pixel_size != info.original_size:
+            raise ContainerError("Las dimensiones no coinciden con el tamaño original")
+        if not info.flags & FLAG_IMAGE_METHOD and runs * (4 + pixel_size) != info.payload_size:
+            raise ContainerError("La cantidad de corridas no coincide con los datos")
+    else:
+        raise ContainerError(f"Tipo de archivo desconocido: {info.kind}")
+
+    if huffman_offset is not None:
+        if info.original_size > MAX_HUFFMAN_EXPANSION * info.payload_size:
+            raise ContainerError("El tamaño original no es posible para los datos")
+        if not info.flags & FLAG_BLOCKS:
+            (total_bits,) = HUFFMAN_SECTION.unpack_from(section, huffman_offset)
+            if total_bits > 8 * info.payload_size:
+                raise ContainerError("La cantidad de bits excede los datos del archivo")
+
+def read_container(file, expected_kind=None):
+    """
+    Lee y valida la cabecera y la sección de un archivo abierto. Deja el archivo
+    posicionado al inicio de los datos y devuelve (info, sección).
+    """
+    header_bytes = file.read(HEADER.size)
+    if len(header_bytes) < HEADER.size:
+        raise ContainerError("El archivo no tiene el formato esperado")
+    (section_size,) = struct.unpack_from('<I', header_bytes, 8)
+    section = file.read(section_size)
+    if len(section) < section_size:
+        raise ContainerError("La cabecera del archivo está incompleta")
+    info = parse_header(header_bytes, section, expected_kind)
+    payload_start = file.tell()
+    if file.seek(0, os.SEEK_END) - payload_start < info.payload_size:
+        raise ContainerError("Los datos del archivo están incompletos")
+    file.seek(payload_start)
+    return info, section
+
+def iter_payload(file, info, chunk_size):
+    """Lee los datos por bloques verificando al final su tamaño y su CRC."""
+    remaining = info.payload_size
+    crc = 0
+    while remaining > 0:
+        chunk = file.read(min(chunk_size, remaining))
+        if not chunk:
+            raise ContainerError("Los datos del archivo están incompletos")
+        crc = zlib.crc32(chunk, crc)
+        remaining -= len(chunk)
+        yield chunk
+    if crc != info.payload_crc:
+        raise ContainerError("Los datos del archivo están dañados (CRC incorrecto)")
+
+def read_payload(file, info):
+    """Lee los datos completos de una vez (sin copiar si el archivo está mapeado)."""
+    payload = file.read(info.payload_size)
+    if len(payload) < info.payload_size:
+        raise ContainerError("Los datos del archivo están incompletos")
+    if zlib.crc32(payload) != info.payload_crc:
+        raise ContainerError("Los datos del archivo están dañados (CRC incorrecto)")
+    return payload
+
+def parse_container(buffer, expected_kind=None):
+    """
+    Interpreta un archivo completo ya cargado (bytes, bytearray o mmap) sin copiarlo:
+    devuelve (info, sección, datos), donde sección y datos son memoryviews.
+    """
+    view = memoryview(buffer)
+    if len(view) < HEADER.size:
+        raise ContainerError("El archivo no tiene el formato esperado")
+    (section_size,) = struct.unpack_from('<I', view, 8)
+    section = view[HEADER.size:HEADER.size + section_size]
+    info = parse_header(view[:HEADER.size], section, expected_kind)
+    start = HEADER.size + section_size
+    payload = view[start:start + info.payload_size]
+    if len(payload) < info.payload_size:
+        raise ContainerError("Los datos del archivo están incompletos")
+    if zlib.crc32(payload) != info.payload_crc:
+        raise ContainerError("Los datos del archivo están dañados (CRC incorrecto)")
+    return info, section, payload
+
+# --- Archivos mapeados en memoria ---
+
+class MappedReader:
+    """
+    Archivo comprimido abierto con mmap. `read` devuelve memoryviews del mapa en vez
+    de copias, así los datos se decodifican directo desde las páginas del archivo,
+    que el sistema comparte entre los procesos que lo leen a la vez y puede liberar
+    cuando le falta memoria.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        self.position = 0
+
+    def read(self, size=-1):
+        end = len(self.view) if size is None or size < 0 else min(self.position + size, len(self.view))
+        data = self.view[self.position:end]
+        self.position = max(end, self.position)
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += len(self.view)
+        self.position = max(offset, 0)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def close(self):
+        self.view.release()
+        try:
+            self.map.close()
+        except BufferError:
+            # Todavía hay partes del mapa en uso (por ejemplo, un arreglo de NumPy):
+            # se libera cuando dejen de usarse
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class MappedWriter:
+    """
+    Archivo de salida de tamaño conocido (el `original_size` de la cabecera),
+    reservado de entrada y escrito a través de un mapa en memoria. Al cerrar se
+    recorta a lo escrito, por si la decodificación se interrumpió.
+    """
+    def __init__(self, path, size):
+        self.file = open(path, 'w+b')
+        self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+        self.position = 0
+
+    def write(self, data):
+        end = self.position + len(data)
+        if end > len(self.map):
+            raise ContainerError("Los datos descomprimidos exceden el tamaño indicado en la cabecera")
+        self.map[self.position:end] = data
+        self.position = end
+        return len(data)
+
+    def close(self):
+        self.map.close()
+        self.file.truncate(self.position)
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def open_input(path):
+    """Abre un archivo comprimido para leerlo; los grandes se mapean en memoria."""
+    if os.path.getsize(path) >= MMAP_MIN_SIZE:
+        return MappedReader(path)
+    return open(path, 'rb')
+
+def open_output(path, size):
+    """
+    Abre el archivo donde se escriben `size` bytes descomprimidos; los grandes se
+    reservan completos y se escriben mapeados en memoria.
+    """
+    if size >= MMAP_MIN_SIZE:
+        return MappedWriter(path, size)
+    return open(path, 'wb')
@@ -1,164 +1,1016 @@
 # compression_logic/huffman.py
 
-import heapq
+import mmap
 import os
-import pickle
+import queue
+import threading
+import zlib
+from collections import Counter
+from functools import lru_cache
 
-# Clase para representar un nodo en el árbol de Huffman
-class HuffmanNode:
-    def __init__(self, char, freq):
-        self.char = char
-        self.freq = freq
-        self.left = None
-        self.right = None
+import numpy as np
 
-    # Comparador para que el min-heap funcione correctamente
-    def __lt__(self, other):
-        return self.freq < other.freq
+from . import container
+from . import parallel
+from .metrics import count_bytes, stage
+from . import progress as progress_tracking
+from . import static_tables
 
-# Diccionario para guardar los códigos de Huffman generados
-codes = {}
-# Diccionario inverso para la descompresión
-reverse_mapping = {}
+# Longitud máxima de un código: mantiene acotadas las tablas de decodificación
+MAX_CODE_LENGTH = 15
 
 # --- Funciones auxiliares para la compresión ---
 
-def make_frequency_dict(text):
-    """Calcula la frecuencia de cada caracter en el texto."""
-    frequency = {}
-    for char in text:
-        if not char in frequency:
-            frequency[char] = 0
-        frequency[char] += 1
-    return frequency
-
-def make_heap(frequency):
-    """Crea un min-heap (cola de prioridad) con los nodos de Huffman."""
-    heap = []
-    for key in frequency:
-        node = HuffmanNode(key, frequency[key])
-        heapq.heappush(heap, node)
-    return heap
-
-def merge_nodes(heap):
-    """Construye el árbol de Huffman combinando los nodos de menor frecuencia."""
-    while len(heap) > 1:
-        node1 = heapq.heappop(heap)
-        node2 = heapq.heappop(heap)
-        merged = HuffmanNode(None, node1.freq + node2.freq)
-        merged.left = node1
-        merged.right = node2
-        heapq.heappush(heap, merged)
-    return heap[0] # El último nodo es la raíz del árbol
-
-def make_codes_helper(root, current_code):
-    """Función recursiva para generar los códigos a partir del árbol."""
-    if root is None:
-        return
-    if root.char is not None:
-        codes[root.char] = current_code
-        reverse_mapping[current_code] = root.char
+def make_code_lengths(frequency, max_length=MAX_CODE_LENGTH):
+    """
+    Calcula las longitudes de código de Huffman con el método de dos colas, en tiempo
+    lineal después de ordenar: las hojas se toman en orden de frecuencia y los nodos
+    internos se crean ya ordenados, así que el par de menor peso siempre está al
+    frente de alguna de las dos colas. No se crean objetos por nodo: solo listas de
+    pesos y padres. Si algún código supera `max_length` bits se acortan con
+    `limit_code_lengths`. Devuelve {símbolo: longitud}.
+    """
+    leaves = sorted((count, symbol) for symbol, count in frequency.items() if count)
+    n = len(leaves)
+    if n == 0:
+        return {}
+    if n == 1:
+        # Si hay un solo símbolo, éste necesita al menos 1 bit
+        return {leaves[0][1]: 1}
+
+    weights = [count for count, _ in leaves]
+    parents = [0] * (2 * n - 1)
+    leaf = 0
+    internal = n
+    for node in range(n, 2 * n - 1):
+        children = []
+        for _ in range(2):
+            if leaf < n and (internal == node or weights[leaf] <= weights[internal]):
+                children.append(leaf)
+                leaf += 1
+            else:
+                children.append(internal)
+                internal += 1
+        weights.append(weights[children[0]] + weights[children[1]])
+        parents[children[0]] = parents[children[1]] = node
+
+    # La raíz es el último nodo; cada nodo está más abajo que su padre
+    depths = [0] * (2 * n - 1)
+    for node in range(2 * n - 3, -1, -1):
+        depths[node] = depths[parents[node]] + 1
+    lengths = depths[:n]
+    if max(lengths) > max_length:
+        lengths = limit_code_lengths(lengths, max_length)
+    return {symbol: length for (_, symbol), length in zip(leaves, lengths)}
+
+def limit_code_lengths(lengths, max_length):
+    """
+    Acorta a `max_length` los códigos más largos y reparte la diferencia alargando
+    otros hasta que las longitudes vuelven a formar un código prefijo (desigualdad
+    de Kraft). `lengths` corresponde a símbolos ordenados de menor a mayor frecuencia
+    y se devuelve en ese mismo orden: los más frecuentes reciben los más cortos.
+    """
+    counts = [0] * (max_length + 1)
+    for length in lengths:
+        counts[min(length, max_length)] += 1
+    total = sum(counts[length] << (max_length - length) for length in range(1, max_length + 1))
+    while total > 1 << max_length:
+        counts[max_length] -= 1
+        for length in range(max_length - 1, 0, -1):
+            if counts[length]:
+                counts[length] -= 1
+                counts[length + 1] += 2
+                break
+        total -= 1
+    limited = []
+    for length in range(max_length, 0, -1):
+        limited += [length] * counts[length]
+    return limited
+
+def make_canonical_codes(lengths):
+    """
+    Asigna códigos canónicos a partir de las longitudes: los símbolos se ordenan por
+    (longitud, símbolo) y reciben códigos consecutivos. Devuelve {símbolo: (código, longitud)}.
+    """
+    canonical = {}
+    code = 0
+    previous_length = 0
+    for symbol in sorted(lengths, key=lambda s: (lengths[s], s)):
+        length = lengths[symbol]
+        code <<= length - previous_length
+        canonical[symbol] = (code, length)
+        code += 1
+        previous_length = length
+    return canonical
+
+# --- Codificación empaquetando bits ---
+
+def make_code_table(canonical):
+    """
+    Prepara la tabla de códigos para el codificador: una lista indexada por byte si
+    todos los símbolos son bytes (acceso más rápido), o el mismo diccionario si no.
+    """
+    if all(isinstance(symbol, int) for symbol in canonical):
+        table = [None] * 256
+        for symbol, entry in canonical.items():
+            table[symbol] = entry
+        return table
+    return canonical
+
+class BitWriter:
+    """
+    Empaqueta códigos de Huffman directamente en un bytearray usando un acumulador
+    entero, sin construir nunca el bitstring de '0' y '1'.
+    """
+    def __init__(self, code_table):
+        self.table = code_table
+        self.out = bytearray()
+        self.acc = 0
+        self.nbits = 0
+
+    def write_symbols(self, symbols):
+        """Codifica una secuencia de símbolos (texto, bytes o lista)."""
+        table = self.table
+        out = self.out
+        acc = self.acc
+        nbits = self.nbits
+        for symbol in symbols:
+            code, length = table[symbol]
+            acc = (acc << length) | code
+            nbits += length
+            if nbits >= 32:
+                nbits -= 32
+                out += (acc >> nbits).to_bytes(4, 'big')
+                acc &= (1 << nbits) - 1
+        self.acc = acc
+        self.nbits = nbits
+
+    def flush(self):
+        """Vacía el acumulador rellenando con ceros y devuelve los bits de relleno."""
+        extra_padding = -self.nbits % 8
+        self.acc <<= extra_padding
+        self.nbits += extra_padding
+        self.out += self.acc.to_bytes(self.nbits // 8, 'big')
+        self.acc = 0
+        self.nbits = 0
+        return extra_padding
+
+    def take(self):
+        """Entrega los bytes ya empaquetados y vacía el buffer de salida."""
+        data = self.out
+        self.out = bytearray()
+        return data
+
+# --- Modo streaming (archivos de cualquier tamaño) ---
+
+# Tamaño de los bloques que se leen del archivo en modo streaming
+CHUNK_SIZE = 1 << 20
+
+def read_chunks(file, chunk_size=CHUNK_SIZE):
+    """Lee un archivo abierto por bloques de tamaño fijo."""
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+def map_chunks(file, chunk_size=CHUNK_SIZE):
+    """
+    Recorre un archivo abierto mapeándolo en memoria: entrega vistas (memoryview)
+    de la página en caché, sin copiar los datos en buffers de Python.
+    """
+    if os.fstat(file.fileno()).st_size == 0:
         return
-    make_codes_helper(root.left, current_code + "0")
-    make_codes_helper(root.right, current_code + "1")
-
-def make_codes(root):
-    """Inicia la generación de códigos."""
-    make_codes_helper(root, "")
-
-def get_encoded_text(text):
-    """Codifica el texto completo usando el diccionario de códigos."""
-    encoded_text = ""
-    for character in text:
-        encoded_text += codes[character]
-    return encoded_text
-
-def pad_encoded_text(encoded_text):
-    """Añade padding al final del bitstring para que su longitud sea múltiplo de 8."""
-    extra_padding = 8 - len(encoded_text) % 8
-    for i in range(extra_padding):
-        encoded_text += "0"
-    padded_info = "{0:08b}".format(extra_padding)
-    encoded_text = padded_info + encoded_text
-    return encoded_text
-
-def get_byte_array(padded_encoded_text):
-    """Convierte el bitstring en un array de bytes."""
-    if len(padded_encoded_text) % 8 != 0:
-        print("El texto codificado no está bien rellenado")
-        exit(0)
-    b = bytearray()
-    for i in range(0, len(padded_encoded_text), 8):
-        byte = padded_encoded_text[i:i+8]
-        b.append(int(byte, 2))
-    return b
+    view = memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
 
-# --- Funciones Principales de Compresión y Descompresión ---
+def file_chunks(file, chunk_size=CHUNK_SIZE, use_mmap=True):
+    """Bloques de un archivo abierto, mapeado en memoria o leído con read()."""
+    if use_mmap:
+        return map_chunks(file, chunk_size)
+    return read_chunks(file, chunk_size)
 
-def compress(input_path, output_path):
+def count_frequencies(chunks):
     """
-    Función principal para comprimir un archivo de texto.
+    Primera pasada: cuenta las frecuencias de los bytes bloque por bloque con
+    np.bincount, que recorre cada bloque en C sin copiarlo.
     """
-    global codes, reverse_mapping
-    codes = {}
-    reverse_mapping = {}
+    counts = np.zeros(256, dtype=np.int64)
+    for chunk in chunks:
+        counts += np.bincount(np.frombuffer(chunk, dtype=np.uint8), minlength=256)
+    return Counter({int(symbol): int(counts[symbol]) for symbol in np.nonzero(counts)[0]})
 
-    with open(input_path, 'r', encoding='utf-8') as file:
-        text = file.read()
+def get_reverse_mapping(canonical):
+    """Genera el mapa inverso {código en bits: símbolo} que se guarda en el archivo."""
+    return {format(code, '0{}b'.format(length)): symbol
+            for symbol, (code, length) in canonical.items()}
 
-    frequency = make_frequency_dict(text)
-    heap = make_heap(frequency)
-    root = merge_nodes(heap)
-    make_codes(root)
-    
-    encoded_text = get_encoded_text(text)
-    padded_encoded_text = pad_encoded_text(encoded_text)
-    byte_array = get_byte_array(padded_encoded_text)
+def write_encoded_stream(chunks, codec, output_file):
+    """
+    Segunda pasada: codifica los bloques y escribe los bytes empaquetados a medida
+    que se generan (en un archivo o un ContainerWriter). El último byte se rellena
+    con ceros.
+    """
+    writer = codec.writer()
+    for chunk in chunks:
+        writer.write_symbols(chunk)
+        output_file.write(writer.take())
+    writer.flush()
+    output_file.write(writer.take())
 
-    # Guardar el árbol de Huffman (o el mapa de códigos) y los bytes comprimidos
-    with open(output_path, 'wb') as output_file:
-        pickle.dump((reverse_mapping, byte_array), output_file)
+def iter_decode_stream(chunks, lengths, total_bits, original_size=None):
+    """
+    Decodifica el flujo comprimido bloque por bloque y va entregando los bytes. Si se
+    indica `original_size`, al terminar comprueba que se hayan producido esos bytes.
+    """
+    decoder = get_codec(lengths).decoder(total_bits)
+    produced = 0
+    for chunk in chunks:
+        piece = decoder.decode(chunk)
+        produced += len(piece)
+        yield piece
+    piece = decoder.decode(b'', final=True)
+    produced += len(piece)
+    if original_size is not None and produced != original_size:
+        raise container.ContainerError("Los datos descomprimidos no tienen el tamaño indicado")
+    yield piece
 
-    print(f"Archivo comprimido guardado en: {output_path}")
+# --- Decodificación por tabla ---
+
+# Número de bits con los que se indexa la tabla de decodificación
+TABLE_BITS = 12
 
-def remove_padding(padded_encoded_text):
-    """Elimina el padding del bitstring descomprimido."""
-    padded_info = padded_encoded_text[:8]
-    extra_padding = int(padded_info, 2)
-    padded_encoded_text = padded_encoded_text[8:]
-    encoded_text = padded_encoded_text[:-extra_padding]
-    return encoded_text
+def symbol_to_bytes(symbol):
+    """Devuelve la representación en bytes de un símbolo (caracter o byte)."""
+    if isinstance(symbol, str):
+        return symbol.encode('utf-8')
+    return bytes((symbol,))
 
-def decode_text(encoded_text):
-    """Decodifica el bitstring al texto original usando el mapa inverso."""
-    current_code = ""
-    decoded_text = ""
-    for bit in encoded_text:
-        current_code += bit
-        if current_code in reverse_mapping:
-            character = reverse_mapping[current_code]
-            decoded_text += character
-            current_code = ""
-    return decoded_text
+class DecodeTable:
+    """
+    Tabla de decodificación construida a partir del mapa inverso {código: símbolo}.
+    Cada entrada está indexada por los siguientes `bits` bits del flujo y guarda todos
+    los símbolos que caben completos en ellos, así un solo acceso decodifica varios
+    símbolos. Los códigos más largos que la tabla se resuelven aparte.
+    """
+    def __init__(self, reverse_mapping, bits=TABLE_BITS):
+        self.bits = bits
+        # (longitud, valor) -> bytes de salida del símbolo
+        self.by_code = {}
+        for code, symbol in reverse_mapping.items():
+            if code:
+                self.by_code[(len(code), int(code, 2))] = symbol_to_bytes(symbol)
+
+        self.lengths = sorted({length for length, _ in self.by_code})
+        self.long_lengths = [length for length in self.lengths if length > bits]
+        self.min_length = self.lengths[0] if self.lengths else 1
+        self.max_length = self.lengths[-1] if self.lengths else 0
+        self.max_chunk = max((len(chunk) for chunk in self.by_code.values()), default=1)
+
+        size = 1 << bits
+        # multi[i] = (bytes decodificados, cantidad de bytes, bits consumidos)
+        self.multi = [None] * size
+        # single[i] = (bytes del primer símbolo, longitud de su código) o None
+        self.single = [None] * size
+        for index in range(size):
+            chunks = []
+            used = 0
+            match = self._match(index, used)
+            self.single[index] = match
+            while match is not None:
+                chunks.append(match[0])
+                used += match[1]
+                match = self._match(index, used)
+            chunk = b''.join(chunks)
+            self.multi[index] = (chunk, len(chunk), used)
+
+    def _match(self, index, used):
+        """Busca el código que empieza en el bit `used` del índice, si cabe en la tabla."""
+        for length in self.lengths:
+            if used + length > self.bits:
+                return None
+            value = (index >> (self.bits - used - length)) & ((1 << length) - 1)
+            chunk = self.by_code.get((length, value))
+            if chunk is not None:
+                return chunk, length
+        return None
+
+class StreamDecoder:
+    """
+    Decodifica un flujo de bits de Huffman que puede llegar por partes. Entre una
+    llamada y otra conserva en el acumulador los bits que aún no se han usado.
+    """
+    def __init__(self, table, total_bits):
+        self.table = table
+        self.remaining = total_bits
+        self.acc = 0
+        self.nbits = 0
+
+    def decode(self, data, final=False, out_size=None):
+        """
+        Decodifica los bytes de `data` y devuelve la salida producida. Si `final` es
+        falso, los últimos bits que podrían formar parte de un código incompleto se
+        guardan para la siguiente llamada. La salida se escribe en un buffer
+        preasignado de `out_size` bytes (o una cota superior si no se conoce).
+        """
+        table = self.table
+        if not table.lengths:
+            return bytearray()
+        n = len(data)
+        available = self.nbits + n * 8
+        if final and available < self.remaining:
+            raise container.ContainerError("Los datos terminan antes que el flujo de bits")
+        # Cota de la salida: ningún código ocupa menos de `min_length` bits
+        bound = (min(available, self.remaining) // table.min_length) * table.max_chunk
+        out = bytearray(bound if out_size is None else min(out_size, bound))
+
+        table_bits = table.bits
+        mask = (1 << table_bits) - 1
+        multi = table.multi
+        single = table.single
+        by_code = table.by_code
+        # Bits que deben estar disponibles para decodificar cualquier símbolo
+        lookahead = max(table_bits, table.max_length)
+        acc = self.acc
+        nbits = self.nbits
+        remaining = self.remaining
+        i = 0
+        pos = 0
+
+        # Tramo principal: siempre hay al menos `table_bits` bits válidos por leer
+        while remaining >= table_bits:
+            if not final and available < lookahead:
+                break
+            while nbits < table_bits:
+                acc = (acc << 8) | data[i]
+                i += 1
+                nbits += 8
+            chunk, size, used = multi[(acc >> (nbits - table_bits)) & mask]
+            if not used:
+                # Código más largo que la tabla: se busca longitud por longitud
+                while nbits < table.max_length and i < n:
+                    acc = (acc << 8) | data[i]
+                    i += 1
+                    nbits += 8
+                for length in table.long_lengths:
+                    if length > nbits:
+                        break
+                    chunk = by_code.get((length, (acc >> (nbits - length)) & ((1 << length) - 1)))
+                    if chunk is not None:
+                        size = len(chunk)
+                        used = length
+                        break
+                if not used:
+                    raise container.ContainerError("Flujo de bits de Huffman inválido")
+            out[pos:pos + size] = chunk
+            pos += size
+            nbits -= used
+            remaining -= used
+            available -= used
+            acc &= (1 << nbits) - 1
+
+        if final:
+            # Cola: menos bits que el ancho de la tabla, se decodifica símbolo por símbolo
+            while remaining > 0:
+                while nbits < remaining and i < n:
+                    acc = (acc << 8) | data[i]
+                    i += 1
+                    nbits += 8
+                if nbits >= table_bits:
+                    index = (acc >> (nbits - table_bits)) & mask
+                else:
+                    index = (acc << (table_bits - nbits)) & mask
+                match = single[index]
+                if match is None or match[1] > remaining:
+                    raise container.ContainerError("Flujo de bits de Huffman inválido")
+                chunk, used = match
+                out[pos:pos + len(chunk)] = chunk
+                pos += len(chunk)
+                nbits -= used
+                remaining -= used
+                acc &= (1 << nbits) - 1
+        else:
+            # Guardar los bytes que no alcanzaron para un código completo
+            while i < n:
+                acc = (acc << 8) | data[i]
+                i += 1
+                nbits += 8
+
+        self.acc = acc
+        self.nbits = nbits
+        self.remaining = remaining
+        del out[pos:]
+        return out
+
+def decode_bytes(data, total_bits, table, start=0, out_size=None):
+    """
+    Decodifica `total_bits` bits de `data` (bytes, bytearray o memoryview) a partir del
+    byte `start`, sin construir el bitstring.
+    """
+    decoder = StreamDecoder(table, total_bits)
+    return decoder.decode(memoryview(data)[start:], final=True, out_size=out_size)
+
+# --- Códec reentrante ---
+
+class HuffmanCodec:
+    """
+    Códec de Huffman con sus propias longitudes, códigos y tablas, sin estado global.
+    Una vez creado no se modifica: el estado de cada operación (acumulador de bits,
+    posición) vive en el BitWriter o StreamDecoder que se crea en cada llamada, así
+    un mismo códec se puede reutilizar desde varios hilos a la vez.
+    """
+    __slots__ = ('lengths', 'table_id', 'canonical', 'code_table', 'decode_table',
+                 'lookup_table')
+
+    def __init__(self, lengths, table_id=None):
+        self.lengths = dict(lengths)
+        # Id de la tabla estática de la que salen las longitudes (None si son propias)
+        self.table_id = table_id
+        self.canonical = make_canonical_codes(self.lengths)
+        self.code_table = make_code_table(self.canonical)
+        # La tabla de decodificación se arma la primera vez que se necesita; si dos
+        # hilos la arman a la vez ambos obtienen una tabla equivalente
+        self.decode_table = None
+        self.lookup_table = None
+
+    @classmethod
+    def from_frequency(cls, frequency):
+        """Calcula las longitudes de Huffman para las frecuencias dadas y crea el códec."""
+        if not frequency:
+            return cls({})
+        return cls(make_code_lengths(frequency))
+
+    def encoded_size(self, frequency):
+        """Cantidad total de bits que ocupará la salida codificada."""
+        return sum(count * self.lengths[symbol] for symbol, count in frequency.items())
+
+    def pack_table(self):
+        """Tabla de longitudes serializada tal como se guarda en el archivo."""
+        return container.pack_code_lengths(self.lengths, self.table_id)
+
+    def packed_size(self, frequency):
+        """Bytes que ocupan la tabla serializada más los datos codificados."""
+        return len(self.pack_table()) + (self.encoded_size(frequency) + 7) // 8
+
+    def writer(self):
+        """Crea un BitWriter nuevo que usa los códigos de este códec."""
+        return BitWriter(self.code_table)
+
+    def encode(self, symbols):
+        """Codifica los símbolos completos y devuelve los bytes (con relleno final)."""
+        writer = self.writer()
+        writer.write_symbols(symbols)
+        writer.flush()
+        return writer.out
+
+    def get_decode_table(self):
+        """Devuelve la tabla de decodificación, armándola si todavía no existe."""
+        table = self.decode_table
+        if table is None:
+            table = DecodeTable(get_reverse_mapping(self.canonical))
+            self.decode_table = table
+        return table
+
+    def get_lookup_table(self):
+        """
+        Devuelve (símbolos, longitudes, bits) para decodificar con NumPy: indexados
+        por los próximos `bits` bits del flujo, el símbolo cuyo código empieza ahí y
+        la longitud de ese código (0 si ningún código empieza así).
+        """
+        table = self.lookup_table
+        if table is None:
+            bits = max(self.lengths.values(), default=1)
+            symbols = np.zeros(1 << bits, dtype=np.uint8)
+            lengths = np.zeros(1 << bits, dtype=np.int64)
+            for symbol, (code, length) in self.canonical.items():
+                first = code << (bits - length)
+                symbols[first:first + (1 << (bits - length))] = symbol
+                lengths[first:first + (1 << (bits - length))] = length
+            table = (symbols, lengths, bits)
+            self.lookup_table = table
+        return table
+
+    def decoder(self, total_bits):
+        """Crea un StreamDecoder nuevo para un flujo de `total_bits` bits."""
+        return StreamDecoder(self.get_decode_table(), total_bits)
+
+    def decode(self, data, total_bits, start=0, out_size=None):
+        """Decodifica un flujo completo que ya está en memoria."""
+        return decode_bytes(data, total_bits, self.get_decode_table(), start, out_size)
+
+@lru_cache(maxsize=64)
+def cached_codec(length_items):
+    """Códecs ya construidos, indexados por sus longitudes (ver get_codec)."""
+    return HuffmanCodec(dict(length_items))
+
+@lru_cache(maxsize=None)
+def static_codec(table_id):
+    """Códec de una de las tablas estáticas de `static_tables`."""
+    return HuffmanCodec(static_tables.static_code_lengths(table_id), table_id)
+
+# Cómo se elige la tabla de códigos al comprimir
+TABLES_AUTO = 'auto'
+TABLES_ADAPTIVE = 'adaptive'
+TABLES_STATIC = 'static'
+
+def choose_codec(frequency, tables=TABLES_AUTO):
+    """
+    Elige el códec con el que la salida ocupa menos bytes (tabla + datos): las
+    tablas estáticas, que solo guardan su id, y la tabla propia de la entrada.
+    Con TABLES_STATIC no se calcula la tabla propia y con TABLES_ADAPTIVE solo se
+    usa ésta.
+    """
+    candidates = []
+    if tables != TABLES_ADAPTIVE:
+        candidates += [static_codec(table_id) for table_id in static_tables.STATIC_TABLES]
+    if tables != TABLES_STATIC:
+        candidates.append(HuffmanCodec.from_frequency(frequency))
+    return min(candidates, key=lambda codec: codec.packed_size(frequency))
 
-def decompress(input_path, output_path):
+def get_codec(lengths):
     """
-    Función principal para descomprimir un archivo.
+    Devuelve un códec para las longitudes leídas de un archivo. Los códecs se
+    reutilizan entre llamadas, así las tablas repetidas no se vuelven a construir.
     """
-    global reverse_mapping
+    return cached_codec(tuple(sorted(lengths.items())))
 
+# --- Planos de bytes ---
+
+# Un plano se guarda sin comprimir si Huffman no lo reduce al menos esta fracción
+# (los bytes bajos de un audio con ruido son casi aleatorios y así se decodifican
+# mucho más rápido)
+MIN_PLANE_GAIN = 0.05
+# Bytes de cada segmento de un plano de Huffman (se guarda su log2)
+PLANE_SEGMENT_LOG = 13
+PLANE_SEGMENT = 1 << PLANE_SEGMENT_LOG
+# Con al menos esta cantidad de segmentos completos, y códigos de hasta
+# VECTOR_MAX_LENGTH bits, los segmentos se decodifican todos a la vez con NumPy
+VECTOR_MIN_SEGMENTS = 32
+VECTOR_MAX_LENGTH = 16
+
+def pack_codes(codes, lengths, segment):
+    """
+    Empaqueta códigos de longitud variable (el bit más significativo primero, como
+    BitWriter) de forma vectorizada, en segmentos de `segment` códigos que empiezan
+    cada uno en un byte nuevo. Devuelve (bytes, bits válidos de cada segmento).
+    """
+    first = np.arange(0, len(lengths), segment)
+    segment_bits = np.add.reduceat(lengths, first)
+    segment_bytes = (segment_bits + 7) // 8
+    # Posición de cada código: la de su segmento más los bits anteriores dentro de él
+    ends = np.cumsum(lengths)
+    shift = 8 * (np.cumsum(segment_bytes) - segment_bytes) - (ends[first] - lengths[first])
+    starts = ends - lengths + np.repeat(shift, np.diff(np.append(first, len(lengths))))
+    bits = np.zeros(8 * int(segment_bytes.sum()), dtype=np.uint8)
+    for j in range(int(lengths.max())):
+        used = lengths > j
+        bits[starts[used] + j] = (codes[used] >> (lengths[used] - 1 - j)) & 1
+    return np.packbits(bits).tobytes(), segment_bits
+
+def encode_plane(plane):
+    """
+    Comprime un plano de bytes (por ejemplo, de los residuos de audio) con su propia
+    tabla de Huffman, o lo guarda tal cual si es constante o si Huffman casi no lo
+    reduce. Las frecuencias se cuentan y los códigos se empaquetan de a CHUNK_SIZE
+    bytes, así la memoria temporal no depende del tamaño del plano.
+    """
+    if len(plane) == 0:
+        return container.PLANE_HEADER.pack(container.PLANE_RAW, 0, 0)
+    frequency = np.zeros(256, dtype=np.int64)
+    for start in range(0, len(plane), CHUNK_SIZE):
+        frequency += np.bincount(plane[start:start + CHUNK_SIZE], minlength=256)
+    symbols = np.nonzero(frequency)[0]
+    if len(symbols) == 1:
+        return container.PLANE_HEADER.pack(container.PLANE_CONSTANT, int(symbols[0]), 0)
+    codec = HuffmanCodec.from_frequency({int(s): int(frequency[s]) for s in symbols})
+    encoded_bits = sum(int(frequency[s]) * codec.lengths[s] for s in codec.lengths)
+    if encoded_bits > 8 * len(plane) * (1 - MIN_PLANE_GAIN):
+        return (container.PLANE_HEADER.pack(container.PLANE_RAW, 0, 8 * len(plane))
+                + plane.tobytes())
+    codes = np.zeros(256, dtype=np.int64)
+    lengths = np.zeros(256, dtype=np.int64)
+    for symbol, (code, length) in codec.canonical.items():
+        codes[symbol] = code
+        lengths[symbol] = length
+    segment_bits = []
+    segments = []
+    # CHUNK_SIZE es múltiplo de PLANE_SEGMENT: los segmentos no se parten
+    for start in range(0, len(plane), CHUNK_SIZE):
+        piece = plane[start:start + CHUNK_SIZE]
+        data, bits = pack_codes(codes[piece], lengths[piece], PLANE_SEGMENT)
+        segment_bits.append(bits.astype('<u4'))
+        segments.append(data)
+    return b''.join([
+        container.PLANE_HEADER.pack(container.PLANE_SEGMENTED, PLANE_SEGMENT_LOG, encoded_bits),
+        container.pack_code_lengths(codec.lengths),
+        *(bits.tobytes() for bits in segment_bits),
+        *segments,
+    ])
+
+def decode_lockstep(codec, data, starts, bits, out):
+    """
+    Decodifica a la vez los segmentos que empiezan en los bytes `starts` de `data`,
+    uno por fila de `out`: en cada paso se lee con NumPy el siguiente código de
+    todos los segmentos en una tabla indexada por los próximos bits.
+    """
+    size = out.shape[1]
+    symbols, code_lengths, max_length = codec.get_lookup_table()
+    # Relleno para que ningún segmento, aunque esté dañado, lea fuera de los datos
+    padded = np.concatenate((data, np.zeros(size * max_length // 8 + 4, dtype=np.uint8)))
+    # Los 4 bytes que empiezan en cada posición, para armar palabras de 32 bits
+    windows = np.lib.stride_tricks.as_strided(padded, (len(padded) - 3, 4), (1, 1))
+    shift = 32 - max_length
+    mask = (1 << max_length) - 1
+    position = starts.astype(np.int64) * 8
+    for step in range(size):
+        words = windows[position >> 3].view('>u4')[:, 0].astype(np.int64)
+        index = ((words << (position & 7)) >> shift) & mask
+        out[:, step] = symbols[index]
+        position += code_lengths[index]
+    if not np.array_equal(position - starts * 8, bits):
+        raise container.ContainerError("Un plano no tiene la cantidad de bits esperada")
+
+def decode_segments(codec, block, offset, count, segment_log, total_bits):
+    """Lee los segmentos de un plano PLANE_SEGMENTED; devuelve (bytes del plano, posición siguiente)."""
+    if not 0 < segment_log < 32:
+        raise container.ContainerError(f"Tamaño de segmento inválido: {segment_log}")
+    size = 1 << segment_log
+    segment_count = -(-count // size)
+    index_size = container.SEGMENT_BITS.size * segment_count
+    if offset + index_size > len(block):
+        raise container.ContainerError("Un plano excede los datos del bloque")
+    bits = np.frombuffer(block, dtype='<u4', count=segment_count, offset=offset).astype(np.int64)
+    offset += index_size
+    sizes = (bits + 7) // 8
+    data_size = int(sizes.sum())
+    if int(bits.sum()) != total_bits or offset + data_size > len(block):
+        raise container.ContainerError("Un plano excede los datos del bloque")
+    data = np.frombuffer(block, dtype=np.uint8, count=data_size, offset=offset)
+    starts = np.cumsum(sizes) - sizes
+    values = np.empty(count, dtype=np.uint8)
+    done = 0
+    full = count // size
+    if full >= VECTOR_MIN_SEGMENTS and max(codec.lengths.values()) <= VECTOR_MAX_LENGTH:
+        decode_lockstep(codec, data, starts[:full], bits[:full],
+                        values[:full * size].reshape(full, size))
+        done = full
+    for segment in range(done, segment_count):
+        expected = min(size, count - segment * size)
+        decoded = codec.decode(data, int(bits[segment]), int(starts[segment]), expected)
+        if len(decoded) != expected:
+            raise container.ContainerError("Un plano no tiene la cantidad de bytes esperada")
+        values[segment * size:segment * size + expected] = np.frombuffer(decoded, dtype=np.uint8)
+    return values, offset + data_size
+
+def decode_plane(block, offset, count):
+    """Lee un plano escrito por `encode_plane`; devuelve (bytes del plano, posición siguiente)."""
+    with container.malformed_data():
+        kind, value, total_bits = container.PLANE_HEADER.unpack_from(block, offset)
+    offset += container.PLANE_HEADER.size
+    if kind == container.PLANE_CONSTANT:
+        return np.full(count, value, dtype=np.uint8), offset
+    if kind == container.PLANE_RAW:
+        if offset + count > len(block):
+            raise container.ContainerError("Un plano excede los datos del bloque")
+        values = np.frombuffer(block, dtype=np.uint8, count=count, offset=offset)
+        return values, offset + count
+    if kind not in (container.PLANE_HUFFMAN, container.PLANE_SEGMENTED):
+        raise container.ContainerError(f"Tipo de plano desconocido: {kind}")
+    lengths, offset = container.unpack_code_lengths(block, offset)
+    codec = get_codec(lengths)
+    if kind == container.PLANE_SEGMENTED:
+        return decode_segments(codec, block, offset, count, value, total_bits)
+    data = codec.decode(block, total_bits, offset, count)
+    if len(data) != count:
+        raise container.ContainerError("Un plano no tiene la cantidad de bytes esperada")
+    return np.frombuffer(data, dtype=np.uint8), offset + (total_bits + 7) // 8
+
+# --- Modo por bloques (compresión en paralelo) ---
+
+# Tamaño de cada bloque independiente
+BLOCK_SIZE = 1 << 20
+# A partir de este tamaño conviene repartir el trabajo en varios procesos
+PARALLEL_MIN_SIZE = 4 * BLOCK_SIZE
+
+def encode_block(data):
+    """
+    Comprime un bloque con su propia tabla de códigos o una estática, la que ocupe
+    menos (se ejecuta en los procesos del pool). Devuelve (tabla de longitudes +
+    bits, tamaño original, bits válidos).
+    """
+    frequency = count_frequencies((data,))
+    codec = choose_codec(frequency)
+    block = codec.pack_table() + codec.encode(data)
+    return block, len(data), codec.encoded_size(frequency)
+
+def decode_block(block, original_size, total_bits, crc):
+    """Verifica y decodifica un bloque generado por `encode_block`."""
+    if zlib.crc32(block) != crc:
+        raise container.ContainerError("Los datos del archivo están dañados (CRC incorrecto)")
+    lengths, start = container.unpack_code_lengths(block)
+    data = get_codec(lengths).decode(block, total_bits, start, original_size)
+    if len(data) != original_size:
+        raise container.ContainerError("Un bloque no tiene el tamaño indicado en el índice")
+    return data
+
+def write_blocks(blocks, writer, workers=None):
+    """
+    Comprime los bloques en paralelo y los escribe en orden en el ContainerWriter,
+    seguidos del índice de bloques. Devuelve el tamaño original total.
+    """
+    entries = []
+    results = parallel.imap_ordered(encode_block, ((block,) for block in blocks), workers)
+    for block, original_size, total_bits in results:
+        entries.append((writer.payload_size, len(block), original_size, total_bits, zlib.crc32(block)))
+        writer.write(block)
+    writer.write(container.pack_block_index(entries))
+    return sum(entry[2] for entry in entries)
+
+def iter_block_range(file, info, start, end, decode, make_item, workers=None):
+    """
+    Lee el índice de un archivo por bloques (posicionado al inicio de los datos) y
+    decodifica en paralelo solo los bloques que contienen los bytes originales
+    [start, end), entregando en orden la parte de cada uno que cae en el rango.
+    `make_item(bloque, entrada)` arma los argumentos de `decode` para cada bloque.
+    """
+    payload_start, entries = container.read_block_index(file, info)
+    selected = list(container.blocks_in_range(entries, start, end))
+    if workers is None:
+        workers = parallel.default_workers()
+
+    def read_blocks():
+        for entry, _, _ in selected:
+            file.seek(payload_start + entry[0])
+            block = file.read(entry[1])
+            if workers > 1:
+                # Los bloques de un archivo mapeado (memoryview) se copian para
+                # enviarlos a otro proceso
+                block = bytes(block)
+            yield make_item(block, entry)
+
+    pieces = parallel.imap_ordered(decode, read_blocks(), workers)
+    for (_, first, last), piece in zip(selected, pieces):
+        yield piece[first:last]
+
+def block_item(block, entry):
+    _, _, original_size, total_bits, crc = entry
+    return block, original_size, total_bits, crc
+
+def iter_decode_blocks(file, info, workers=None):
+    """
+    Lee el índice de un archivo por bloques (posicionado al inicio de los datos) y
+    decodifica los bloques en paralelo, entregando la salida en orden.
+    """
+    if info.original_size < PARALLEL_MIN_SIZE:
+        # Con pocos bloques no conviene levantar el pool de procesos
+        workers = 1
+    return iter_block_range(file, info, 0, info.original_size, decode_block, block_item, workers)
+
+def slice_pieces(pieces, start, end):
+    """
+    Recorta a los bytes [start, end) una secuencia de partes consecutivas, dejando de
+    pedir partes en cuanto se llega a `end`.
+    """
+    position = 0
+    for piece in pieces:
+        if position >= end:
+            return
+        piece_end = position + len(piece)
+        if piece_end > start:
+            yield piece[max(start - position, 0):end - position]
+        position = piece_end
+
+def iter_decode_range(file, info, section, start, end, workers=None, chunk_size=CHUNK_SIZE,
+                      section_offset=0):
+    """
+    Decodifica solo los bytes originales [start, end) de un archivo abierto y
+    posicionado al inicio de los datos. En un archivo por bloques se usan el índice
+    y solo los bloques necesarios, así el tiempo hasta el primer byte no depende del
+    tamaño del archivo. En uno sin bloques se decodifica desde el principio y se
+    corta al llegar a `end` (sin verificar el CRC de los datos, que no se leen
+    completos). `section_offset` es la posición de la sección de Huffman.
+    """
+    end = min(end, info.original_size)
+    if start >= end:
+        return iter(())
+    if info.flags & container.FLAG_BLOCKS:
+        if end - start < PARALLEL_MIN_SIZE:
+            workers = 1
+        return iter_block_range(file, info, start, end, decode_block, block_item, workers)
+    total_bits, lengths = container.unpack_huffman_section(section, section_offset)
+    pieces = iter_decode_stream(container.iter_payload(file, info, chunk_size), lengths, total_bits,
+                                info.original_size)
+    return slice_pieces(pieces, start, end)
+
+def compress_blocks(input_path, output_path, block_size=BLOCK_SIZE, workers=None, progress=None):
+    """
+    Comprime un archivo de texto dividiéndolo en bloques independientes, cada uno con
+    su propia tabla, que se comprimen en paralelo en varios procesos.
+    `progress`, si se indica, recibe la fracción completada (0 a 1).
+    """
+    section = container.BLOCKS_SECTION.pack(block_size)
+    total = os.path.getsize(input_path)
+    with open(input_path, 'rb') as file, open(output_path, 'wb') as output_file:
+        writer = container.ContainerWriter(output_file, container.KIND_TEXT, len(section))
+        blocks = progress_tracking.track(read_chunks(file, block_size), progress, total)
+        with stage('huffman.encode_blocks'):
+            original_size = write_blocks(blocks, writer, workers)
+        writer.close(section, original_size, container.FLAG_BLOCKS)
+    count_bytes('huffman.encode_blocks', original_size)
+    count_bytes('huffman.encode_blocks', writer.payload_size, 'out')
+
+    print(f"Archivo comprimido guardado en: {output_path}")
+
+# Bloques que pueden esperar en cola mientras llegan los datos de BlockEncoder
+ENCODER_QUEUE_BLOCKS = 4
+
+class BlockEncoder:
+    """
+    Compresor por bloques que recibe los datos con write(), por ejemplo a medida que
+    llega una subida, sin guardar la entrada en disco. Cada bloque completo se pasa
+    a un hilo que lo comprime (en paralelo, como `write_blocks`) y escribe la salida;
+    close() agrega el índice y la cabecera y devuelve el tamaño original.
+    """
+    def __init__(self, output_path, block_size=BLOCK_SIZE, workers=None):
+        self.output_file = open(output_path, 'wb')
+        self.section = container.BLOCKS_SECTION.pack(block_size)
+        self.writer = container.ContainerWriter(self.output_file, container.KIND_TEXT,
+                                                len(self.section))
+        self.block_size = block_size
+        self.buffer = bytearray()
+        self.blocks = queue.Queue(ENCODER_QUEUE_BLOCKS)
+        self.original_size = None
+        self.error = None
+        self.thread = threading.Thread(target=self.run, args=(workers,), daemon=True)
+        self.thread.start()
+
+    def run(self, workers):
+        """Hilo que comprime los bloques que van llegando a la cola."""
+        try:
+            self.original_size = write_blocks(iter(self.blocks.get, None), self.writer, workers)
+        except Exception as e:
+            self.error = e
+            # Vaciar la cola para no bloquear a quien sigue escribiendo
+            for _ in iter(self.blocks.get, None):
+                pass
+
+    def write(self, data):
+        """Agrega datos; los bloques completos se encolan para comprimirse."""
+        if self.error is not None:
+            raise self.error
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            self.blocks.put(bytes(self.buffer[:self.block_size]))
+            del self.buffer[:self.block_size]
+        return len(data)
+
+    def close(self):
+        """Comprime lo que quedó pendiente, escribe índice y cabecera y cierra la salida."""
+        if self.output_file.closed:
+            return self.original_size
+        try:
+            if self.buffer:
+                self.blocks.put(bytes(self.buffer))
+                self.buffer.clear()
+            self.blocks.put(None)
+            self.thread.join()
+            if self.error is not None:
+                raise self.error
+            self.writer.close(self.section, self.original_size, container.FLAG_BLOCKS)
+        finally:
+            self.output_file.close()
+        count_bytes('huffman.encode_upload', self.original_size)
+        count_bytes('huffman.encode_upload', self.writer.payload_size, 'out')
+        return self.original_size
+
+# --- Funciones Principales de Compresión y Descompresión ---
+
+def compress(input_path, output_path, chunk_size=CHUNK_SIZE, progress=None, use_mmap=True,
+             tables=TABLES_AUTO):
+    """
+    Función principal para comprimir un archivo de texto. Trabaja en modo streaming:
+    una primera pasada por bloques cuenta las frecuencias y la segunda codifica y
+    escribe la salida de forma incremental. Se comprimen los bytes del archivo, así
+    la descompresión lo reproduce exactamente. Con `use_mmap` la entrada se recorre
+    mapeada en memoria en lugar de leerse con read(). `tables` elige entre la
+    tabla propia y las estáticas (ver `choose_codec`).
+    `progress`, si se indica, recibe la fracción completada (0 a 1).
+    """
+    total = os.path.getsize(input_path)
     with open(input_path, 'rb') as file:
-        reverse_mapping, byte_array = pickle.load(file)
+        chunks = progress_tracking.track(file_chunks(file, chunk_size, use_mmap),
+                                         progress, total, 0.0, 0.5)
+        with stage('huffman.count_frequencies'):
+            frequency = count_frequencies(chunks)
+    count_bytes('huffman.count_frequencies', total)
 
-    bit_string = ""
-    for byte in byte_array:
-        bits = bin(byte)[2:].rjust(8, '0')
-        bit_string += bits
-    
-    encoded_text = remove_padding(bit_string)
-    decompressed_text = decode_text(encoded_text)
+    with stage('huffman.build_codec'):
+        codec = choose_codec(frequency, tables)
+        section = container.pack_huffman_section(codec.encoded_size(frequency), codec.lengths,
+                                                 codec.table_id)
+
+    # Guardar la tabla de longitudes de código y los bytes comprimidos
+    with open(input_path, 'rb') as file, open(output_path, 'wb') as output_file:
+        writer = container.ContainerWriter(output_file, container.KIND_TEXT, len(section))
+        chunks = progress_tracking.track(file_chunks(file, chunk_size, use_mmap),
+                                         progress, total, 0.5, 0.5)
+        with stage('huffman.encode'):
+            write_encoded_stream(chunks, codec, writer)
+        writer.close(section, sum(frequency.values()))
+    count_bytes('huffman.encode', total)
+    count_bytes('huffman.encode', writer.payload_size, 'out')
+
+    print(f"Archivo comprimido guardado en: {output_path}")
+
+def decompress(input_path, output_path, chunk_size=CHUNK_SIZE, workers=None, progress=None):
+    """
+    Función principal para descomprimir un archivo. Los datos se leen, decodifican y
+    escriben por bloques; si el archivo se comprimió por bloques, éstos se decodifican
+    en paralelo. Lanza container.ContainerError si el archivo no es válido.
+    `progress`, si se indica, recibe la fracción completada (0 a 1).
+    """
+    with container.open_input(input_path) as file:
+        info, section = container.read_container(file, container.KIND_TEXT)
+        if info.flags & container.FLAG_BLOCKS:
+            pieces = iter_decode_blocks(file, info, workers)
+        else:
+            total_bits, lengths = container.unpack_huffman_section(section)
+            pieces = iter_decode_stream(container.iter_payload(file, info, chunk_size),
+                                        lengths, total_bits, info.original_size)
+        pieces = progress_tracking.track(pieces, progress, info.original_size)
+        with stage('huffman.decode'), \
+                container.open_output(output_path, info.original_size) as output_file:
+            for piece in pieces:
+                output_file.write(piece)
+    count_bytes('huffman.decode', info.payload_size)
+    count_bytes('huffman.decode', info.original_size, 'out')
+
+    print(f"Archivo descomprimido guardado en: {output_path}")
+
+def decompress_range(input_path, output_path, start, end, workers=None, progress=None):
+    """
+    Descomprime solo los bytes [start, end) del archivo original (ver
+    `iter_decode_range`). Lanza container.ContainerError si el archivo no es válido.
+    `progress`, si se indica, recibe la fracción completada (0 a 1).
+    """
+    with container.open_input(input_path) as file:
+        info, section = container.read_container(file, container.KIND_TEXT)
+        end = min(end, info.original_size)
+        pieces = iter_decode_range(file, info, section, start, end, workers)
+        pieces = progress_tracking.track(pieces, progress, max(end - start, 0))
+        with stage('huffman.decode_range'), \
+                container.open_output(output_path, max(end - start, 0)) as output_file:
+            for piece in pieces:
+                output_file.write(piece)
+    count_bytes('huffman.decode_range', max(end - start, 0), 'out')
+
+    print(f"Archivo descomprimido guardado en: {output_path}")
+
+def iter_decompress(input_path, workers=None):
+    """
+    Generador con los bytes del archivo original a medida que se decodifican, sin
+    escribir nada en disco (por ejemplo, para enviarlos en una respuesta HTTP). La
+    cabecera se valida al pedir la primera parte: si el archivo no es válido se lanza
+    container.ContainerError antes de entregar nada.
+    """
+    with container.open_input(input_path) as file:
+        info, section = container.read_container(file, container.KIND_TEXT)
+        yield from iter_decode_range(file, info, section, 0, info.original_size, workers)
+
+def read_lines(input_path, max_lines):
+    """
+    Devuelve los bytes de las primeras `max_lines` líneas del archivo original
+    (incluido el último salto de línea), decodificando los bloques de a uno y solo
+    hasta encontrarlas.
+    """
+    data = bytearray()
+    found = 0
+    with container.open_input(input_path) as file:
+        info, section = container.read_container(file, container.KIND_TEXT)
+        if max_lines <= 0:
+            return bytes(data)
+        # De a un bloque por vez: no conviene decodificar por adelantado en otros procesos
+        for piece in iter_decode_range(file, info, section, 0, info.original_size, workers=1):
+            newlines = piece.count(b'\n')
+            if found + newlines < max_lines:
+                data += piece
+                found += newlines
+                continue
+            position = -1
+            for _ in range(max_lines - found):
+                position = piece.index(b'\n', position + 1)
+            data += piece[:position + 1]
+            break
+    return bytes(data)
 
-    with open(output_path, 'w', encoding='utf-8') as output_file:
-        output_file.write(decompressed_text)
+def decompress_lines(input_path, output_path, max_lines, progress=None):
+    """Guarda en `output_path` las primeras `max_lines` líneas del archivo original."""
+    with stage('huffman.decode_lines'):
+        data = read_lines(input_path, max_lines)
+        with open(output_path, 'wb') as output_file:
+            output_file.write(data)
+    if progress is not None:
+        progress(1.0)
 
-    print(f"Archivo descomprimido guardado en: {output_path}")
\ No newline at end of file
+    print(f"Archivo descomprimido guardado en: {output_path}")
@@ -0,0 +1,125 @@
+# compression_logic/metrics.py
+
+"""
+Métricas livianas en memoria: contadores e histogramas con etiquetas, que se
+exportan en el formato de texto de Prometheus. Los códecs miden cada etapa con
+`stage()` y cuentan bytes con `count_bytes()`.
+
+Las métricas son del proceso actual: el trabajo que se reparte en el pool de
+procesos (modo por bloques) se mide desde el proceso que lo coordina.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Límites (en segundos) de los buckets de los histogramas de duración
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+                   30.0, 60.0)
+
+class Histogram:
+    """Histograma acumulativo con buckets fijos, como los de Prometheus."""
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+class Registry:
+    """Contadores e histogramas indexados por (nombre, etiquetas). Es seguro entre hilos."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.descriptions = {}
+
+    def describe(self, name, help_text):
+        self.descriptions[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def render(self):
+        """Todas las métricas en el formato de texto de Prometheus."""
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            for name, samples in group_by_name(counters):
+                lines += format_metric(name, 'counter', self.descriptions.get(name, name),
+                                       [(dict(labels), value) for labels, value in samples])
+            for name, samples in group_by_name(histograms):
+                lines += metric_header(name, 'histogram', self.descriptions.get(name, name))
+                for labels, histogram in samples:
+                    labels = dict(labels)
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(sample_line(f'{name}_bucket', {**labels, 'le': format_value(bound)},
+                                                 cumulative))
+                    lines.append(sample_line(f'{name}_bucket', {**labels, 'le': '+Inf'}, histogram.count))
+                    lines.append(sample_line(f'{name}_sum', labels, histogram.sum))
+                    lines.append(sample_line(f'{name}_count', labels, histogram.count))
+        return lines
+
+def group_by_name(items):
+    """Agrupa [((nombre, etiquetas), valor)] ordenados en (nombre, [(etiquetas, valor)])."""
+    groups = {}
+    for (name, labels), value in items:
+        groups.setdefault(name, []).append((labels, value))
+    return groups.items()
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def sample_line(name, labels, value):
+    if labels:
+        text = ','.join(f'{key}="{escape_label(labels[key])}"' for key in labels)
+        return f'{name}{{{text}}} {format_value(value)}'
+    return f'{name} {format_value(value)}'
+
+def metric_header(name, kind, help_text):
+    return [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+
+def format_metric(name, kind, help_text, samples):
+    """Líneas de una métrica simple (counter o gauge): [(etiquetas, valor)]."""
+    return metric_header(name, kind, help_text) + [sample_line(name, labels, value)
+                                                   for labels, value in samples]
+
+REGISTRY = Registry()
+REGISTRY.describe('compression_stage_seconds', 'Duración de cada etapa de los códecs')
+REGISTRY.describe('compression_stage_bytes_total', 'Bytes procesados por cada etapa de los códecs')
+
+@contextmanager
+def stage(name):
+    """Mide la duración del bloque `with` como la etapa `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe('compression_stage_seconds', time.perf_counter() - start, stage=name)
+
+def count_bytes(name, size, direction='in'):
+    """Suma `size` bytes de entrada ('in') o salida ('out') a la etapa `name`."""
+    REGISTRY.inc('compression_stage_bytes_total', size, stage=name, direction=direction)
@@ -0,0 +1,63 @@
+# compression_logic/parallel.py
+
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Los procesos de los pools se crean con forkserver (o spawn donde no existe) y no
+# con fork: hacer fork de un proceso con hilos, como los workers gthread del servidor
+# o los hilos de los trabajos, puede copiar un lock tomado por otro hilo y colgar
+# al proceso hijo
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+process_context = multiprocessing.get_context(START_METHOD)
+if START_METHOD == 'forkserver':
+    # El servidor de procesos carga los códecs una sola vez y cada proceso del pool
+    # se copia de él, así no importa NumPy y PIL cada vez
+    process_context.set_forkserver_preload(['__main__', 'compression_logic.huffman',
+                                            'compression_logic.audio_comp',
+                                            'compression_logic.rle_image'])
+
+# Límite de procesos por pool fijado con `set_default_workers` (None: uno por núcleo)
+workers_limit = None
+
+def default_workers():
+    """Cantidad de procesos a usar por defecto: uno por núcleo, o el límite fijado."""
+    return workers_limit or os.cpu_count() or 1
+
+def set_default_workers(workers):
+    """
+    Fija la cantidad de procesos que usan los códecs cuando no se indica otra. El
+    servidor lo usa para que varios workers en la misma máquina no lancen cada uno
+    un proceso por núcleo.
+    """
+    global workers_limit
+    workers_limit = workers
+
+def process_pool(workers):
+    """Pool de `workers` procesos creados con START_METHOD."""
+    return ProcessPoolExecutor(workers, mp_context=process_context)
+
+def imap_ordered(function, items, workers=None):
+    """
+    Aplica `function(*item)` a cada elemento en un pool de procesos y entrega los
+    resultados en el mismo orden. A diferencia de `pool.map`, mantiene como máximo
+    dos tareas en curso por proceso, así la entrada se va leyendo a medida que se
+    necesita y la memoria usada no depende de su tamaño. Con un solo proceso se
+    ejecuta todo en el proceso actual.
+    """
+    if workers is None:
+        workers = default_workers()
+    if workers <= 1:
+        for item in items:
+            yield function(*item)
+        return
+
+    with process_pool(workers) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(function, *item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,16 @@
+# compression_logic/progress.py
+
+def track(chunks, progress, total, start=0.0, span=1.0):
+    """
+    Entrega los bloques sin modificarlos y, si se pasó una función `progress`, le
+    informa después de cada bloque la fracción completada (entre `start` y
+    `start + span`) según los bytes procesados sobre `total`.
+    """
+    if progress is None:
+        yield from chunks
+        return
+    done = 0
+    for chunk in chunks:
+        yield chunk
+        done += len(chunk)
+        progress(start + span * (min(done / total, 1.0) if total else 1.0))
@@ -1,72 +1,586 @@
 # compression_logic/rle_image.py
 
-import pickle
+import io
+import struct
+import zlib
+import numpy as np
 from PIL import Image
+from . import container
+from . import huffman
+from .metrics import count_bytes, stage
+from . import progress as progress_tracking
 
-def compress_image(input_path, output_path):
+# Cantidad de filas que se procesan a la vez
+STRIP_ROWS = 256
+# Tamaño de los bloques que se leen del archivo comprimido
+CHUNK_SIZE = 1 << 20
+# Repeticiones máximas que caben en una corrida
+MAX_RUN = 0xFFFFFFFF
+# Modo al que se pasan las imágenes con transparencia por color o por índice de
+# paleta (tRNS), que el contenedor no guarda: así queda en un canal alfa. PA no se
+# puede escribir como PNG, por eso las imágenes con paleta pasan a RGBA (el método
+# con tabla de colores las sigue comprimiendo como una paleta)
+TRANSPARENCY_MODES = {'P': 'RGBA', 'L': 'LA', 'RGB': 'RGBA'}
+
+def run_dtype(pixel_size):
+    """Tipo de NumPy de una corrida en el archivo: repeticiones + bytes del píxel."""
+    return np.dtype([('count', '<u4'), ('pixel', 'u1', (pixel_size,))])
+
+def prepare_image(img):
+    """
+    Deja la imagen en un modo cuyos píxeles ocupan bytes completos y cuyo nombre
+    cabe en la cabecera. Los demás modos se conservan tal cual (L, P, RGB, RGBA...),
+    salvo que tengan transparencia tRNS (ver TRANSPARENCY_MODES).
+    """
+    if 'transparency' in img.info and img.mode in TRANSPARENCY_MODES:
+        return img.convert(TRANSPARENCY_MODES[img.mode])
+    if img.mode == '1':
+        return img.convert('L')
+    if len(img.mode) > 4:
+        return img.convert('RGB')
+    return img
+
+def find_runs(pixels):
+    """
+    Encuentra las corridas de una matriz de píxeles (n, bytes por píxel) comparando
+    cada píxel con el anterior de forma vectorizada. Devuelve (repeticiones, valores).
+    """
+    if pixels.shape[1] == 1:
+        changes = pixels[1:, 0] != pixels[:-1, 0]
+    else:
+        changes = np.any(pixels[1:] != pixels[:-1], axis=1)
+    starts = np.concatenate(([0], np.nonzero(changes)[0] + 1))
+    counts = np.diff(np.append(starts, len(pixels)))
+    return counts, pixels[starts]
+
+def pack_runs(counts, values, dtype):
+    """Arma el arreglo de registros (repeticiones, píxel) que se escribe al archivo."""
+    records = np.empty(len(counts), dtype=dtype)
+    records['count'] = counts
+    records['pixel'] = values
+    return records
+
+def write_runs(img, writer, pixel_size, strip_rows, progress):
+    """
+    Escribe las corridas de píxeles completos (método clásico) procesando la imagen
+    por franjas de filas. Devuelve la cantidad de corridas.
+    """
+    width, height = img.size
+    dtype = run_dtype(pixel_size)
+    runs = 0
+    # La última corrida de cada franja se guarda aparte, porque puede continuar
+    # en la siguiente
+    held_count = 0
+    held_pixel = None
+    for top in range(0, height, strip_rows):
+        strip = img.crop((0, top, width, min(top + strip_rows, height)))
+        pixels = np.frombuffer(strip.tobytes(), dtype=np.uint8).reshape(-1, pixel_size)
+        counts, values = find_runs(pixels)
+        counts = counts.astype(np.uint64)
+
+        if held_pixel is not None:
+            if np.array_equal(values[0], held_pixel) and counts[0] + held_count <= MAX_RUN:
+                counts[0] += held_count
+            else:
+                writer.write(pack_runs([held_count], [held_pixel], dtype).tobytes())
+                runs += 1
+
+        writer.write(pack_runs(counts[:-1], values[:-1], dtype).tobytes())
+        runs += len(counts) - 1
+        held_count = int(counts[-1])
+        held_pixel = values[-1].copy()
+        if progress is not None:
+            progress(min(top + strip_rows, height) / height)
+
+    # Añadir el último grupo de píxeles
+    if held_pixel is not None:
+        writer.write(pack_runs([held_count], [held_pixel], dtype).tobytes())
+        runs += 1
+    return runs
+
+# --- Métodos por planos: filtros de fila, paleta y PackBits ---
+
+METHOD_RUNS = 'runs'
+METHOD_AUTO = 'auto'
+# nombre -> (colores, filtro, disposición), ver container.py
+IMAGE_METHODS = {
+    'packbits': (container.IMAGE_COLORS_DIRECT, container.FILTER_NONE, container.LAYOUT_INTERLEAVED),
+    'planes': (container.IMAGE_COLORS_DIRECT, container.FILTER_NONE, container.LAYOUT_PLANAR),
+    'sub': (container.IMAGE_COLORS_DIRECT, container.FILTER_SUB, container.LAYOUT_INTERLEAVED),
+    'up': (container.IMAGE_COLORS_DIRECT, container.FILTER_UP, container.LAYOUT_INTERLEAVED),
+    'planes-sub': (container.IMAGE_COLORS_DIRECT, container.FILTER_SUB, container.LAYOUT_PLANAR),
+    'planes-up': (container.IMAGE_COLORS_DIRECT, container.FILTER_UP, container.LAYOUT_PLANAR),
+    'palette': (container.IMAGE_COLORS_PALETTE, container.FILTER_NONE, container.LAYOUT_INTERLEAVED),
+    'palette-up': (container.IMAGE_COLORS_PALETTE, container.FILTER_UP, container.LAYOUT_INTERLEAVED),
+}
+MAX_PALETTE_COLORS = 256
+
+# Repeticiones mínima y máxima de un control de repetición, y bytes máximos de uno literal
+MIN_REPEAT = 3
+MAX_REPEAT = 130
+MAX_LITERAL = 128
+# Bytes de un plano que se codifican a la vez (acota la memoria temporal)
+PACKBITS_SEGMENT = 1 << 20
+# Controles que se decodifican a la vez
+PACKBITS_DECODE_TOKENS = 1 << 16
+
+# Filas de muestra con que 'auto' compara los métodos
+SAMPLE_STRIPS = 8
+SAMPLE_PIXELS = 1 << 16
+# Los métodos por planos trabajan con la imagen entera en memoria: por encima de
+# estos bytes de píxeles 'auto' usa las corridas, que se codifican por franjas
+METHOD_MAX_BYTES = 1 << 26
+
+def packbits_segment(plane):
+    """
+    PackBits vectorizado de un segmento de bytes. Las corridas de MIN_REPEAT bytes
+    iguales o más se guardan como repeticiones (partidas en trozos de MAX_REPEAT) y
+    los bytes restantes se agrupan en literales de hasta MAX_LITERAL.
+    Devuelve (controles, datos).
+    """
+    counts, values = find_runs(plane.reshape(-1, 1))
+    values = values[:, 0]
+    long = counts >= MIN_REPEAT
+    full = np.where(long, counts // MAX_REPEAT, 0)
+    rest = np.where(long, counts % MAX_REPEAT, counts)
+    extra = long & (rest >= MIN_REPEAT)
+    repeats = full + extra
+    literals = np.where(extra, 0, rest)
+
+    # Un elemento por repetición y por byte literal, en orden; cada uno aporta un
+    # byte a los datos
+    per_run = repeats + literals
+    run_of = np.repeat(np.arange(len(counts)), per_run)
+    index = np.arange(len(run_of))
+    within = index - (np.cumsum(per_run) - per_run)[run_of]
+    is_repeat = within < repeats[run_of]
+    repeat_count = np.where(within < full[run_of], MAX_REPEAT, rest[run_of])
+
+    # Los literales seguidos forman un control cada MAX_LITERAL bytes
+    is_literal = ~is_repeat
+    literal_start = is_literal & np.concatenate(([True], is_repeat[:-1]))
+    position = index - np.maximum.accumulate(np.where(literal_start, index, 0))
+    token_start = is_repeat | (position % MAX_LITERAL == 0)
+    starts = np.nonzero(token_start)[0]
+    sizes = np.diff(np.append(starts, len(index)))
+    controls = np.where(is_repeat[starts], repeat_count[starts] - MIN_REPEAT + 128, sizes - 1)
+    return controls.astype(np.uint8), values[run_of]
+
+def packbits_encode(plane):
+    """PackBits de un plano completo, por segmentos. Devuelve (controles, datos)."""
+    parts = [packbits_segment(plane[start:start + PACKBITS_SEGMENT])
+             for start in range(0, len(plane), PACKBITS_SEGMENT)]
+    if not parts:
+        return np.empty(0, dtype=np.uint8), np.empty(0, dtype=np.uint8)
+    return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+def packbits_decode(controls, data, size):
+    """
+    Reconstruye un plano de `size` bytes: cada byte de datos se repite una vez si es
+    literal o las veces que indica su control si es una repetición.
+    """
+    plane = np.empty(size, dtype=np.uint8)
+    pos = 0
+    data_pos = 0
+    for start in range(0, len(controls), PACKBITS_DECODE_TOKENS):
+        chunk = controls[start:start + PACKBITS_DECODE_TOKENS].astype(np.int64)
+        is_repeat = chunk >= 128
+        lengths = np.where(is_repeat, chunk - 128 + MIN_REPEAT, chunk + 1)
+        used = np.where(is_repeat, 1, lengths)
+        used_ends = np.cumsum(used)
+        values = data[data_pos:data_pos + int(used_ends[-1])]
+        if len(values) < used_ends[-1]:
+            raise container.ContainerError("Faltan datos en un plano de la imagen")
+        repeats = np.ones(len(values), dtype=np.int64)
+        repeats[(used_ends - used)[is_repeat]] = lengths[is_repeat]
+        piece = np.repeat(values, repeats)
+        if pos + len(piece) > size:
+            raise container.ContainerError("Un plano de la imagen excede su tamaño")
+        plane[pos:pos + len(piece)] = piece
+        pos += len(piece)
+        data_pos += len(values)
+    if pos != size or data_pos != len(data):
+        raise container.ContainerError("Un plano de la imagen no tiene el tamaño esperado")
+    return plane
+
+def pack_pixels(pixels):
+    """Junta los bytes de cada píxel (n, bytes) en un entero de 32 bits."""
+    packed = np.zeros(len(pixels), dtype=np.uint32)
+    for byte in range(pixels.shape[1]):
+        packed |= pixels[:, byte].astype(np.uint32) << np.uint32(8 * byte)
+    return packed
+
+def apply_filter(pixels, kind):
+    """Aplica el filtro de fila a una matriz (alto, ancho, bytes) con resta módulo 256."""
+    if kind == container.FILTER_NONE:
+        return pixels
+    filtered = pixels.copy()
+    if kind == container.FILTER_SUB:
+        filtered[:, 1:] -= pixels[:, :-1]
+    else:
+        filtered[1:] -= pixels[:-1]
+    return filtered
+
+def undo_filter(filtered, kind):
+    """Deshace `apply_filter` con sumas acumuladas módulo 256."""
+    if kind == container.FILTER_NONE:
+        return filtered
+    return np.cumsum(filtered, axis=1 if kind == container.FILTER_SUB else 0, dtype=np.uint8)
+
+def encode_method(pixels, method):
+    """
+    Codifica una matriz de píxeles (alto, ancho, bytes) con un método por planos.
+    Devuelve los datos, o None si el método usa paleta y hay demasiados colores.
+    """
+    colors, filter_kind, layout = method
+    height, width, pixel_size = pixels.shape
+    parts = []
+    if colors == container.IMAGE_COLORS_PALETTE:
+        table, indexes = np.unique(pack_pixels(pixels.reshape(-1, pixel_size)), return_inverse=True)
+        if len(table) > MAX_PALETTE_COLORS:
+            return None
+        table_bytes = (table[:, None] >> (np.arange(pixel_size, dtype=np.uint32) * 8)) & 0xFF
+        parts.append(container.PALETTE_COUNT.pack(len(table)) + table_bytes.astype(np.uint8).tobytes())
+        pixels = indexes.astype(np.uint8).reshape(height, width, 1)
+
+    filtered = apply_filter(pixels, filter_kind)
+    if layout == container.LAYOUT_PLANAR:
+        planes = [np.ascontiguousarray(filtered[:, :, channel]).reshape(-1)
+                  for channel in range(filtered.shape[2])]
+    else:
+        planes = [filtered.reshape(-1)]
+    for plane in planes:
+        controls, data = packbits_encode(plane)
+        parts.append(container.PACKBITS_PLANE.pack(len(controls), len(data)))
+        parts.append(huffman.encode_plane(controls))
+        parts.append(huffman.encode_plane(data))
+    return b''.join(parts)
+
+def decode_method(payload, method, height, width, pixel_size):
+    """Reconstruye la matriz de píxeles (alto, ancho, bytes) codificada con `encode_method`."""
+    colors, filter_kind, layout = method
+    payload = memoryview(payload)
+    offset = 0
+    table = None
+    channels = pixel_size
+    if colors == container.IMAGE_COLORS_PALETTE:
+        with container.malformed_data():
+            (count,) = container.PALETTE_COUNT.unpack_from(payload, offset)
+            offset += container.PALETTE_COUNT.size
+            table = np.frombuffer(payload, dtype=np.uint8, count=count * pixel_size, offset=offset)
+        table = table.reshape(count, pixel_size)
+        offset += count * pixel_size
+        channels = 1
+
+    plane_count = channels if layout == container.LAYOUT_PLANAR else 1
+    plane_size = height * width * channels // plane_count
+    planes = []
+    for _ in range(plane_count):
+        with container.malformed_data():
+            control_count, data_count = container.PACKBITS_PLANE.unpack_from(payload, offset)
+        # Cada código de control y cada byte de datos producen al menos un byte
+        if control_count > plane_size or data_count > plane_size:
+            raise container.ContainerError("Un plano de la imagen excede su tamaño")
+        offset += container.PACKBITS_PLANE.size
+        controls, offset = huffman.decode_plane(payload, offset, control_count)
+        data, offset = huffman.decode_plane(payload, offset, data_count)
+        planes.append(packbits_decode(controls, data, plane_size))
+    if offset != len(payload):
+        raise container.ContainerError("Los datos de la imagen tienen bytes de más")
+
+    if layout == container.LAYOUT_PLANAR:
+        filtered = np.stack([plane.reshape(height, width) for plane in planes], axis=2)
+    else:
+        filtered = planes[0].reshape(height, width, channels)
+    pixels = undo_filter(filtered, filter_kind)
+    if table is not None:
+        indexes = pixels.reshape(-1)
+        if len(table) == 0 or indexes.max(initial=0) >= len(table):
+            raise container.ContainerError("Un índice de la paleta no es válido")
+        pixels = table[indexes]
+    return pixels.reshape(height, width, pixel_size)
+
+def sample_rows(pixels):
+    """Unas franjas de filas repartidas por la imagen, para comparar los métodos."""
+    height, width, _ = pixels.shape
+    rows = max(1, SAMPLE_PIXELS // (SAMPLE_STRIPS * width))
+    if SAMPLE_STRIPS * rows >= height:
+        return pixels
+    tops = np.linspace(0, height - rows, SAMPLE_STRIPS).astype(int)
+    return np.concatenate([pixels[top:top + rows] for top in tops])
+
+def has_few_colors(pixels, limit=MAX_PALETTE_COLORS):
+    """
+    Indica si la imagen tiene como máximo `limit` colores. La recorre por partes de
+    SAMPLE_PIXELS píxeles y deja de contar apenas los supera, así en las imágenes
+    con muchos colores solo se mira el principio.
+    """
+    flat = pixels.reshape(-1, pixels.shape[2])
+    colors = np.empty(0, dtype=np.uint32)
+    for start in range(0, len(flat), SAMPLE_PIXELS):
+        colors = np.union1d(colors, pack_pixels(flat[start:start + SAMPLE_PIXELS]))
+        if len(colors) > limit:
+            return False
+    return True
+
+def choose_method(pixels):
+    """
+    Codifica una muestra de filas con cada método y devuelve el nombre del que ocupa
+    menos, incluidas las corridas de píxeles completos ('runs'). Los métodos con
+    paleta solo se prueban si la muestra y la imagen entera tienen pocos colores.
+    """
+    sample = sample_rows(pixels)
+    pixel_size = pixels.shape[2]
+    counts, _ = find_runs(sample.reshape(-1, pixel_size))
+    costs = {METHOD_RUNS: len(counts) * run_dtype(pixel_size).itemsize}
+
+    use_palette = False
+    if pixel_size > 1:
+        sample_colors = np.unique(pack_pixels(sample.reshape(-1, pixel_size)))
+        use_palette = len(sample_colors) <= MAX_PALETTE_COLORS and has_few_colors(pixels)
+    for name, method in IMAGE_METHODS.items():
+        colors, _, layout = method
+        if colors == container.IMAGE_COLORS_PALETTE and not use_palette:
+            continue
+        if layout == container.LAYOUT_PLANAR and pixel_size == 1:
+            continue
+        costs[name] = len(encode_method(sample, method))
+    return min(costs, key=costs.get)
+
+def compress_image(input_path, output_path, strip_rows=STRIP_ROWS, progress=None,
+                   method=METHOD_AUTO):
     """
     [cite_start]Comprime una imagen utilizando el algoritmo Run-Length Encoding (RLE) pixel por pixel. [cite: 12, 13]
+    `method` elige la variante: 'runs' (corridas de píxeles completos, por franjas
+    de filas), uno de IMAGE_METHODS (filtros de fila, planos por canal, paleta y
+    PackBits, con Huffman cuando conviene) o 'auto', que los prueba sobre unas filas
+    de muestra y se queda con el que ocupa menos (o usa las corridas si la imagen
+    pasa de METHOD_MAX_BYTES). Todo se hace de forma vectorizada
+    con NumPy. Se conserva el modo original de la imagen (y su paleta, si la tiene).
+    `progress`, si se indica, recibe la fracción completada (0 a 1).
     """
     try:
         # Abrir la imagen y obtener sus datos
-        img = Image.open(input_path)
-        pixels = list(img.getdata())
+        img = prepare_image(Image.open(input_path))
         width, height = img.size
     except Exception as e:
-        print(f"Error al abrir la imagen: {e}")
-        return
+        # El mensaje de PIL incluye la ruta del archivo: no se muestra
+        raise ValueError("El archivo no es una imagen válida") from e
 
-    encoded_pixels = []
-    
-    if not pixels:
-        return # No hay nada que comprimir
+    mode = img.mode
+    palette = bytes(img.getpalette() or []) if mode in ('P', 'PA') else b''
+    pixel_size = len(img.crop((0, 0, 1, 1)).tobytes()) if width and height else 1
+    if method not in IMAGE_METHODS and method not in (METHOD_RUNS, METHOD_AUTO):
+        raise ValueError(f"Método de compresión de imágenes desconocido: {method}")
 
-    # Implementación de RLE
-    count = 1
-    current_pixel = pixels[0]
+    if method == METHOD_AUTO and width * height * pixel_size > METHOD_MAX_BYTES:
+        method = METHOD_RUNS
+    payload = None
+    if method != METHOD_RUNS and width and height:
+        pixels = np.frombuffer(img.tobytes(), dtype=np.uint8).reshape(height, width, pixel_size)
+        if method == METHOD_AUTO:
+            with stage('rle.choose_method'):
+                method = choose_method(pixels)
+        if method != METHOD_RUNS:
+            with stage('rle.encode_method'):
+                payload = encode_method(pixels, IMAGE_METHODS[method])
+    if payload is None:
+        method = METHOD_RUNS
 
-    for i in range(1, len(pixels)):
-        if pixels[i] == current_pixel:
-            count += 1
+    extra = container.IMAGE_METHOD.pack(*IMAGE_METHODS[method]) if payload is not None else b''
+    section_size = container.IMAGE_PARAMS.size + len(extra) + len(palette)
+    with stage('rle.encode'), open(output_path, 'wb') as f:
+        writer = container.ContainerWriter(f, container.KIND_IMAGE, section_size)
+        if payload is None:
+            runs = write_runs(img, writer, pixel_size, strip_rows, progress)
+            flags = 0
         else:
-            encoded_pixels.append((count, current_pixel))
-            count = 1
-            current_pixel = pixels[i]
-    
-    # Añadir el último grupo de píxeles
-    encoded_pixels.append((count, current_pixel))
+            writer.write(payload)
+            runs = 0
+            flags = container.FLAG_IMAGE_METHOD
+            if progress is not None:
+                progress(1.0)
+
+        # [cite_start]Guardar las dimensiones de la imagen junto a los datos RLE [cite: 15]
+        section = container.IMAGE_PARAMS.pack(width, height, mode.encode('ascii'), pixel_size, runs)
+        writer.close(section + extra + palette, width * height * pixel_size, flags)
+    count_bytes('rle.encode', width * height * pixel_size)
+    count_bytes('rle.encode', writer.payload_size, 'out')
 
-    # [cite_start]Guardar las dimensiones de la imagen y los datos RLE en un archivo [cite: 15]
-    with open(output_path, 'wb') as f:
-        pickle.dump({'width': width, 'height': height, 'data': encoded_pixels}, f)
-    
     print(f"Imagen comprimida con RLE y guardada en: {output_path}")
 
-def decompress_image(input_path, output_path):
+def unpack_image_section(section, flags=0):
     """
-    [cite_start]Descomprime una imagen desde un archivo RLE y la reconstruye. [cite: 15]
+    Devuelve (ancho, alto, modo, bytes por píxel, paleta, método) de la sección de una
+    imagen; el método es None en las comprimidas con corridas de píxeles completos.
+    """
+    with container.malformed_data():
+        width, height, mode, pixel_size, _ = container.IMAGE_PARAMS.unpack_from(section)
+        mode = mode.rstrip(b'\0').decode('ascii')
+        offset = container.IMAGE_PARAMS.size
+        method = None
+        if flags & container.FLAG_IMAGE_METHOD:
+            method = container.IMAGE_METHOD.unpack_from(section, offset)
+            offset += container.IMAGE_METHOD.size
+    if mode not in Image.MODES or len(Image.new(mode, (1, 1)).tobytes()) != pixel_size:
+        raise container.ContainerError(f"Modo de imagen no válido: {mode}")
+    return width, height, mode, pixel_size, bytes(section[offset:]), method
+
+def read_method_pixels(f, info, method, width, height, pixel_size):
+    """Lee los datos de una imagen con método por planos y devuelve sus píxeles (n, bytes)."""
+    payload = container.read_payload(f, info)
+    with container.malformed_data():
+        return decode_method(payload, method, height, width, pixel_size).reshape(-1, pixel_size)
+
+def iter_run_pixels(chunks, pixel_size, pixel_count):
+    """
+    Expande con np.repeat las corridas de los bloques de datos que se van leyendo y
+    entrega, por bloque, los píxeles que generan como matriz (n, bytes por píxel).
+    Lanza container.ContainerError si no suman exactamente `pixel_count` píxeles.
+    """
+    dtype = run_dtype(pixel_size)
+    pos = 0
+    pending = b''
+    for chunk in chunks:
+        data = pending + chunk if pending else chunk
+        usable = len(data) - len(data) % dtype.itemsize
+        records = np.frombuffer(data, dtype=dtype, count=usable // dtype.itemsize)
+        counts = records['count'].astype(np.int64)
+        pos += int(counts.sum())
+        if pos > pixel_count:
+            raise container.ContainerError("Las corridas exceden el tamaño de la imagen")
+        yield np.repeat(records['pixel'], counts, axis=0)
+        pending = bytes(data[usable:])
+    if pos != pixel_count or pending:
+        raise container.ContainerError("Las corridas no coinciden con el tamaño de la imagen")
+
+# Modos con canal alfa, que se conserva si hay que convertir la imagen para guardarla
+ALPHA_MODES = {'LA', 'La', 'PA', 'RGBA', 'RGBa'}
+
+def save_image(img, output, image_format=None):
+    """
+    Guarda la imagen; si el formato de salida no admite su modo (CMYK, PA, F... en
+    PNG) la guarda convertida a RGB, o a RGBA si tiene canal alfa.
     """
     try:
-        with open(input_path, 'rb') as f:
-            data_dict = pickle.load(f)
-    except Exception as e:
-        print(f"Error al leer el archivo RLE: {e}")
-        return
-
-    width = data_dict['width']
-    height = data_dict['height']
-    encoded_data = data_dict['data']
-
-    # Decodificar los datos RLE para reconstruir la lista de píxeles
-    decoded_pixels = []
-    for count, pixel in encoded_data:
-        decoded_pixels.extend([pixel] * count)
-
-    # Crear una nueva imagen y colocar los píxeles
-    img = Image.new('RGB', (width, height))
-    img.putdata(decoded_pixels)
-    
-    # Guardar la imagen reconstruida
-    img.save(output_path)
-    
-    print(f"Imagen descomprimida y guardada en: {output_path}")
\ No newline at end of file
+        img.save(output, image_format)
+    except OSError:
+        if hasattr(output, 'truncate'):
+            output.seek(0)
+            output.truncate()
+        img.convert('RGBA' if img.mode in ALPHA_MODES else 'RGB').save(output, image_format)
+
+def decompress_image(input_path, output_path, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    [cite_start]Descomprime una imagen desde un archivo RLE y la reconstruye. [cite: 15]
+    Las corridas (o los planos PackBits de los otros métodos) se expanden con
+    np.repeat directamente en el arreglo de la imagen.
+    Lanza container.ContainerError si el archivo no es válido.
+    `progress`, si se indica, recibe la fracción completada (0 a 1).
+    """
+    with stage('rle.decode'), container.open_input(input_path) as f:
+        info, section = container.read_container(f, container.KIND_IMAGE)
+        width, height, mode, pixel_size, palette, method = unpack_image_section(section, info.flags)
+
+        if method is not None:
+            pixels = read_method_pixels(f, info, method, width, height, pixel_size)
+            if progress is not None:
+                progress(1.0)
+        else:
+            pixels = np.empty((width * height, pixel_size), dtype=np.uint8)
+            pos = 0
+            chunks = progress_tracking.track(container.iter_payload(f, info, chunk_size),
+                                             progress, info.payload_size)
+            for run_pixels in iter_run_pixels(chunks, pixel_size, len(pixels)):
+                pixels[pos:pos + len(run_pixels)] = run_pixels
+                pos += len(run_pixels)
+    count_bytes('rle.decode', info.payload_size)
+    count_bytes('rle.decode', pixels.nbytes, 'out')
+
+    # Crear una nueva imagen con los píxeles, en su modo original, y guardarla
+    with container.malformed_data():
+        img = Image.frombuffer(mode, (width, height), pixels, 'raw', mode, 0, 1)
+        if palette:
+            img.putpalette(palette)
+    with stage('rle.save_image'):
+        save_image(img, output_path)
+
+    print(f"Imagen descomprimida y guardada en: {output_path}")
+
+# --- Descompresión en streaming (PNG) ---
+
+# Modos de PIL que se pueden escribir directamente como PNG de 8 bits -> tipo de color
+PNG_COLOR_TYPES = {'L': 0, 'RGB': 2, 'P': 3, 'LA': 4, 'RGBA': 6}
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# Filas de la imagen que se comprimen juntas en cada bloque IDAT
+PNG_ROWS = 64
+
+def png_chunk(kind, data):
+    """Un chunk de PNG: longitud, tipo, datos y CRC32 del tipo y los datos."""
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(data, zlib.crc32(kind)))
+
+def iter_rows(pieces, row_size, rows):
+    """Reagrupa los píxeles que se van decodificando en grupos de `rows` filas completas."""
+    pending = np.empty(0, dtype=np.uint8)
+    for piece in pieces:
+        pending = np.concatenate((pending, piece.reshape(-1)))
+        complete = len(pending) // (row_size * rows) * row_size * rows
+        if complete:
+            yield pending[:complete].reshape(-1, row_size)
+            pending = pending[complete:]
+    if len(pending):
+        yield pending.reshape(-1, row_size)
+
+def iter_png(mode, width, height, palette, row_groups):
+    """
+    Escribe un PNG a medida que llegan las filas: cada grupo se filtra con el filtro
+    Up (diferencia con la fila anterior), se comprime con zlib y se entrega como
+    chunk IDAT.
+    """
+    yield PNG_SIGNATURE + png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8,
+                                                          PNG_COLOR_TYPES[mode], 0, 0, 0))
+    if mode == 'P':
+        # Sin paleta guardada, PIL usa la escala de grises
+        yield png_chunk(b'PLTE', palette or bytes(value for value in range(256) for _ in range(3)))
+    compressor = zlib.compressobj(6)
+    previous = None
+    for rows in row_groups:
+        above = np.empty_like(rows)
+        above[0] = previous if previous is not None else 0
+        above[1:] = rows[:-1]
+        filtered = np.empty((len(rows), rows.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 2
+        np.subtract(rows, above, out=filtered[:, 1:])
+        previous = rows[-1]
+        data = compressor.compress(filtered.tobytes())
+        if data:
+            yield png_chunk(b'IDAT', data)
+    yield png_chunk(b'IDAT', compressor.flush()) + png_chunk(b'IEND', b'')
+
+def iter_decompress_image(input_path, chunk_size=CHUNK_SIZE):
+    """
+    Generador con la imagen reconstruida en formato PNG a medida que se decodifica,
+    sin escribir nada en disco. La cabecera del archivo comprimido se valida antes
+    de entregar la primera parte. Los modos que PNG no admite directamente (16 bits,
+    CMYK...) se reconstruyen completos y se codifican con PIL.
+    """
+    with container.open_input(input_path) as f:
+        info, section = container.read_container(f, container.KIND_IMAGE)
+        width, height, mode, pixel_size, palette, method = unpack_image_section(section, info.flags)
+        if method is not None:
+            pieces = iter((read_method_pixels(f, info, method, width, height, pixel_size),))
+        else:
+            pieces = iter_run_pixels(container.iter_payload(f, info, chunk_size), pixel_size,
+                                     width * height)
+        if mode in PNG_COLOR_TYPES and len(palette) % 3 == 0 and len(palette) <= 768 and width:
+            yield from iter_png(mode, width, height, palette,
+                                iter_rows(pieces, width * pixel_size, PNG_ROWS))
+            return
+        pixels = np.concatenate([piece.reshape(-1) for piece in pieces] or [np.empty(0, np.uint8)])
+    with container.malformed_data():
+        img = Image.frombuffer(mode, (width, height), pixels, 'raw', mode, 0, 1)
+        if palette:
+            img.putpalette(palette)
+    output = io.BytesIO()
+    save_image(img, output, 'PNG')
+    yield output.getvalue()
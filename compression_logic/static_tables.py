@@ -0,0 +1,63 @@
+# compression_logic/static_tables.py
+
+"""
+Tablas de Huffman estáticas, ya entrenadas, que se identifican en el archivo con
+un id en lugar de guardar la tabla de longitudes. Para archivos chicos la tabla
+propia ocupa más de lo que se ahorra; con una tabla estática el costo fijo es de
+dos bytes y además no hace falta construir el árbol.
+
+Cada tabla es la longitud del código de cada uno de los 256 bytes (todos tienen
+código, así que cualquier entrada se puede codificar). Se calcularon con
+`make_code_lengths` (máximo 15 bits) a partir de perfiles de frecuencia: letras,
+espacios, puntuación y dígitos de textos en español e inglés codificados en
+UTF-8, y un perfil genérico de archivos binarios (muchos ceros, 0xFF, valores
+chicos y ASCII). Las tablas no se deben modificar nunca, porque los archivos ya
+comprimidos las referencian por su id: una tabla nueva lleva un id nuevo.
+"""
+
+from functools import lru_cache
+
+STATIC_BYTES = 1
+STATIC_SPANISH = 2
+STATIC_ENGLISH = 3
+
+STATIC_TABLES = {
+    STATIC_BYTES: bytes.fromhex(
+        '0307070707070707070707070707070708090909090909090909090909090909'
+        '0708080808080808080808080808080808080808080808080808080808080808'
+        '0708080808080808080808080808080808080808080808080808080808080808'
+        '0808080808080808080808080707070707070707070707070707070707070708'
+        '0809090909090909090909090909090909090909090909090909090909090909'
+        '0909090909090909090909090909090909090909090909090909090909090909'
+        '0909090909090909090909090909090909090909090909090909090909090909'
+        '0909090909090909090909090909090909090909090909090909090909090806'
+    ),
+    STATIC_SPANISH: bytes.fromhex(
+        '0f0f0f0f0f0f0f0f0f0f070f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f'
+        '030f090f0f0f0f0f0f0f0f0f0709070f0e0b0b0b0b0b0b0b0b0b0a0b0f0f0f0b'
+        '0f090f0a0a080f0f0f0a0f0f0a0b09090b0f09090a0a0f0f0f0f0f0f0f0f0f0f'
+        '0f030705050308070805080f05060404060704040505070f0907080f0f0f0f0f'
+        '0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f'
+        '0f080f0f0f0f0f0f0f080f0f0f080f0f0f090f070f0f0f0f0f0f0a0f0f0f0f0b'
+        '0f0f0a060f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f'
+        '0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f'
+    ),
+    STATIC_ENGLISH: bytes.fromhex(
+        '0f0f0f0f0f0f0f0f0f0f070f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f'
+        '030f090f0f0f0f090d0d0f0f0709070f0c0b0b0b0b0b0b0b0b0b0a0b0f0f0f0b'
+        '0f090f0a0a080b0f09090f0f0a0b09090f0f0909090a0f0b0f0f0f0f0f0f0f0f'
+        '0f0407060503060604040a0705060404060a0504040607060a060b0f0f0f0f0f'
+        '0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f'
+        '0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f'
+        '0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f'
+        '0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f0f'
+    ),
+}
+
+@lru_cache(maxsize=None)
+def static_code_lengths(table_id):
+    """Devuelve la tabla estática con ese id como {byte: longitud}, o None si no existe."""
+    table = STATIC_TABLES.get(table_id)
+    if table is None:
+        return None
+    return {symbol: length for symbol, length in enumerate(table)}
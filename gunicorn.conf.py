@@ -0,0 +1,32 @@
+# gunicorn.conf.py
+
+"""
+Configuración para servir la aplicación en producción:
+
+    gunicorn -c gunicorn.conf.py 'app:create_app()'
+
+La aplicación se carga (y los códecs se calientan) en el proceso principal antes de
+crear los workers, así cada worker arranca listo y comparte esa memoria. Los valores
+se pueden cambiar con variables de entorno.
+"""
+
+import os
+
+bind = os.environ.get('COMPRESSION_BIND', '0.0.0.0:8000')
+# Procesos que atienden pedidos, y hilos por proceso para las consultas de estado,
+# las descargas y las respuestas en streaming
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('COMPRESSION_THREADS', 8))
+worker_class = 'gthread'
+preload_app = True
+# Las subidas grandes y las respuestas en streaming pueden tardar más que el límite
+# por defecto de 30 segundos
+timeout = 300
+graceful_timeout = 60
+
+# Cada worker ejecuta sus trabajos en su propio pool de hilos y los códecs por
+# bloques en sus propios procesos: por defecto se reparten los núcleos entre los
+# workers para no lanzar workers × núcleos procesos a la vez
+cores = os.cpu_count() or 1
+os.environ.setdefault('COMPRESSION_JOB_WORKERS', str(max(1, cores // workers)))
+os.environ.setdefault('COMPRESSION_CODEC_WORKERS', str(max(1, cores // workers)))
@@ -0,0 +1,262 @@
+# jobs.py
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from compression_logic.container import ContainerError
+from compression_logic.metrics import REGISTRY
+
+# Cantidad de trabajos terminados que se conservan para poder consultarlos
+MAX_FINISHED_JOBS = 500
+# Cantidad de funciones que se muestran en el perfil de un trabajo
+PROFILE_LINES = 40
+# Cada cuántos segundos, como mínimo, se guarda el avance de un trabajo en disco
+STATE_SAVE_INTERVAL = 0.5
+# Los estados guardados por ejecuciones anteriores del servidor se borran pasado un día
+STATE_MAX_AGE = 24 * 3600
+
+# cProfile solo admite un perfilador activo a la vez en el proceso
+profile_lock = threading.Lock()
+
+REGISTRY.describe('job_duration_seconds', 'Duración de los trabajos, desde que empiezan hasta que terminan')
+REGISTRY.describe('job_wait_seconds', 'Tiempo que los trabajos esperan en la cola')
+
+class JobQueueFull(Exception):
+    """La cola ya tiene el máximo de trabajos pendientes; el pedido se rechaza."""
+
+class Job:
+    """
+    Trabajo de compresión o descompresión que se ejecuta en segundo plano.
+    Estados: 'queued' (en cola), 'running', 'done' y 'error'.
+    """
+    def __init__(self, name, profile=False):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.status = 'queued'
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        # Si se pidió, el informe de cProfile del trabajo (texto) al terminar
+        self.profile_requested = profile
+        self.profile = None
+        self.saved = 0.0
+
+    @classmethod
+    def from_state(cls, state):
+        """Reconstruye un trabajo desde el estado que guardó otro proceso."""
+        data = dict(state['job'])
+        job = cls(data.pop('name'), state['profile_requested'])
+        job.id = data.pop('job_id')
+        job.status = data.pop('status')
+        job.progress = data.pop('progress')
+        job.error = data.pop('error', None)
+        job.result = data or None
+        job.profile = state['profile']
+        return job
+
+    def set_progress(self, fraction):
+        """Función que reciben los códecs para informar su avance (0 a 1)."""
+        self.progress = fraction
+
+    def to_dict(self):
+        """Estado del trabajo tal como lo devuelve /jobs/<id>."""
+        data = {
+            'job_id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'progress': round(self.progress, 4),
+        }
+        if self.result is not None:
+            data.update(self.result)
+        if self.error is not None:
+            data['error'] = self.error
+        return data
+
+class JobManager:
+    """
+    Cola de trabajos que se ejecutan en un pool de hilos. Los códecs que reparten
+    el trabajo en procesos (modo por bloques) lo siguen haciendo dentro de cada hilo.
+
+    Con `max_pending`, `submit` rechaza los trabajos nuevos (JobQueueFull) cuando ya
+    hay esa cantidad en cola o en ejecución. El trabajo que se hace dentro del pedido
+    (códecs en streaming) cuenta en el mismo límite con `reserve` y `release`. Con `state_dir`, el estado de cada
+    trabajo se guarda también en <state_dir>/<id>.json, así lo puede consultar
+    cualquier proceso del servidor y no solo el que lo ejecuta.
+    """
+    def __init__(self, workers=None, max_finished=MAX_FINISHED_JOBS, max_pending=None,
+                 state_dir=None):
+        self.executor = ThreadPoolExecutor(workers or os.cpu_count() or 1,
+                                           thread_name_prefix='job')
+        self.max_finished = max_finished
+        self.max_pending = max_pending
+        self.state_dir = state_dir
+        self.jobs = {}
+        # Trabajos que se ejecutan dentro de un pedido, fuera del pool
+        self.reserved = 0
+        self.lock = threading.Lock()
+        if state_dir is not None:
+            os.makedirs(state_dir, exist_ok=True)
+            self.remove_old_states()
+
+    def submit(self, name, function, *args, profile=False):
+        """
+        Encola `function(*args, progress=...)`, que debe devolver el diccionario con
+        el resultado. Devuelve el Job inmediatamente. Con `profile`, el trabajo se
+        ejecuta bajo cProfile y el informe queda en `job.profile`.
+        """
+        job = Job(name, profile)
+        with self.lock:
+            self.check_pending()
+            self.jobs[job.id] = job
+            self.prune()
+        self.save_state(job)
+        self.executor.submit(self.run, job, function, args)
+        return job
+
+    def check_pending(self):
+        """Lanza JobQueueFull si ya se alcanzó `max_pending` (se llama con el lock tomado)."""
+        if self.max_pending is None:
+            return
+        pending = self.reserved + sum(1 for job in self.jobs.values() if job.finished is None)
+        if pending >= self.max_pending:
+            raise JobQueueFull(f'Hay {pending} trabajos pendientes')
+
+    def reserve(self):
+        """
+        Cuenta un trabajo que se ejecuta dentro del pedido (por ejemplo una descarga
+        en streaming) en el límite de `max_pending`; lanza JobQueueFull si ya no hay
+        lugar. Cada `reserve` se libera con un `release`.
+        """
+        with self.lock:
+            self.check_pending()
+            self.reserved += 1
+
+    def release(self):
+        with self.lock:
+            self.reserved -= 1
+
+    def run(self, job, function, args):
+        """Ejecuta el trabajo en un hilo del pool y guarda su resultado o su error."""
+        job.status = 'running'
+        self.save_state(job)
+        started = time.time()
+        REGISTRY.observe('job_wait_seconds', started - job.created, job=job.name)
+        def progress(fraction):
+            job.set_progress(fraction)
+            if time.time() - job.saved >= STATE_SAVE_INTERVAL:
+                self.save_state(job)
+
+        profiler = None
+        if job.profile_requested:
+            if profile_lock.acquire(blocking=False):
+                profiler = cProfile.Profile()
+            else:
+                job.profile = 'No se perfiló: otro trabajo se estaba perfilando.'
+        try:
+            if profiler is not None:
+                job.result = profiler.runcall(function, *args, progress=progress)
+            else:
+                job.result = function(*args, progress=progress)
+            job.progress = 1.0
+            job.status = 'done'
+        except ContainerError as e:
+            job.error = f'Archivo comprimido no válido: {e}'
+            job.status = 'error'
+        except Exception as e:
+            job.error = f'No se pudo procesar el archivo: {e}'
+            job.status = 'error'
+        if profiler is not None:
+            job.profile = profile_report(profiler)
+            profile_lock.release()
+        job.finished = time.time()
+        self.save_state(job)
+        REGISTRY.observe('job_duration_seconds', job.finished - started,
+                         job=job.name, status=job.status)
+
+    def get(self, job_id):
+        """
+        Devuelve el trabajo con ese id, o None si no existe. Si no es de este proceso
+        se busca el estado que guardó otro.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is not None or self.state_dir is None:
+            return job
+        return self.load_state(job_id)
+
+    def state_path(self, job_id):
+        return os.path.join(self.state_dir, job_id + '.json')
+
+    def save_state(self, job):
+        """Guarda el estado del trabajo en disco, reemplazando el anterior de una vez."""
+        if self.state_dir is None:
+            return
+        job.saved = time.time()
+        state = {'job': job.to_dict(), 'profile_requested': job.profile_requested,
+                 'profile': job.profile}
+        path = self.state_path(job.id)
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(state, file)
+            os.replace(temp_path, path)
+        except OSError:
+            # El estado en disco es solo para otros procesos: el trabajo sigue igual
+            pass
+
+    def remove_old_states(self):
+        """Borra los estados guardados hace más de STATE_MAX_AGE segundos."""
+        limit = time.time() - STATE_MAX_AGE
+        for name in os.listdir(self.state_dir):
+            path = os.path.join(self.state_dir, name)
+            try:
+                if os.path.getmtime(path) < limit:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def load_state(self, job_id):
+        """Trabajo guardado por otro proceso, o None si no existe o no es válido."""
+        if len(job_id) != 32 or any(c not in '0123456789abcdef' for c in job_id):
+            return None
+        try:
+            with open(self.state_path(job_id), 'r', encoding='utf-8') as file:
+                return Job.from_state(json.load(file))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def counts(self):
+        """Cantidad de trabajos conservados en cada estado."""
+        with self.lock:
+            statuses = [job.status for job in self.jobs.values()]
+        return {status: statuses.count(status) for status in ('queued', 'running', 'done', 'error')}
+
+    def prune(self):
+        """Descarta los trabajos terminados más antiguos cuando hay demasiados."""
+        finished = [job for job in self.jobs.values() if job.finished is not None]
+        if len(finished) <= self.max_finished:
+            return
+        finished.sort(key=lambda job: job.finished)
+        for job in finished[:len(finished) - self.max_finished]:
+            del self.jobs[job.id]
+            if self.state_dir is not None:
+                try:
+                    os.remove(self.state_path(job.id))
+                except OSError:
+                    pass
+
+def profile_report(profiler):
+    """Las funciones con más tiempo acumulado, como texto de pstats."""
+    output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.sort_stats('cumulative').print_stats(PROFILE_LINES)
+    return output.getvalue()
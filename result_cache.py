@@ -0,0 +1,284 @@
+# result_cache.py
+
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: la coordinación queda limitada a cada proceso
+    fcntl = None
+
+# Tamaño máximo, por defecto, de los resultados guardados en disco
+DEFAULT_MAX_BYTES = 1 << 30
+# Tamaño de los bloques con que se lee un archivo para calcular su hash
+HASH_CHUNK_SIZE = 1 << 20
+# Los temporales más viejos que esto son restos de un cálculo interrumpido; los más
+# nuevos pueden ser de otro proceso del servidor que todavía está calculando
+STALE_TEMP_SECONDS = 3600
+# Archivo de la carpeta de la caché que ordena las limpiezas de los procesos
+EVICT_LOCK_NAME = 'evict.lock'
+
+def file_digest(path):
+    """Calcula el SHA-256 del contenido de un archivo leyéndolo por bloques."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while True:
+            chunk = file.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def make_key(digest, algorithm, params=None):
+    """Clave de la caché: hash de (contenido de entrada, algoritmo, parámetros)."""
+    description = json.dumps([digest, algorithm, params or {}], sort_keys=True)
+    return hashlib.sha256(description.encode('utf-8')).hexdigest()
+
+class CacheEntry:
+    """Un resultado guardado: su archivo, su tamaño y los datos de la respuesta."""
+    def __init__(self, filename, size, result):
+        self.filename = filename
+        self.size = size
+        self.result = result
+
+class ResultCache:
+    """
+    Caché en disco de los archivos generados, direccionada por contenido. Cada
+    resultado se guarda como <clave><extensión> junto a un <clave>.json con los
+    tamaños informados. Cuando el total supera `max_bytes` se eliminan los
+    resultados usados hace más tiempo (LRU). Si llegan a la vez dos pedidos con la
+    misma clave, solo uno ejecuta el códec y el otro espera su resultado.
+
+    Varios procesos del servidor pueden compartir la carpeta: el límite y el orden
+    LRU se calculan sobre los archivos en disco (un acierto actualiza la fecha de
+    modificación del resultado), y el cálculo de cada clave se protege con un lock
+    de archivo (<clave>.lock), así dos workers no ejecutan el mismo códec a la vez.
+    """
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # Resultados conocidos por este proceso; el tamaño total y la cantidad son
+        # los de toda la carpeta en la última revisión
+        self.entries = {}
+        self.total_size = 0
+        self.entry_count = 0
+        self.in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self.load()
+
+    def load(self):
+        """Reconstruye el índice con los resultados que ya estaban en disco."""
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name == EVICT_LOCK_NAME:
+                continue
+            if '.tmp' in name or name.endswith('.lock'):
+                # Restos de un cálculo interrumpido
+                try:
+                    if time.time() - os.path.getmtime(path) > STALE_TEMP_SECONDS:
+                        os.remove(path)
+                except OSError:
+                    pass
+                continue
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as file:
+                    meta = json.load(file)
+                artifact = os.path.join(self.directory, meta['filename'])
+                found.append((os.path.getmtime(artifact), name[:-5],
+                              CacheEntry(meta['filename'], os.path.getsize(artifact), meta['result'])))
+            except (OSError, ValueError, KeyError):
+                os.remove(path)
+        for _, key, entry in sorted(found, key=lambda item: item[0]):
+            self.entries[key] = entry
+            self.total_size += entry.size
+        self.entry_count = len(self.entries)
+
+    def adopt(self, key):
+        """
+        Agrega al índice (con el lock) un resultado que guardó otro proceso del
+        servidor después de cargar la caché. Devuelve la entrada o None.
+        """
+        try:
+            with open(self.path_for(key + '.json'), 'r', encoding='utf-8') as file:
+                meta = json.load(file)
+            entry = CacheEntry(meta['filename'], os.path.getsize(self.path_for(meta['filename'])),
+                               meta['result'])
+        except (OSError, ValueError, KeyError):
+            self.entries.pop(key, None)
+            return None
+        self.entries[key] = entry
+        return entry
+
+    def lookup(self, key):
+        """
+        Devuelve (con el lock) la entrada de la clave si su archivo sigue en disco,
+        buscándola también entre lo que guardaron otros procesos, y la marca como usada.
+        """
+        entry = self.entries.get(key)
+        if entry is None or not os.path.exists(self.path_for(entry.filename)):
+            entry = self.adopt(key)
+        if entry is None:
+            return None
+        try:
+            os.utime(self.path_for(entry.filename))
+        except OSError:
+            # Otro proceso la acaba de eliminar
+            self.entries.pop(key, None)
+            return None
+        return entry
+
+    @contextmanager
+    def file_lock(self, name, remove=False):
+        """
+        Lock exclusivo entre procesos sobre un archivo de la carpeta. Con `remove`
+        el archivo se borra antes de soltarlo: quien estaba esperando obtiene el lock
+        del archivo borrado y vuelve a mirar la caché, que ya tiene el resultado.
+        """
+        if fcntl is None:
+            yield
+            return
+        path = self.path_for(name)
+        with open(path, 'a') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if remove:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def path_for(self, filename):
+        """Ruta en disco de un resultado guardado."""
+        return os.path.join(self.directory, filename)
+
+    def get_or_compute(self, key, extension, compute):
+        """
+        Devuelve (resultado, nombre del archivo, acierto). Si la clave no está en la
+        caché se llama a `compute(ruta)`, que debe escribir el archivo en esa ruta y
+        devolver el diccionario con el resultado.
+        """
+        while True:
+            with self.lock:
+                entry = self.lookup(key)
+                if entry is not None:
+                    self.hits += 1
+                    return entry.result, entry.filename, True
+                event = self.in_flight.get(key)
+                owner = event is None
+                if owner:
+                    event = threading.Event()
+                    self.in_flight[key] = event
+            if owner:
+                break
+            # Otro hilo ya está calculando el mismo resultado: esperar y volver a mirar
+            event.wait()
+
+        filename = key + extension
+        temp_path = self.path_for(f'{key}.tmp{os.getpid()}{extension}')
+        try:
+            with self.file_lock(key + '.lock', remove=True):
+                # Otro proceso pudo haber terminado el mismo cálculo mientras se esperaba
+                with self.lock:
+                    entry = self.lookup(key)
+                    if entry is not None:
+                        self.hits += 1
+                        return entry.result, entry.filename, True
+                    self.misses += 1
+                result = compute(temp_path)
+                os.replace(temp_path, self.path_for(filename))
+                meta_temp_path = self.path_for(f'{key}.tmp{os.getpid()}.json')
+                with open(meta_temp_path, 'w', encoding='utf-8') as file:
+                    json.dump({'filename': filename, 'result': result}, file)
+                os.replace(meta_temp_path, self.path_for(key + '.json'))
+                with self.lock:
+                    self.entries[key] = CacheEntry(filename, os.path.getsize(self.path_for(filename)),
+                                                   result)
+            self.evict(keep=filename)
+            return result, filename, False
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            with self.lock:
+                del self.in_flight[key]
+            event.set()
+
+    def add(self, key, extension, path, result):
+        """
+        Guarda en la caché un archivo ya generado en `path`, moviéndolo a la carpeta
+        de la caché. Si la clave ya estaba, se conserva el resultado anterior.
+        Devuelve lo mismo que `get_or_compute`.
+        """
+        def move(output_path):
+            os.replace(path, output_path)
+            return result
+        return self.get_or_compute(key, extension, move)
+
+    def scan(self):
+        """Resultados en disco de todos los procesos: lista de (fecha de uso, tamaño, archivo)."""
+        artifacts = []
+        for entry in os.scandir(self.directory):
+            name = entry.name
+            if '.tmp' in name or name.endswith(('.json', '.lock')):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            artifacts.append((stat.st_mtime, stat.st_size, name))
+        return artifacts
+
+    def evict(self, keep=None):
+        """
+        Elimina los resultados usados hace más tiempo, de cualquier proceso, hasta
+        volver al tamaño máximo. `keep` (el resultado recién guardado) no se elimina.
+        """
+        with self.file_lock(EVICT_LOCK_NAME):
+            artifacts = sorted(self.scan())
+            total = sum(size for _, size, _ in artifacts)
+            count = len(artifacts)
+            for _, size, filename in artifacts:
+                if total <= self.max_bytes:
+                    break
+                if filename == keep:
+                    continue
+                # El nombre es <clave><extensión> y la clave, un SHA-256 en hexadecimal
+                key = filename[:64]
+                for name in (filename, key + '.json'):
+                    try:
+                        os.remove(self.path_for(name))
+                    except OSError:
+                        pass
+                total -= size
+                count -= 1
+                with self.lock:
+                    self.entries.pop(key, None)
+                    self.evictions += 1
+        with self.lock:
+            self.total_size = total
+            self.entry_count = count
+
+    def stats(self):
+        """Contadores de la caché."""
+        with self.lock:
+            return {
+                'entries': self.entry_count,
+                'size': self.total_size,
+                'max_size': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -2,12 +2,17 @@
 
 document.addEventListener('DOMContentLoaded', function() {
 
+    // Intervalo (ms) entre consultas del estado de un trabajo en segundo plano
+    const JOB_POLL_INTERVAL = 500;
+
     // Función para actualizar el nombre del archivo en la interfaz
     const updateFileName = (fileInputId, fileNameId) => {
         const fileInput = document.getElementById(fileInputId);
         const fileNameSpan = document.getElementById(fileNameId);
         fileInput.addEventListener('change', function() {
-            if (fileInput.files.length > 0) {
+            if (fileInput.files.length > 1) {
+                fileNameSpan.textContent = `${fileInput.files.length} archivos seleccionados`;
+            } else if (fileInput.files.length > 0) {
                 fileNameSpan.textContent = `Archivo: ${fileInput.files[0].name}`;
             } else {
                 fileNameSpan.textContent = '';
@@ -19,9 +24,11 @@ document.addEventListener('DOMContentLoaded', function() {
     updateFileName('text-file-input', 'text-file-name');
     updateFileName('image-file-input', 'image-file-name');
     updateFileName('audio-file-input', 'audio-file-name');
+    updateFileName('batch-file-input', 'batch-file-name');
 
-    // Función genérica para manejar las solicitudes de compresión/descompresión
-    const handleRequest = async (url, fileInputId, resultDivId) => {
+    // Función genérica para manejar las solicitudes de compresión/descompresión.
+    // `fields` son campos adicionales del formulario (por ejemplo, el modo)
+    const handleRequest = async (url, fileInputId, resultDivId, fields = {}) => {
         const fileInput = document.getElementById(fileInputId);
         const resultDiv = document.getElementById(resultDivId);
         
@@ -32,14 +39,77 @@ document.addEventListener('DOMContentLoaded', function() {
             return;
         }
 
-        const file = fileInput.files[0];
+        // Los campos con selección múltiple envían todos los archivos en `files`
         const formData = new FormData();
-        formData.append('file', file);
+        if (fileInput.multiple) {
+            for (const file of fileInput.files) {
+                formData.append('files', file);
+            }
+        } else {
+            formData.append('file', fileInput.files[0]);
+        }
+        for (const [name, value] of Object.entries(fields)) {
+            formData.append(name, value);
+        }
         
         resultDiv.innerHTML = `<div class="loader"></div><p>Procesando solicitud...</p>`;
         resultDiv.className = 'result';
         resultDiv.style.display = 'block';
 
+        const formatBytes = (bytes, decimals = 2) => {
+            if (bytes === 0) return '0 Bytes';
+            const k = 1024;
+            const dm = decimals < 0 ? 0 : decimals;
+            const sizes = ['Bytes', 'KB', 'MB', 'GB'];
+            const i = Math.floor(Math.log(bytes) / Math.log(k));
+            return parseFloat((bytes / Math.pow(k, i)).toFixed(dm)) + ' ' + sizes[i];
+        };
+
+        const showError = (message) => {
+            resultDiv.innerHTML = `<p>Error: ${message || 'Ocurrió un error desconocido.'}</p>`;
+            resultDiv.className = 'result error';
+        };
+
+        const showResult = (data) => {
+            // Calcular el porcentaje de reducción
+            const reduction = (1 - (data.compressed_size / data.original_size)) * 100;
+            const reductionText = data.original_size > 0 ? `(Reducción del ${reduction.toFixed(2)}%)` : '';
+
+            // Detalle de cada archivo de un lote (/compress_batch)
+            const filesList = (data.files || []).map(file => file.error
+                ? `<li>${file.name}: error (${file.error})</li>`
+                : `<li>${file.name}: ${formatBytes(file.original_size)} → ${formatBytes(file.compressed_size)} (${file.codec})</li>`
+            ).join('');
+
+            resultDiv.innerHTML = `
+                <p><strong>Operación completada con éxito.</strong></p>
+                <p>Tamaño Original: <strong>${formatBytes(data.original_size)}</strong></p>
+                <p>Tamaño Final: <strong>${formatBytes(data.compressed_size)}</strong> ${reductionText}</p>
+                ${filesList ? `<ul>${filesList}</ul>` : ''}
+                <a href="${data.download_url}" class="download-link" download>Descargar Resultado</a>
+            `;
+            resultDiv.className = 'result';
+        };
+
+        // Consultar periódicamente el estado del trabajo hasta que termine
+        const pollJob = async (statusUrl) => {
+            while (true) {
+                const response = await fetch(statusUrl);
+                const job = await response.json();
+                if (!response.ok || job.status === 'error') {
+                    showError(job.error);
+                    return;
+                }
+                if (job.status === 'done') {
+                    showResult(job);
+                    return;
+                }
+                const percent = Math.round(job.progress * 100);
+                resultDiv.innerHTML = `<div class="loader"></div><p>Procesando solicitud... ${percent}%</p>`;
+                await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL));
+            }
+        };
+
         try {
             const response = await fetch(url, {
                 method: 'POST',
@@ -48,30 +118,13 @@ document.addEventListener('DOMContentLoaded', function() {
 
             const data = await response.json();
 
-            if (response.ok) {
-                const formatBytes = (bytes, decimals = 2) => {
-                    if (bytes === 0) return '0 Bytes';
-                    const k = 1024;
-                    const dm = decimals < 0 ? 0 : decimals;
-                    const sizes = ['Bytes', 'KB', 'MB', 'GB'];
-                    const i = Math.floor(Math.log(bytes) / Math.log(k));
-                    return parseFloat((bytes / Math.pow(k, i)).toFixed(dm)) + ' ' + sizes[i];
-                };
-                
-                // Calcular el porcentaje de reducción
-                const reduction = (1 - (data.compressed_size / data.original_size)) * 100;
-                const reductionText = data.original_size > 0 ? `(Reducción del ${reduction.toFixed(2)}%)` : '';
-
-                resultDiv.innerHTML = `
-                    <p><strong>Operación completada con éxito.</strong></p>
-                    <p>Tamaño Original: <strong>${formatBytes(data.original_size)}</strong></p>
-                    <p>Tamaño Final: <strong>${formatBytes(data.compressed_size)}</strong> ${reductionText}</p>
-                    <a href="${data.download_url}" class="download-link" download>Descargar Resultado</a>
-                `;
-                resultDiv.className = 'result';
+            if (response.status === 202) {
+                // La operación se encoló como trabajo en segundo plano
+                await pollJob(data.status_url);
+            } else if (response.ok) {
+                showResult(data);
             } else {
-                resultDiv.innerHTML = `<p>Error: ${data.error || 'Ocurrió un error desconocido.'}</p>`;
-                resultDiv.className = 'result error';
+                showError(data.error);
             }
         } catch (error) {
             resultDiv.innerHTML = `<p>Error de conexión con el servidor. Inténtalo de nuevo.</p>`;
@@ -87,6 +140,10 @@ document.addEventListener('DOMContentLoaded', function() {
     document.getElementById('compress-image-btn').addEventListener('click', () => handleRequest('/compress_image', 'image-file-input', 'image-result'));
     document.getElementById('decompress-image-btn').addEventListener('click', () => handleRequest('/decompress_image', 'image-file-input', 'image-result'));
 
-    document.getElementById('compress-audio-btn').addEventListener('click', () => handleRequest('/compress_audio', 'audio-file-input', 'audio-result'));
+    document.getElementById('compress-audio-btn').addEventListener('click', () => handleRequest('/compress_audio', 'audio-file-input', 'audio-result', {
+        mode: document.getElementById('audio-mode').value
+    }));
     document.getElementById('decompress-audio-btn').addEventListener('click', () => handleRequest('/decompress_audio', 'audio-file-input', 'audio-result'));
+
+    document.getElementById('compress-batch-btn').addEventListener('click', () => handleRequest('/compress_batch', 'batch-file-input', 'batch-result'));
 });
\ No newline at end of file
@@ -0,0 +1,163 @@
+# tests/test_container.py
+
+import os
+import struct
+import tempfile
+import unittest
+import wave
+import zlib
+
+import numpy as np
+from PIL import Image
+
+from compression_logic import audio_comp, container, huffman, rle_image
+
+TEXT = b''.join(b'linea %d del archivo de prueba\n' % i for i in range(5000))
+
+def rebuild(data, section=None, original_size=None, payload=None):
+    """Rearma un archivo cambiando campos, con los CRC recalculados."""
+    info, old_section, old_payload = container.parse_container(data)
+    section = bytes(old_section) if section is None else section
+    payload = bytes(old_payload) if payload is None else payload
+    original_size = info.original_size if original_size is None else original_size
+    return container.pack_header(info.kind, section, original_size, len(payload),
+                                 zlib.crc32(payload), info.flags) + section + payload
+
+class ContainerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def write(self, name, data):
+        with open(self.path(name), 'wb') as file:
+            file.write(data)
+        return self.path(name)
+
+    def read(self, name):
+        with open(self.path(name), 'rb') as file:
+            return file.read()
+
+    def compressed_text(self, blocks=False):
+        self.write('a.txt', TEXT)
+        if blocks:
+            huffman.compress_blocks(self.path('a.txt'), self.path('a.huff'), block_size=1 << 14,
+                                    workers=1)
+        else:
+            huffman.compress(self.path('a.txt'), self.path('a.huff'))
+        return self.read('a.huff')
+
+    def assert_rejected(self, data, decompress=huffman.decompress):
+        path = self.write('bad.huff', data)
+        with self.assertRaises(container.ContainerError):
+            decompress(path, self.path('out'), workers=1)
+
+    def test_round_trip(self):
+        for blocks in (False, True):
+            self.compressed_text(blocks)
+            huffman.decompress(self.path('a.huff'), self.path('b.txt'), workers=1)
+            self.assertEqual(self.read('b.txt'), TEXT)
+
+    def test_truncated_file(self):
+        data = self.compressed_text()
+        for size in (10, container.HEADER.size + 3, len(data) - 1):
+            self.assert_rejected(data[:size])
+
+    def test_bad_crc(self):
+        data = bytearray(self.compressed_text())
+        data[-1] ^= 0xFF
+        self.assert_rejected(bytes(data))
+        data = bytearray(self.compressed_text(blocks=True))
+        data[container.HEADER.size + 8] ^= 0xFF
+        self.assert_rejected(bytes(data))
+
+    def test_oversized_bit_count(self):
+        data = self.compressed_text()
+        _, section, payload = container.parse_container(data)
+        section = container.HUFFMAN_SECTION.pack(8 * len(payload) + 1) + bytes(section[8:])
+        self.assert_rejected(rebuild(data, section=section))
+
+    def test_oversized_original_size(self):
+        data = self.compressed_text()
+        for original_size in (len(TEXT) + 1, 1 << 62):
+            self.assert_rejected(rebuild(data, original_size=original_size))
+        self.assert_rejected(rebuild(self.compressed_text(blocks=True), original_size=1 << 40))
+
+    def test_bad_code_lengths(self):
+        data = self.compressed_text()
+        _, section, _ = container.parse_container(data)
+        # Tabla dispersa con dos símbolos de longitud 1 y uno de longitud 2
+        lengths = struct.pack('<BH', container.TABLE_SPARSE, 3) + bytes((97, 1, 98, 1, 99, 2))
+        self.assert_rejected(rebuild(data, section=bytes(section[:8]) + lengths))
+
+    def test_audio_frames_mismatch(self):
+        with wave.open(self.path('a.wav'), 'wb') as file:
+            file.setnchannels(1)
+            file.setsampwidth(2)
+            file.setframerate(8000)
+            file.writeframes(np.arange(4000, dtype='<i2').tobytes())
+        audio_comp.compress_audio_predictive(self.path('a.wav'), self.path('a.huffaudio'), workers=1)
+        data = self.read('a.huffaudio')
+        _, section, _ = container.parse_container(data)
+        params = container.AUDIO_PARAMS.pack(1, 2, 8000, 1 << 40)
+        self.assert_rejected(rebuild(data, section=params + bytes(section[container.AUDIO_PARAMS.size:])),
+                             audio_comp.decompress_audio)
+
+    def test_audio_noise_verbatim(self):
+        frames = np.random.default_rng(0).integers(0, 256, 40000, dtype=np.uint8).tobytes()
+        with wave.open(self.path('a.wav'), 'wb') as file:
+            file.setnchannels(2)
+            file.setsampwidth(1)
+            file.setframerate(8000)
+            file.writeframes(frames)
+        audio_comp.compress_audio_predictive(self.path('a.wav'), self.path('a.huffaudio'), workers=1)
+        self.assertLess(os.path.getsize(self.path('a.huffaudio')), len(frames) + 128)
+        audio_comp.decompress_audio(self.path('a.huffaudio'), self.path('b.wav'))
+        with wave.open(self.path('b.wav'), 'rb') as file:
+            self.assertEqual(file.readframes(file.getnframes()), frames)
+
+    def test_image_palette_transparency(self):
+        pixels = np.random.default_rng(0).integers(0, 4, (20, 30, 3)).astype(np.uint8) * 80
+        Image.fromarray(pixels).quantize(8).save(self.path('a.png'), transparency=0)
+        rle_image.compress_image(self.path('a.png'), self.path('a.rle'))
+        rle_image.decompress_image(self.path('a.rle'), self.path('b.png'))
+        with Image.open(self.path('a.png')) as original, Image.open(self.path('b.png')) as result:
+            self.assertEqual(original.convert('RGBA').tobytes(), result.convert('RGBA').tobytes())
+
+    def test_image_cmyk_to_png(self):
+        Image.new('CMYK', (6, 4), (10, 20, 30, 40)).save(self.path('a.tiff'))
+        rle_image.compress_image(self.path('a.tiff'), self.path('a.rle'))
+        rle_image.decompress_image(self.path('a.rle'), self.path('b.png'))
+        with Image.open(self.path('a.tiff')) as original, Image.open(self.path('b.png')) as result:
+            self.assertEqual(original.convert('RGB').tobytes(), result.tobytes())
+
+    def test_plane_segments(self):
+        size = huffman.VECTOR_MIN_SEGMENTS * huffman.PLANE_SEGMENT + 100
+        plane = np.minimum(np.random.default_rng(0).geometric(0.3, size), 255).astype(np.uint8)
+        data = huffman.encode_plane(plane)
+        values, offset = huffman.decode_plane(data, 0, size)
+        self.assertEqual(offset, len(data))
+        np.testing.assert_array_equal(values, plane)
+        # Bits de más en el primer segmento
+        _, index = container.unpack_code_lengths(data, container.PLANE_HEADER.size)
+        bad = bytearray(data)
+        container.SEGMENT_BITS.pack_into(bad, index, container.SEGMENT_BITS.unpack_from(data, index)[0] + 1)
+        with self.assertRaises(container.ContainerError):
+            huffman.decode_plane(bytes(bad), 0, size)
+
+    def test_image_dimensions(self):
+        Image.new('RGB', (16, 8), (1, 2, 3)).save(self.path('a.png'))
+        rle_image.compress_image(self.path('a.png'), self.path('a.rle'))
+        data = self.read('a.rle')
+        _, section, _ = container.parse_container(data)
+        width, height, mode, pixel_size, runs = container.IMAGE_PARAMS.unpack_from(section)
+        params = container.IMAGE_PARAMS.pack(1 << 20, 1 << 20, mode, pixel_size, runs)
+        path = self.write('bad.rle', rebuild(data, section=params + bytes(section[container.IMAGE_PARAMS.size:]),
+                                             original_size=(1 << 40) * pixel_size))
+        with self.assertRaises(container.ContainerError):
+            rle_image.decompress_image(path, self.path('out.png'))
+
+if __name__ == '__main__':
+    unittest.main()
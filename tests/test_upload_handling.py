@@ -0,0 +1,48 @@
+# tests/test_upload_handling.py
+
+import io
+import os
+import tempfile
+import unittest
+
+from upload_handling import HashingUpload
+
+class ClosingBuffer(io.BytesIO):
+    """BytesIO que recuerda cuántas veces se cerró y conserva el contenido."""
+    def __init__(self):
+        super().__init__()
+        self.close_count = 0
+
+    def close(self):
+        self.close_count += 1
+        return self.getvalue()
+
+class HashingUploadTest(unittest.TestCase):
+    def setUp(self):
+        self.output = ClosingBuffer()
+        self.upload = HashingUpload(self.output, os.path.join(tempfile.gettempdir(), 'x'))
+
+    def test_seek_before_write_keeps_output_open(self):
+        self.assertEqual(self.upload.seek(0), 0)
+        self.assertFalse(self.upload.closed)
+        self.upload.write(b'datos')
+        self.assertEqual(self.upload.seek(0), 0)
+        self.assertTrue(self.upload.closed)
+        self.assertEqual(self.upload.result, b'datos')
+
+    def test_other_seeks_keep_output_open(self):
+        self.upload.write(b'datos')
+        self.assertEqual(self.upload.seek(0, io.SEEK_END), 5)
+        self.assertEqual(self.upload.seek(3), 5)
+        self.assertFalse(self.upload.closed)
+        self.assertEqual(self.output.close_count, 0)
+
+    def test_close_once(self):
+        self.upload.write(b'datos')
+        self.upload.seek(0)
+        self.upload.seek(0)
+        self.upload.close()
+        self.assertEqual(self.output.close_count, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+# upload_handling.py
+
+import hashlib
+import os
+import re
+import time
+import uuid
+from flask import Request
+from werkzeug.utils import secure_filename
+
+# Antigüedad a partir de la cual se borran los archivos que quedaron en 'uploads'
+UPLOAD_TTL = 60 * 60
+# Tiempo mínimo entre dos limpiezas de 'uploads'
+CLEANUP_INTERVAL = 5 * 60
+# Nombre de los archivos que crea `upload_path` (solo éstos se borran al limpiar)
+UPLOAD_NAME = re.compile(r'[0-9a-f]{32}_')
+
+def upload_path(folder, filename):
+    """
+    Ruta donde se guarda un archivo subido. Se antepone un id único para que dos
+    subidas con el mismo nombre no se pisen.
+    """
+    return os.path.join(folder, f"{uuid.uuid4().hex}_{filename}")
+
+class HashingUpload:
+    """
+    Destino de un archivo del formulario mientras se recibe: cada bloque se escribe
+    una sola vez en `output` (un archivo en 'uploads' o directamente un códec) y se
+    calcula el SHA-256 al mismo tiempo, para no tener que volver a leerlo.
+    """
+    def __init__(self, output, path, encoded=False):
+        self.output = output
+        self.path = path
+        self.encoded = encoded
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.result = None
+        self.closed = False
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        self.output.write(data)
+        return len(data)
+
+    def seek(self, offset, whence=0):
+        # Contrato: el parser del formulario llama a seek(0) una vez, cuando terminó
+        # de escribir el archivo; solo eso cierra la salida (en un códec, termina la
+        # compresión). Cualquier otro seek, o un seek(0) sin datos escritos, no
+        # cierra nada y devuelve la posición actual, que es siempre el final
+        if offset == 0 and whence == 0 and self.size:
+            self.close()
+            return 0
+        return self.size
+
+    def close(self):
+        """Cierra la salida; en un códec, esto termina la compresión."""
+        if not self.closed:
+            self.closed = True
+            self.result = self.output.close()
+
+    def digest(self):
+        return self.sha256.hexdigest()
+
+    def discard(self):
+        """Cierra la salida sin importar si falla y borra el archivo escrito."""
+        try:
+            self.close()
+        except Exception:
+            pass
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class UploadRequest(Request):
+    """
+    Request que guarda los archivos subidos directamente en la carpeta de subidas en
+    vez de en un archivo temporal que luego se copia con file.save(). Si la ruta
+    tiene un códec de streaming registrado en `stream_encoders`, el archivo tiene la
+    extensión que acepta y la subida es lo bastante grande, los datos van directo al
+    códec y solo se escribe la salida. Las subidas del pedido quedan en `uploads`
+    para poder borrarlas si se rechaza.
+    """
+    upload_folder = 'uploads'
+    # endpoint -> (extensión, tamaño mínimo, función que recibe la ruta de salida y
+    # crea el códec)
+    stream_encoders = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.uploads = []
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        encoder = self.stream_encoders.get(self.endpoint)
+        if (encoder is not None and (filename or '').endswith(encoder[0])
+                and (total_content_length or 0) >= encoder[1]):
+            path = upload_path(self.upload_folder, 'stream.part')
+            upload = HashingUpload(encoder[2](path), path, encoded=True)
+        else:
+            path = upload_path(self.upload_folder, secure_filename(filename or '') or 'upload')
+            upload = HashingUpload(open(path, 'wb'), path)
+        self.uploads.append(upload)
+        return upload
+
+def stored_upload(file):
+    """Devuelve el HashingUpload de un archivo del formulario, ya recibido por completo."""
+    upload = file.stream
+    upload.close()
+    return upload
+
+def discard_uploads(uploads):
+    """Borra las subidas (ya recibidas o a medias) de un pedido rechazado."""
+    for upload in uploads:
+        upload.discard()
+
+def cleanup_uploads(folder, ttl=UPLOAD_TTL):
+    """
+    Borra las subidas de `folder` (sin entrar en subcarpetas) más viejas que `ttl`
+    segundos, por ejemplo las de pedidos rechazados o interrumpidos. Devuelve
+    cuántas se borraron.
+    """
+    limit = time.time() - ttl
+    removed = 0
+    for entry in os.scandir(folder):
+        if (entry.is_file() and UPLOAD_NAME.match(entry.name)
+                and entry.stat().st_mtime < limit):
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+class UploadCleaner:
+    """Ejecuta `cleanup_uploads` como máximo una vez cada `interval` segundos."""
+    def __init__(self, folder, ttl=UPLOAD_TTL, interval=CLEANUP_INTERVAL):
+        self.folder = folder
+        self.ttl = ttl
+        self.interval = interval
+        self.last_run = 0.0
+
+    def maybe_run(self):
+        now = time.time()
+        if now - self.last_run < self.interval:
+            return 0
+        self.last_run = now
+        return cleanup_uploads(self.folder, self.ttl)